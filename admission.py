@@ -0,0 +1,113 @@
+"""Admission control and load shedding for tracking ingestion"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Event types that are never shed, and the ones shed first under load
+PROTECTED_EVENT_TYPES = frozenset(['pageview', 'click'])
+LOW_PRIORITY_EVENT_TYPES = frozenset(['mousemove', 'hover'])
+
+class TokenBucketLimiter:
+    """Token buckets keyed by string with LRU eviction of idle keys"""
+    
+    def __init__(self, rate, burst, max_keys=50000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+    
+    def consume(self, key, reserve=0, now=None):
+        """Take one token if more than `reserve` tokens would remain"""
+        tokens = self._refill(key, now or time.monotonic())
+        if tokens - 1 < reserve:
+            return False
+        self._buckets[key][0] = tokens - 1
+        return True
+    
+    def force(self, key, now=None):
+        """Take a token if one is available without ever refusing"""
+        tokens = self._refill(key, now or time.monotonic())
+        self._buckets[key][0] = max(tokens - 1, 0)
+    
+    def refund(self, key):
+        """Return a token taken by consume()"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(bucket[0] + 1, self.burst)
+    
+    def __len__(self):
+        return len(self._buckets)
+    
+    def _refill(self, key, now):
+        """Top up a bucket for the time elapsed since it was last used"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            # Buckets are cheap to recreate full, so evicting the least recently used is safe
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket[0]
+
+class AdmissionController:
+    """Per-session and per-origin admission control with event-type priorities"""
+    
+    def __init__(self, session_rate=20, session_burst=100, origin_rate=500, origin_burst=2000,
+                 low_priority_reserve=0.5, max_keys=50000):
+        self.sessions = TokenBucketLimiter(session_rate, session_burst, max_keys)
+        self.origins = TokenBucketLimiter(origin_rate, origin_burst, max_keys)
+        # Low-priority events are only admitted while this fraction of the burst is left
+        self.low_priority_reserve = low_priority_reserve
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.admitted = 0
+        self.shed_by_event_type = defaultdict(int)
+        self.shed_by_reason = defaultdict(int)
+    
+    def admit(self, data, origin):
+        """Decide whether to ingest an event, returning (admitted, reason)"""
+        event_type = data.get('event_type')
+        session_key = data.get('session_id') or 'unknown'
+        origin_key = origin or 'unknown'
+        now = time.monotonic()
+        
+        with self._lock:
+            if event_type in PROTECTED_EVENT_TYPES:
+                self.sessions.force(session_key, now)
+                self.origins.force(origin_key, now)
+                self.admitted += 1
+                return True, None
+            
+            origin_reserve = session_reserve = 0
+            if event_type in LOW_PRIORITY_EVENT_TYPES:
+                origin_reserve = self.origins.burst * self.low_priority_reserve
+                session_reserve = self.sessions.burst * self.low_priority_reserve
+            
+            if not self.origins.consume(origin_key, origin_reserve, now):
+                return self._shed(event_type, 'origin')
+            if not self.sessions.consume(session_key, session_reserve, now):
+                self.origins.refund(origin_key)
+                return self._shed(event_type, 'session')
+            
+            self.admitted += 1
+            return True, None
+    
+    def stats(self):
+        """Get admission counters for monitoring"""
+        return {
+            'admitted': self.admitted,
+            'shed_by_event_type': dict(self.shed_by_event_type),
+            'shed_by_reason': dict(self.shed_by_reason),
+            'tracked_sessions': len(self.sessions),
+            'tracked_origins': len(self.origins)
+        }
+    
+    def _shed(self, event_type, reason):
+        self.shed_by_event_type[event_type] += 1
+        self.shed_by_reason[reason] += 1
+        return False, reason
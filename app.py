@@ -1,11 +1,30 @@
 import os
 import json
+import gzip
+import atexit
+import hashlib
+import struct
+import zlib
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, undefer
 from ml_model import UXAnalyzer
+from wire_format import decode_batch
+from dedup import RecentEventFilter
+from validation import VALID_EVENT_TYPES
+from admission import AdmissionController
+from result_cache import ResultCache
+from utils import to_epoch_ms
+from export_formats import (
+    EXPORT_TABLES, EVENT_CSV_COLUMNS, SESSION_CSV_COLUMNS, STREAM_CONTENT_TYPES, COLUMNAR_CONTENT_TYPES,
+    COLUMNAR_EVENT_COLUMNS, COLUMNAR_WRITERS, encode_cursor, decode_cursor, event_csv_row, ndjson_chunk, csv_chunk,
+    columnar_formats
+)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -41,14 +60,241 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.init_app(app)
 
+# Tracking ingestion configuration
+app.config['TRACK_BATCH_MAX_EVENTS'] = int(os.environ.get("TRACK_BATCH_MAX_EVENTS", "500"))
+app.config['TRACK_ADMISSION_CONTROL'] = os.environ.get("TRACK_ADMISSION_CONTROL", "true").lower() in ('1', 'true', 'yes')
+app.config['TRACK_SESSION_RATE'] = float(os.environ.get("TRACK_SESSION_RATE", "20"))
+app.config['TRACK_SESSION_BURST'] = float(os.environ.get("TRACK_SESSION_BURST", "100"))
+app.config['TRACK_ORIGIN_RATE'] = float(os.environ.get("TRACK_ORIGIN_RATE", "500"))
+app.config['TRACK_ORIGIN_BURST'] = float(os.environ.get("TRACK_ORIGIN_BURST", "2000"))
+app.config['TRACK_DEDUP_WINDOW_SECONDS'] = int(os.environ.get("TRACK_DEDUP_WINDOW_SECONDS", "600"))
+app.config['TRACK_DEDUP_MAX_ENTRIES'] = int(os.environ.get("TRACK_DEDUP_MAX_ENTRIES", "200000"))
+app.config['TRACK_MAX_BODY_BYTES'] = int(os.environ.get("TRACK_MAX_BODY_BYTES", str(1024 * 1024)))
+app.config['TRACK_WRITE_BEHIND'] = os.environ.get("TRACK_WRITE_BEHIND", "false").lower() in ('1', 'true', 'yes')
+app.config['TRACK_QUEUE_MAX_SIZE'] = int(os.environ.get("TRACK_QUEUE_MAX_SIZE", "10000"))
+app.config['TRACK_QUEUE_BATCH_SIZE'] = int(os.environ.get("TRACK_QUEUE_BATCH_SIZE", "200"))
+app.config['TRACK_QUEUE_MAX_LATENCY_MS'] = int(os.environ.get("TRACK_QUEUE_MAX_LATENCY_MS", "500"))
+app.config['TRACK_QUEUE_MAX_RETRIES'] = int(os.environ.get("TRACK_QUEUE_MAX_RETRIES", "3"))
+app.config['TRACK_QUEUE_RETRY_BACKOFF_MS'] = int(os.environ.get("TRACK_QUEUE_RETRY_BACKOFF_MS", "200"))
+app.config['SESSION_CACHE_FLUSH_SECONDS'] = float(os.environ.get("SESSION_CACHE_FLUSH_SECONDS", "5"))
+app.config['SESSION_CACHE_IDLE_SECONDS'] = float(os.environ.get("SESSION_CACHE_IDLE_SECONDS", "300"))
+app.config['SESSION_CACHE_MAX_SESSIONS'] = int(os.environ.get("SESSION_CACHE_MAX_SESSIONS", "10000"))
+
+# Analytics results are cached per endpoint and query until new data arrives or the TTL expires
+app.config['ANALYTICS_CACHE_ENABLED'] = os.environ.get("ANALYTICS_CACHE_ENABLED", "true").lower() in ('1', 'true', 'yes')
+app.config['ANALYTICS_CACHE_TTL_SECONDS'] = float(os.environ.get("ANALYTICS_CACHE_TTL_SECONDS", "60"))
+app.config['ANALYTICS_CACHE_MAX_ENTRIES'] = int(os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", "256"))
+
+# Rows fetched per keyset page by streamed exports
+app.config['EXPORT_PAGE_SIZE'] = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+# Rows per row group (record batch) in npz and Arrow exports
+app.config['EXPORT_ROW_GROUP_SIZE'] = int(os.environ.get("EXPORT_ROW_GROUP_SIZE", "10000"))
+
+# Threads that run a report's independent analyses concurrently
+app.config['REPORT_WORKERS'] = int(os.environ.get("REPORT_WORKERS", "4"))
+
+# Hourly rollup tables for dashboard reads, kept current by a background compactor
+app.config['ROLLUPS_ENABLED'] = os.environ.get("ROLLUPS_ENABLED", "true").lower() in ('1', 'true', 'yes')
+app.config['ROLLUP_INTERVAL_SECONDS'] = float(os.environ.get("ROLLUP_INTERVAL_SECONDS", "30"))
+app.config['ROLLUP_BATCH_SIZE'] = int(os.environ.get("ROLLUP_BATCH_SIZE", "5000"))
+app.config['ROLLUP_SETTLE_SECONDS'] = float(os.environ.get("ROLLUP_SETTLE_SECONDS", "10"))
+
 # Initialize UX analyzer
 ux_analyzer = UXAnalyzer()
 
 # Import database utilities and models
 from db_utils import (
-    validate_tracking_data, save_tracking_event, get_tracking_data,
-    get_analytics_summary, get_export_data
+    validate_tracking_data, validate_events, save_tracking_event, save_tracking_events, commit_tracking_events,
+    get_tracking_data, iter_tracking_data, get_analytics_summary, get_export_data, flush_session_cache,
+    validate_page_summary, save_page_summaries, get_page_summaries, aggregate_heatmap_bins,
+    aggregate_scroll_state, aggregate_mouse_grid, aggregate_summary_scroll, aggregate_summary_samples,
+    get_data_version, apply_event_filters, apply_session_filters, find_page_end, iter_keyset_pages,
+    TRANSIENT_DB_ERRORS
 )
+from session_cache import SessionAggregateCache, SessionCacheFlusher
+from rollups import (
+    RollupCompactor, compact_rollups, rollup_heatmap_bins, rollup_scroll_state, rollup_event_type_stats
+)
+
+# Session counters are aggregated in memory and upserted periodically
+session_cache = SessionAggregateCache(
+    flush_interval=app.config['SESSION_CACHE_FLUSH_SECONDS'],
+    idle_timeout=app.config['SESSION_CACHE_IDLE_SECONDS'],
+    max_sessions=app.config['SESSION_CACHE_MAX_SESSIONS']
+)
+
+def sync_session_aggregates():
+    """Write pending session aggregates so that reads counting sessions see every tracked event"""
+    from models import AnalyticsSession
+    return flush_session_cache(db, AnalyticsSession, session_cache)
+
+def flush_pending_sessions():
+    """Write any session aggregates still held in memory"""
+    with app.app_context():
+        return sync_session_aggregates()
+
+atexit.register(flush_pending_sessions)
+
+# Writes aggregates on the flush interval even when no further events arrive to trigger it
+session_flusher = SessionCacheFlusher(flush_pending_sessions, interval=app.config['SESSION_CACHE_FLUSH_SECONDS'])
+
+def prepare_tracking_event(data):
+    """Fill in server-side defaults for a validated tracking event"""
+    # Add timestamp if not present, as epoch milliseconds like the tracker sends
+    if 'timestamp' not in data:
+        data['timestamp'] = to_epoch_ms(datetime.utcnow())
+    
+    # Ensure session_id is present
+    if 'session_id' not in data:
+        data['session_id'] = 'unknown'
+    
+    return data
+
+def read_tracking_body():
+    """Read a tracking request body, transparently decompressing gzip/deflate bodies"""
+    max_bytes = app.config['TRACK_MAX_BODY_BYTES']
+    body = request.get_data(cache=False)
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    
+    if encoding in ('gzip', 'deflate'):
+        # gzip carries a gzip header; HTTP "deflate" is zlib-wrapped
+        wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+        try:
+            decompressor = zlib.decompressobj(wbits)
+            body = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error:
+            return None
+        # Refuse bodies that inflate beyond the limit
+        if len(body) > max_bytes or decompressor.unconsumed_tail:
+            return None
+    elif encoding != 'identity':
+        return None
+    
+    if len(body) > max_bytes:
+        return None
+    
+    return body
+
+def read_tracking_payload():
+    """Parse a JSON tracking payload"""
+    body = read_tracking_body()
+    if body is None:
+        return None
+    
+    try:
+        return json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def flush_tracking_events(events):
+    """Group-commit queued tracking events from the write-behind flusher, raising if the commit fails"""
+    with app.app_context():
+        from models import TrackingEvent, AnalyticsSession
+        commit_tracking_events(db, TrackingEvent, AnalyticsSession, events, session_cache=session_cache)
+
+# Recently seen client event IDs, to drop fetch retries and beacon double delivery
+event_filter = RecentEventFilter(
+    window_seconds=app.config['TRACK_DEDUP_WINDOW_SECONDS'],
+    max_entries=app.config['TRACK_DEDUP_MAX_ENTRIES']
+)
+
+def is_duplicate_event(data):
+    """Check a client-supplied event_id against recently ingested events"""
+    # Validation has checked that event_id, when present, is a string or integer
+    event_id = data.get('event_id')
+    if event_id is None:
+        return False
+    return event_filter.seen(data.get('session_id'), event_id)
+
+def forget_events(events):
+    """Let clients retry events that were not stored"""
+    for data in events:
+        if data.get('event_id') is not None:
+            event_filter.forget(data.get('session_id'), data['event_id'])
+
+# Write-behind ingest queue (disabled unless TRACK_WRITE_BEHIND is set)
+ingest_queue = None
+if app.config['TRACK_WRITE_BEHIND']:
+    from ingest_queue import IngestQueue
+    ingest_queue = IngestQueue(
+        flush_tracking_events,
+        max_size=app.config['TRACK_QUEUE_MAX_SIZE'],
+        batch_size=app.config['TRACK_QUEUE_BATCH_SIZE'],
+        max_latency=app.config['TRACK_QUEUE_MAX_LATENCY_MS'] / 1000.0,
+        max_retries=app.config['TRACK_QUEUE_MAX_RETRIES'],
+        retry_backoff=app.config['TRACK_QUEUE_RETRY_BACKOFF_MS'] / 1000.0,
+        transient_errors=TRANSIENT_DB_ERRORS,
+        on_drop=forget_events
+    )
+
+# Token buckets per session and per tracked origin (disabled with TRACK_ADMISSION_CONTROL=false)
+admission_controller = None
+if app.config['TRACK_ADMISSION_CONTROL']:
+    admission_controller = AdmissionController(
+        session_rate=app.config['TRACK_SESSION_RATE'],
+        session_burst=app.config['TRACK_SESSION_BURST'],
+        origin_rate=app.config['TRACK_ORIGIN_RATE'],
+        origin_burst=app.config['TRACK_ORIGIN_BURST']
+    )
+
+def compact_pending_rollups():
+    """Fold the next batch of settled tracking events into the rollup tables"""
+    with app.app_context():
+        return compact_rollups(
+            db,
+            batch_size=app.config['ROLLUP_BATCH_SIZE'],
+            settle_seconds=app.config['ROLLUP_SETTLE_SECONDS']
+        )
+
+# Rollup compactor (disabled with ROLLUPS_ENABLED=false)
+rollup_compactor = None
+if app.config['ROLLUPS_ENABLED']:
+    rollup_compactor = RollupCompactor(compact_pending_rollups, interval=app.config['ROLLUP_INTERVAL_SECONDS'])
+
+# Worker threads for the independent analyses of a report
+report_executor = ThreadPoolExecutor(max_workers=app.config['REPORT_WORKERS'], thread_name_prefix='report')
+
+# Analytics result cache (disabled with ANALYTICS_CACHE_ENABLED=false)
+result_cache = None
+if app.config['ANALYTICS_CACHE_ENABLED']:
+    result_cache = ResultCache(
+        max_entries=app.config['ANALYTICS_CACHE_MAX_ENTRIES'],
+        ttl=app.config['ANALYTICS_CACHE_TTL_SECONDS']
+    )
+
+@app.before_request
+def start_background_threads():
+    """Start the rollup compactor and session flusher with the first request handled by this process"""
+    session_flusher.start()
+    if rollup_compactor is not None:
+        rollup_compactor.start()
+
+def admit_event(data):
+    """Apply admission control to a validated event"""
+    if admission_controller is None:
+        return True
+    
+    # Prefer the embedding page's Origin header, falling back to the tracked URL's host
+    origin = request.headers.get('Origin') or urlparse(data.get('url', '')).netloc
+    admitted, _ = admission_controller.admit(data, origin)
+    return admitted
+
+def queue_full_response():
+    """Backpressure response when the write-behind queue is full"""
+    response = jsonify({'error': 'Tracking queue is full, retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.after_request
+def add_tracking_cors_headers(response):
+    """Allow embedded tracking scripts on other origins to post events"""
+    if request.path.startswith('/api/track'):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Content-Encoding'
+        response.headers['Access-Control-Max-Age'] = '86400'
+    return response
 
 @app.route('/')
 def index():
@@ -64,8 +310,12 @@ def dashboard():
     # Import models
     from models import TrackingEvent, AnalyticsSession
     
-    # Get analytics summary from database
-    analytics_summary = get_analytics_summary(db, TrackingEvent, AnalyticsSession)
+    # Session counts come from analytics_sessions, so write the aggregates still held in memory first
+    sync_session_aggregates()
+    
+    # Get analytics summary from database, reading event counts from rollups when enabled
+    event_type_stats = rollup_event_type_stats(db) if rollup_compactor is not None else None
+    analytics_summary = get_analytics_summary(db, TrackingEvent, AnalyticsSession, event_type_stats)
     
     return render_template('dashboard.html', 
                          analytics=analytics_summary,
@@ -85,34 +335,309 @@ def authenticate():
 def track_data():
     """Endpoint to receive tracking data from embedded script"""
     try:
-        data = request.get_json()
+        data = read_tracking_payload()
         
         if not validate_tracking_data(data):
             return jsonify({'error': 'Invalid tracking data'}), 400
         
-        # Add timestamp if not present
-        if 'timestamp' not in data:
-            data['timestamp'] = datetime.utcnow().isoformat()
+        prepare_tracking_event(data)
+        
+        # Shed low-priority traffic from sessions or sites over their rate
+        if not admit_event(data):
+            response = jsonify({'error': 'Rate limit exceeded', 'status': 'shed'})
+            response.status_code = 429
+            response.headers['Retry-After'] = '1'
+            return response
+        
+        # Drop retried or double-delivered events before they cost a write
+        if is_duplicate_event(data):
+            return jsonify({'status': 'duplicate'})
         
-        # Ensure session_id is present
-        if 'session_id' not in data:
-            data['session_id'] = 'unknown'
+        # Hand off to the background flusher in write-behind mode
+        if ingest_queue is not None:
+            if not ingest_queue.enqueue(data):
+                forget_events([data])
+                return queue_full_response()
+            return jsonify({'status': 'queued'}), 202
         
         # Import models
         from models import TrackingEvent, AnalyticsSession
         
         # Save to database
-        if save_tracking_event(db, TrackingEvent, AnalyticsSession, data):
+        if save_tracking_event(db, TrackingEvent, AnalyticsSession, data, session_cache=session_cache):
             logging.info(f"Tracked event: {data.get('event_type')} from {data.get('url')}")
             return jsonify({'status': 'success'})
         else:
             logging.error(f"Failed to save tracking event: {data}")
+            forget_events([data])
             return jsonify({'error': 'Failed to save tracking data'}), 500
         
     except Exception as e:
         logging.error(f"Error tracking data: {str(e)}", exc_info=True)
         return jsonify({'error': f'Failed to track data: {str(e)}'}), 500
 
+def batch_response(status, results):
+    """Summarise per-item batch results"""
+    counts = {'accepted': 0, 'duplicate': 0, 'shed': 0, 'rejected': 0}
+    for item in results:
+        counts[item['status']] += 1
+    
+    return {
+        'status': status,
+        'accepted': counts['accepted'],
+        'duplicates': counts['duplicate'],
+        'shed': counts['shed'],
+        'rejected': counts['rejected'],
+        'results': results
+    }
+
+@app.route('/api/track/batch', methods=['POST'])
+def track_batch():
+    """Endpoint to receive a batch of tracking events in one request"""
+    try:
+        body = read_tracking_body()
+        
+        # JSON, NDJSON with a shared header line, or the binary layout, by Content-Type
+        try:
+            events = decode_batch(body, request.mimetype) if body is not None else None
+        except (ValueError, TypeError, OverflowError, UnicodeDecodeError, struct.error):
+            events = None
+        
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'Batch must contain a non-empty list of events'}), 400
+        
+        max_events = app.config['TRACK_BATCH_MAX_EVENTS']
+        if len(events) > max_events:
+            return jsonify({'error': f'Batch exceeds maximum of {max_events} events'}), 413
+        
+        # Validate and coerce the whole batch in one pass
+        _, errors = validate_events(events)
+        
+        results = []
+        accepted = []
+        for index, data in enumerate(events):
+            if index in errors:
+                results.append({'index': index, 'status': 'rejected', 'error': errors[index]})
+            elif not admit_event(prepare_tracking_event(data)):
+                results.append({'index': index, 'status': 'shed', 'error': 'Rate limit exceeded'})
+            elif is_duplicate_event(data):
+                results.append({'index': index, 'status': 'duplicate'})
+            else:
+                accepted.append(data)
+                results.append({'index': index, 'status': 'accepted'})
+        
+        if ingest_queue is not None:
+            queued = ingest_queue.enqueue_many(accepted)
+            forget_events(accepted[queued:])
+            if accepted and not queued:
+                return queue_full_response()
+            
+            # Events that did not fit are reported back so the client can retry them
+            for item in results:
+                if item['status'] == 'accepted':
+                    if queued <= 0:
+                        item['status'] = 'rejected'
+                        item['error'] = 'Tracking queue is full'
+                    queued -= 1
+            
+            return jsonify(batch_response('queued', results)), 202
+        
+        from models import TrackingEvent, AnalyticsSession
+        
+        if accepted and not save_tracking_events(db, TrackingEvent, AnalyticsSession, accepted, session_cache=session_cache):
+            logging.error(f"Failed to save tracking batch of {len(accepted)} events")
+            forget_events(accepted)
+            return jsonify({'error': 'Failed to save tracking data'}), 500
+        
+        response = batch_response('success', results)
+        logging.info(f"Tracked batch: {response['accepted']} accepted, {response['duplicates']} duplicate, {response['rejected']} rejected")
+        return jsonify(response)
+    
+    except Exception as e:
+        logging.error(f"Error tracking batch: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Failed to track data: {str(e)}'}), 500
+
+@app.route('/api/track/summary', methods=['POST'])
+def track_summary():
+    """Endpoint to receive aggregated mouse/scroll summaries for a page view"""
+    try:
+        payload = read_tracking_payload()
+        summaries = payload if isinstance(payload, list) else [payload]
+        
+        if not summaries or not all(validate_page_summary(data) for data in summaries):
+            return jsonify({'error': 'Invalid page summary'}), 400
+        
+        from models import PageViewSummary
+        
+        if save_page_summaries(db, PageViewSummary, summaries):
+            return jsonify({'status': 'success', 'accepted': len(summaries)})
+        else:
+            logging.error(f"Failed to save {len(summaries)} page summaries")
+            return jsonify({'error': 'Failed to save page summary'}), 500
+    
+    except Exception as e:
+        logging.error(f"Error tracking page summary: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Failed to track summary: {str(e)}'}), 500
+
+@app.route('/api/ingest-stats')
+def get_ingest_stats():
+    """Get ingestion and analytics counters: admission control, dedup, queue, session cache, rollups, caches"""
+    if 'authenticated' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from models import DIMENSION_CACHES
+    return jsonify({
+        'admission': admission_controller.stats() if admission_controller else None,
+        'dedup': event_filter.stats(),
+        'queue': ingest_queue.stats() if ingest_queue else None,
+        'rollups': rollup_compactor.stats() if rollup_compactor else None,
+        'result_cache': result_cache.stats() if result_cache else None,
+        'dimensions': {name: cache.stats() for name, cache in DIMENSION_CACHES.items()},
+        'cached_sessions': len(session_cache),
+        'session_flusher': session_flusher.stats()
+    })
+
+def parse_filter_time(value):
+    """Parse an ISO timestamp query parameter into a naive UTC datetime"""
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def parse_analytics_filters():
+    """Read url, from, to, viewport, event_type and extra.<key> filters from the query string; raises ValueError on bad input"""
+    args = request.args
+    filters = {}
+    
+    if args.get('url'):
+        filters['url'] = args['url']
+    if args.get('from'):
+        filters['start'] = parse_filter_time(args['from'])
+    if args.get('to'):
+        filters['end'] = parse_filter_time(args['to'])
+    
+    # Viewport is either an exact width ("1280") or an inclusive range ("768-1024")
+    viewport = args.get('viewport')
+    if viewport:
+        low, _, high = viewport.partition('-')
+        filters['min_viewport_width'] = int(low)
+        filters['max_viewport_width'] = int(high) if high else int(low)
+    
+    # Event types are comma separated, e.g. "click,scroll"
+    event_type = args.get('event_type')
+    if event_type:
+        event_types = [value.strip() for value in event_type.split(',') if value.strip()]
+        if not event_types or not set(event_types) <= VALID_EVENT_TYPES:
+            raise ValueError('Invalid event_type filter')
+        filters['event_types'] = event_types
+    
+    # Extra data filters are "extra.<key>=<value>", e.g. "extra.plan=pro"
+    extra = {key[len('extra.'):]: value for key, value in args.items() if key.startswith('extra.')}
+    if extra:
+        if not all(extra):
+            raise ValueError('Invalid extra data filter')
+        filters['extra'] = extra
+    
+    return filters
+
+def parse_epoch_option():
+    """Whether ?timestamps=epoch asks for epoch millisecond timestamps instead of ISO strings; raises ValueError on bad input"""
+    timestamps = request.args.get('timestamps', 'iso')
+    if timestamps not in ('iso', 'epoch'):
+        raise ValueError('Invalid timestamps option')
+    return timestamps == 'epoch'
+
+def build_heatmap_data(filters):
+    """Compute heatmap data for the given filters"""
+    from models import TrackingEvent, PageViewSummary
+    
+    # Read click bins from rollups or count them in the database, falling back to the analyzer
+    bins = None
+    if rollup_compactor is not None:
+        bins = rollup_heatmap_bins(db, filters, ux_analyzer.HEATMAP_CELL_SIZE)
+    if bins is None:
+        bins = aggregate_heatmap_bins(db, TrackingEvent, filters, ux_analyzer.HEATMAP_CELL_SIZE)
+    movement_cells = aggregate_mouse_grid(db, PageViewSummary, filters)
+    if bins is not None and movement_cells is not None:
+        return ux_analyzer.heatmap_from_clusters(bins, movement_cells=movement_cells)
+    
+    summaries = get_page_summaries(db, PageViewSummary, filters=filters)
+    tracking_data = iter_tracking_data(db, TrackingEvent, filters=filters, **ux_analyzer.data_requirements('heatmap'))
+    return ux_analyzer.generate_heatmap_data(tracking_data, summaries)
+
+def aggregate_scroll_data(filters):
+    """Scroll aggregates of events and page summaries computed in the database, or None when unsupported"""
+    from models import TrackingEvent, PageViewSummary
+    summary_scroll = aggregate_summary_scroll(db, PageViewSummary, filters)
+    if summary_scroll is None:
+        return None
+    
+    # Page summaries' per-session maxima join the events' in SQL for the bounce rate
+    summary_state, summary_depths = summary_scroll
+    scroll_state = None
+    if rollup_compactor is not None:
+        scroll_state = rollup_scroll_state(db, filters, summary_state, [summary_depths])
+    if scroll_state is None:
+        scroll_state = aggregate_scroll_state(
+            db, TrackingEvent, filters, scroll_state=summary_state, session_depths=[summary_depths]
+        )
+    return scroll_state
+
+def build_scroll_data(filters):
+    """Compute scroll depth analysis for the given filters"""
+    from models import TrackingEvent, PageViewSummary
+    
+    # Read scroll aggregates from rollups or compute them in the database, falling back to the analyzer
+    scroll_state = aggregate_scroll_data(filters)
+    if scroll_state is not None:
+        return ux_analyzer.scroll_from_aggregates(scroll_state)
+    
+    summaries = get_page_summaries(db, PageViewSummary, filters=filters)
+    tracking_data = iter_tracking_data(db, TrackingEvent, filters=filters, **ux_analyzer.data_requirements('scroll'))
+    return ux_analyzer.analyze_scroll_behavior(tracking_data, summaries)
+
+def build_suggestions(filters):
+    """Compute UX suggestions for the given filters"""
+    from models import TrackingEvent, PageViewSummary
+    tracking_data = iter_tracking_data(db, TrackingEvent, filters=filters, **ux_analyzer.data_requirements('suggestions'))
+    
+    # Scroll stats and per-session sample counts come from the database when it can aggregate them,
+    # so page summaries are not loaded
+    scroll_state = aggregate_scroll_data(filters)
+    session_samples = aggregate_summary_samples(db, PageViewSummary, filters) if scroll_state is not None else None
+    if session_samples is not None:
+        scroll_stats = ux_analyzer.scroll_from_aggregates(scroll_state)
+        return {'suggestions': ux_analyzer.generate_suggestions(
+            tracking_data, scroll_stats=scroll_stats, session_samples=session_samples
+        )}
+    
+    summaries = get_page_summaries(db, PageViewSummary, filters=filters)
+    return {'suggestions': ux_analyzer.generate_suggestions(tracking_data, summaries)}
+
+def analytics_request_version():
+    """Cache key, data version and ETag for the current analytics request"""
+    from models import TrackingEvent, PageViewSummary
+    key = (request.path, tuple(sorted(request.args.items(multi=True))))
+    version = get_data_version(db, TrackingEvent, PageViewSummary)
+    etag = hashlib.sha256(repr((key, version)).encode('utf-8')).hexdigest()[:32]
+    return key, version, etag
+
+def analytics_response(compute, cache=True):
+    """Answer an analytics read with 304 if the client's copy is current, else with the (cached) result"""
+    key, version, etag = analytics_request_version()
+    
+    # The version check is two indexed lookups, so unchanged polls skip all query work
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    elif cache and result_cache is not None:
+        response = jsonify(result_cache.get_or_compute(key, version, compute))
+    else:
+        response = jsonify(compute())
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/heatmap-data')
 def get_heatmap_data():
     """Get heatmap data for visualization"""
@@ -120,10 +645,12 @@ def get_heatmap_data():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        from models import TrackingEvent, AnalyticsSession
-        tracking_data = get_tracking_data(db, TrackingEvent)
-        heatmap_data = ux_analyzer.generate_heatmap_data(tracking_data)
-        return jsonify(heatmap_data)
+        filters = parse_analytics_filters()
+    except ValueError:
+        return jsonify({'error': 'Invalid filter parameters'}), 400
+    
+    try:
+        return analytics_response(lambda: build_heatmap_data(filters))
     except Exception as e:
         logging.error(f"Error generating heatmap data: {str(e)}")
         return jsonify({'error': 'Failed to generate heatmap data'}), 500
@@ -135,10 +662,12 @@ def get_scroll_data():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        from models import TrackingEvent, AnalyticsSession
-        tracking_data = get_tracking_data(db, TrackingEvent)
-        scroll_data = ux_analyzer.analyze_scroll_behavior(tracking_data)
-        return jsonify(scroll_data)
+        filters = parse_analytics_filters()
+    except ValueError:
+        return jsonify({'error': 'Invalid filter parameters'}), 400
+    
+    try:
+        return analytics_response(lambda: build_scroll_data(filters))
     except Exception as e:
         logging.error(f"Error analyzing scroll data: {str(e)}")
         return jsonify({'error': 'Failed to analyze scroll data'}), 500
@@ -150,46 +679,230 @@ def get_ux_suggestions():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        from models import TrackingEvent, AnalyticsSession
-        tracking_data = get_tracking_data(db, TrackingEvent)
-        suggestions = ux_analyzer.generate_suggestions(tracking_data)
-        return jsonify({'suggestions': suggestions})
+        filters = parse_analytics_filters()
+    except ValueError:
+        return jsonify({'error': 'Invalid filter parameters'}), 400
+    
+    try:
+        return analytics_response(lambda: build_suggestions(filters))
     except Exception as e:
         logging.error(f"Error generating suggestions: {str(e)}")
         return jsonify({'error': 'Failed to generate suggestions'}), 500
 
+def stream_export(export_format, filters, epoch=False):
+    """Stream events or sessions as NDJSON, CSV or columnar row groups, paging through the table by key"""
+    table = request.args.get('table', 'events')
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': 'Invalid export table'}), 400
+    if export_format in COLUMNAR_CONTENT_TYPES and table != 'events':
+        return jsonify({'error': 'Columnar exports are only available for events'}), 400
+    
+    try:
+        after_key = decode_cursor(request.args['cursor'], table) if request.args.get('cursor') else None
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if limit is not None and limit <= 0:
+            raise ValueError('Invalid limit')
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    from models import TrackingEvent, AnalyticsSession
+    if table == 'events':
+        query = apply_event_filters(TrackingEvent.query, TrackingEvent, filters)
+        if export_format not in COLUMNAR_CONTENT_TYPES:
+            query = query.options(undefer(TrackingEvent.additional_data))
+        key_columns = (TrackingEvent.timestamp, TrackingEvent.id)
+        columns = EVENT_CSV_COLUMNS
+    else:
+        query = apply_session_filters(AnalyticsSession.query, AnalyticsSession, filters)
+        key_columns = (AnalyticsSession.id,)
+        columns = SESSION_CSV_COLUMNS
+    
+    # With a limit, find where this part ends up front so its resume cursor can go in a header
+    through_key = find_page_end(query, key_columns, after_key, limit) if limit else None
+    
+    def generate_columnar():
+        # Read plain column tuples; row groups are built straight from them without ORM objects,
+        # taking timestamps from the stored epoch milliseconds
+        columnar_query = query.with_entities(
+            *[getattr(TrackingEvent, name) for name, _ in COLUMNAR_EVENT_COLUMNS], TrackingEvent.timestamp_ms
+        )
+        writer = COLUMNAR_WRITERS[export_format]()
+        for rows in iter_keyset_pages(
+            columnar_query, key_columns, after_key, through_key, app.config['EXPORT_ROW_GROUP_SIZE']
+        ):
+            yield writer.write_row_group(rows)
+        yield writer.close()
+    
+    def generate():
+        header = export_format == 'csv'
+        for rows in iter_keyset_pages(query, key_columns, after_key, through_key, app.config['EXPORT_PAGE_SIZE']):
+            if table == 'events':
+                TrackingEvent.load_dimensions(rows)
+            records = [row.to_dict(epoch=epoch) for row in rows]
+            if export_format == 'ndjson':
+                yield ndjson_chunk(records)
+                continue
+            if table == 'events':
+                records = [event_csv_row(record) for record in records]
+            yield csv_chunk(records, columns, header=header)
+            header = False
+        if header:
+            yield csv_chunk([], columns, header=True)
+    
+    if export_format in COLUMNAR_CONTENT_TYPES:
+        response = app.response_class(
+            stream_with_context(generate_columnar()), mimetype=COLUMNAR_CONTENT_TYPES[export_format]
+        )
+    else:
+        response = app.response_class(stream_with_context(generate()), mimetype=STREAM_CONTENT_TYPES[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=ux-analytics-{table}.{export_format}'
+    if through_key is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor(table, through_key)
+    return response
+
 @app.route('/api/export-data')
 def export_data():
-    """Export tracking data as JSON"""
+    """Export tracking data as JSON, or stream it as NDJSON/CSV/npz/Arrow with ?format="""
     if 'authenticated' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
+    try:
+        filters = parse_analytics_filters()
+        epoch = parse_epoch_option()
+    except ValueError:
+        return jsonify({'error': 'Invalid filter parameters'}), 400
+    
+    # Exports include analytics_sessions rows, so write the aggregates still held in memory first
+    sync_session_aggregates()
+    
+    export_format = request.args.get('format', 'json')
+    if export_format in STREAM_CONTENT_TYPES:
+        return stream_export(export_format, filters, epoch)
+    if export_format in COLUMNAR_CONTENT_TYPES:
+        if export_format not in columnar_formats():
+            return jsonify({'error': f'{export_format} export is not available on this server'}), 501
+        return stream_export(export_format, filters, epoch)
+    if export_format != 'json':
+        return jsonify({'error': 'Unsupported export format'}), 400
+    
     try:
         from models import TrackingEvent, AnalyticsSession
-        export_data = get_export_data(db, TrackingEvent, AnalyticsSession)
-        return jsonify(export_data)
+        # Full exports are too large to keep in the result cache, but still answer conditional requests
+        return analytics_response(
+            lambda: get_export_data(db, TrackingEvent, AnalyticsSession, filters=filters, epoch=epoch), cache=False
+        )
     except Exception as e:
         logging.error(f"Error exporting data: {str(e)}")
         return jsonify({'error': 'Failed to export data'}), 500
 
-@app.route('/tracking-script')
-def get_tracking_script():
-    """Serve the tracking script for embedding"""
-    with open('static/js/tracking.js', 'r') as f:
+# Rendered tracking scripts keyed by API endpoint
+tracking_script_cache = {}
+tracking_script_cache_lock = threading.Lock()
+TRACKING_SCRIPT_CACHE_SIZE = 64
+
+def render_tracking_script(api_endpoint):
+    """Render the tracking script for an API endpoint, cached until tracking.js changes"""
+    script_path = os.path.join(app.static_folder, 'js', 'tracking.js')
+    mtime = os.stat(script_path).st_mtime_ns
+    
+    cached = tracking_script_cache.get(api_endpoint)
+    if cached and cached['mtime'] == mtime:
+        return cached
+    
+    with open(script_path, 'r') as f:
         script_content = f.read()
     
     # Replace placeholder with actual API endpoint
+    body = script_content.replace('{{API_ENDPOINT}}', api_endpoint).encode('utf-8')
+    rendered = {
+        'mtime': mtime,
+        'body': body,
+        'gzip_body': gzip.compress(body, compresslevel=9),
+        'etag': hashlib.sha256(body).hexdigest()[:32]
+    }
+    
+    # The key comes from the Host header, so keep the cache bounded; request threads share it
+    with tracking_script_cache_lock:
+        if api_endpoint not in tracking_script_cache and len(tracking_script_cache) >= TRACKING_SCRIPT_CACHE_SIZE:
+            tracking_script_cache.pop(next(iter(tracking_script_cache)))
+        tracking_script_cache[api_endpoint] = rendered
+    return rendered
+
+@app.route('/tracking-script')
+def get_tracking_script():
+    """Serve the tracking script for embedding"""
     api_endpoint = request.url_root + 'api/track'
-    script_content = script_content.replace('{{API_ENDPOINT}}', api_endpoint)
+    script = render_tracking_script(api_endpoint)
     
-    response = app.response_class(
-        response=script_content,
-        status=200,
-        mimetype='application/javascript'
-    )
+    # Each encoding is a different representation, so it gets its own strong ETag
+    use_gzip = bool(request.accept_encodings['gzip'])
+    etag = script['etag'] + '-gz' if use_gzip else script['etag']
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    elif use_gzip:
+        response = app.response_class(
+            response=script['gzip_body'],
+            status=200,
+            mimetype='application/javascript'
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(
+            response=script['body'],
+            status=200,
+            mimetype='application/javascript'
+        )
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    response.headers['Vary'] = 'Accept-Encoding'
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response
 
+def build_report_analysis(tracking_data, filters):
+    """Compute the heatmap, scroll and suggestion sections of the analytics report"""
+    from models import PageViewSummary
+    summaries = get_page_summaries(db, PageViewSummary, filters=filters)
+    
+    # Heatmap and scroll analysis run concurrently; suggestions reuse the scroll stats
+    heatmap_future = report_executor.submit(ux_analyzer.generate_heatmap_data, tracking_data, summaries)
+    scroll_future = report_executor.submit(ux_analyzer.analyze_scroll_behavior, tracking_data, summaries)
+    scroll_data = scroll_future.result()
+    suggestions = ux_analyzer.generate_suggestions(tracking_data, summaries, scroll_stats=scroll_data)
+    heatmap_data = heatmap_future.result()
+    
+    return {
+        'heatmap_data': heatmap_data,
+        'scroll_data': scroll_data,
+        'suggestions': suggestions
+    }
+
+def build_report(filters, epoch=False):
+    """Compute the full analytics report for the given filters"""
+    from models import TrackingEvent, AnalyticsSession
+    
+    # Load one snapshot of the data that the export and, on a cache miss, every analysis share;
+    # a failed load raises, so the report answers 500 and no empty analysis is cached
+    tracking_data = get_tracking_data(db, TrackingEvent, filters=filters, epoch=epoch)
+    export_data = get_export_data(
+        db, TrackingEvent, AnalyticsSession, events=tracking_data, filters=filters, epoch=epoch
+    )
+    
+    # Only the analysis sections are small enough to keep in the result cache; the export is rebuilt per request
+    key, version, _ = analytics_request_version()
+    compute_analysis = lambda: build_report_analysis(tracking_data, filters)
+    if result_cache is not None:
+        analysis = result_cache.get_or_compute(key + ('analysis',), version, compute_analysis)
+    else:
+        analysis = compute_analysis()
+    
+    return {
+        'export_data': export_data,
+        **analysis,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
 @app.route('/api/generate-report')
 def generate_report():
     """Generate a comprehensive analytics report"""
@@ -197,24 +910,17 @@ def generate_report():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        from models import TrackingEvent, AnalyticsSession
-        
-        # Gather all data for the report
-        export_data = get_export_data(db, TrackingEvent, AnalyticsSession)
-        tracking_data = get_tracking_data(db, TrackingEvent)
-        heatmap_data = ux_analyzer.generate_heatmap_data(tracking_data)
-        scroll_data = ux_analyzer.analyze_scroll_behavior(tracking_data)
-        suggestions = ux_analyzer.generate_suggestions(tracking_data)
-        
-        report_data = {
-            'export_data': export_data,
-            'heatmap_data': heatmap_data,
-            'scroll_data': scroll_data,
-            'suggestions': suggestions,
-            'generated_at': datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(report_data)
+        filters = parse_analytics_filters()
+        epoch = parse_epoch_option()
+    except ValueError:
+        return jsonify({'error': 'Invalid filter parameters'}), 400
+    
+    # The report's export part includes analytics_sessions rows
+    sync_session_aggregates()
+    
+    try:
+        # The export part is too large to cache, so build_report caches only its analysis sections
+        return analytics_response(lambda: build_report(filters, epoch), cache=False)
     except Exception as e:
         logging.error(f"Error generating report: {str(e)}")
         return jsonify({'error': 'Failed to generate report'}), 500
@@ -234,9 +940,9 @@ def logout():
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
-    # Initialize database tables
+    # Initialize database tables, upgrading ones created by earlier versions
     with app.app_context():
-        from models import TrackingEvent, AnalyticsSession
-        db.create_all()
+        from migrations import upgrade_database
+        upgrade_database(db)
     
     app.run(host='0.0.0.0', port=5000, debug=True)
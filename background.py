@@ -0,0 +1,38 @@
+"""Lazily started background threads for ingestion and maintenance work"""
+
+import atexit
+import threading
+
+class BackgroundWorker:
+    """Daemon thread running _run() until shutdown() sets the stopping event"""
+    
+    thread_name = 'background-worker'
+    
+    def __init__(self):
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+    
+    def start(self):
+        """Start the worker thread if it is not running yet"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Started lazily so that pre-fork servers get one thread per worker process
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+    
+    def shutdown(self, timeout=10):
+        """Stop the worker thread, waiting up to timeout seconds for it to finish"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+    
+    def _run(self):
+        """Do the worker's job until self._stopping is set"""
+        raise NotImplementedError
@@ -2,158 +2,588 @@
 
 import logging
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func, desc, case, cast, false, true, tuple_, union_all, Float, Integer, String
+from sqlalchemy.dialects.postgresql import JSON as PG_JSON
+from sqlalchemy.orm import undefer
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, DisconnectionError, TimeoutError as PoolTimeoutError
+from session_cache import SessionAggregateCache
+from validation import validate_tracking_data, validate_events, validate_timestamp, validate_url
+from utils import DataStreamError
+from ml_model import new_scroll_state
 
 logger = logging.getLogger(__name__)
 
-def validate_tracking_data(data):
-    """Validate incoming tracking data"""
+# Errors from the connection or a locked database rather than from the data, so a commit is worth retrying
+TRANSIENT_DB_ERRORS = (OperationalError, DisconnectionError, PoolTimeoutError)
+
+def validate_page_summary(data):
+    """Validate an aggregated page view summary posted by the tracker"""
     if not isinstance(data, dict):
         return False
     
-    required_fields = ['event_type', 'url']
-    
-    # Check if all required fields are present
-    for field in required_fields:
-        if field not in data:
-            return False
+    if not data.get('session_id') or not isinstance(data.get('session_id'), str):
+        return False
+    if not validate_url(data.get('url')):
+        return False
     
-    # Validate event type
-    valid_event_types = ['click', 'scroll', 'mousemove', 'pageview', 'hover', 'page_hidden', 'page_visible', 'page_unload']
-    if data.get('event_type') not in valid_event_types:
+    if not validate_timestamp(data.get('timestamp')):
         return False
     
-    # Validate URL format
-    url = data.get('url', '')
-    if not url or not isinstance(url, str):
+    grid_size = data.get('grid_size')
+    if not isinstance(grid_size, int) or isinstance(grid_size, bool) or grid_size <= 0:
         return False
     
-    # Validate coordinates for position-based events
-    if data.get('event_type') in ['click', 'mousemove', 'hover']:
-        try:
-            x = data.get('x')
-            y = data.get('y')
-            if x is not None:
-                float(x)
-            if y is not None:
-                float(y)
-        except (ValueError, TypeError):
+    # Mouse histogram keys are "cell_x,cell_y" with non-negative integer counts
+    mouse_grid = data.get('mouse_grid') or {}
+    if not isinstance(mouse_grid, dict):
+        return False
+    for cell, count in mouse_grid.items():
+        parts = cell.split(',') if isinstance(cell, str) else []
+        if len(parts) != 2 or not all(part.lstrip('-').isdigit() for part in parts):
+            return False
+        if not isinstance(count, int) or count < 0:
             return False
     
-    # Validate scroll depth for scroll events
-    if data.get('event_type') == 'scroll':
-        try:
-            scroll_depth = data.get('scroll_depth')
-            if scroll_depth is not None:
-                depth = float(scroll_depth)
-                if depth < 0 or depth > 100:
-                    return False
-        except (ValueError, TypeError):
+    # Scroll bands are ten 10% depth buckets
+    for field in ('scroll_bands', 'scroll_dwell_ms'):
+        values = data.get(field) or [0] * 10
+        if not isinstance(values, list) or len(values) != 10:
+            return False
+        if not all(isinstance(value, (int, float)) and value >= 0 for value in values):
             return False
     
+    try:
+        max_depth = float(data.get('max_scroll_depth') or 0)
+        float(data.get('scroll_depth_sum') or 0)
+        int(data.get('scroll_samples') or 0)
+        int(data.get('mouse_samples') or 0)
+    except (ValueError, TypeError):
+        return False
+    if max_depth < 0 or max_depth > 100:
+        return False
+    
     return True
 
-def save_tracking_event(db, TrackingEvent, AnalyticsSession, data):
+def save_page_summaries(db, PageViewSummary, summaries):
+    """Save aggregated page view summaries"""
+    try:
+        db.session.add_all([PageViewSummary.from_dict(data) for data in summaries])
+        db.session.commit()
+        return True
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error saving page summaries: {str(e)}")
+        db.session.rollback()
+        return False
+    except Exception as e:
+        logger.error(f"Error saving page summaries: {str(e)}")
+        db.session.rollback()
+        return False
+
+def get_page_summaries(db, PageViewSummary, days_back=None, filters=None):
+    """Get aggregated page view summaries from database"""
+    try:
+        query = PageViewSummary.query
+        
+        if days_back:
+            cutoff_date = datetime.utcnow() - timedelta(days=days_back)
+            query = query.filter(PageViewSummary.timestamp >= cutoff_date)
+        query = apply_event_filters(query, PageViewSummary, filters)
+        
+        return [summary.to_dict() for summary in query.all()]
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error loading page summaries: {str(e)}")
+        return []
+    except Exception as e:
+        logger.error(f"Error loading page summaries: {str(e)}")
+        return []
+
+def save_tracking_event(db, TrackingEvent, AnalyticsSession, data, session_cache=None):
     """Save tracking event to database"""
+    return save_tracking_events(db, TrackingEvent, AnalyticsSession, [data], session_cache=session_cache)
+
+def save_tracking_events(db, TrackingEvent, AnalyticsSession, events, session_cache=None):
+    """Save a batch of validated tracking events in a single transaction"""
     try:
-        # Create tracking event
-        event = TrackingEvent.from_dict(data)
-        db.session.add(event)
-        
-        # Update or create session
-        session_id = data.get('session_id')
-        if session_id:
-            session = AnalyticsSession.query.filter_by(session_id=session_id).first()
-            if not session:
-                session = AnalyticsSession(
-                    session_id=session_id,
-                    user_agent=data.get('user_agent'),
-                    initial_referrer=data.get('referrer'),
-                    initial_url=data.get('url'),
-                    event_count=0,
-                    pages_visited=0
-                )
-                db.session.add(session)
-            
-            # Ensure event_count is not None
-            if session.event_count is None:
-                session.event_count = 0
-            if session.pages_visited is None:
-                session.pages_visited = 0
-                
-            session.last_seen = datetime.utcnow()
-            session.event_count = session.event_count + 1
-            
-            # Count unique pages
-            if data.get('event_type') == 'pageview':
-                session.pages_visited = session.pages_visited + 1
+        commit_tracking_events(db, TrackingEvent, AnalyticsSession, events, session_cache=session_cache)
+        return True
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error saving tracking events: {str(e)}")
+        return False
+    except Exception as e:
+        logger.error(f"Error saving tracking events: {str(e)}")
+        return False
+
+def commit_tracking_events(db, TrackingEvent, AnalyticsSession, events, session_cache=None):
+    """Save a batch of validated tracking events in a single transaction, rolling back and re-raising on failure"""
+    if not events:
+        return
+    
+    try:
+        db.session.add_all([TrackingEvent.from_dict(data) for data in events])
+        
+        # Without a cache, apply session aggregates in the same transaction
+        if session_cache is None:
+            upsert_session_aggregates(db, AnalyticsSession, aggregate_sessions(events))
         
         db.session.commit()
-        return True
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    # Session counters are accumulated in memory and written periodically
+    if session_cache is not None:
+        for data in events:
+            session_cache.record(data)
+        if session_cache.flush_due():
+            flush_session_cache(db, AnalyticsSession, session_cache)
+
+def aggregate_sessions(events):
+    """Collapse a list of events into one aggregate row per session"""
+    cache = SessionAggregateCache(max_sessions=len(events))
+    for data in events:
+        cache.record(data)
+    return cache.drain()
+
+def conflict_insert(session):
+    """The insert() construct with ON CONFLICT clauses for session's database, or None if its dialect has none"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+def upsert_session_aggregates(db, AnalyticsSession, rows, chunk_size=500):
+    """Apply session aggregate rows with a single upsert per session"""
+    if not rows:
+        return
+    
+    table = AnalyticsSession.__table__
+    insert = conflict_insert(db.session)
+    now = datetime.utcnow()
+    
+    if insert is not None:
+        for start in range(0, len(rows), chunk_size):
+            values = [dict(row, created_at=now, updated_at=now) for row in rows[start:start + chunk_size]]
+            stmt = insert(table).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.session_id],
+                set_={
+                    'event_count': func.coalesce(table.c.event_count, 0) + stmt.excluded.event_count,
+                    'pages_visited': func.coalesce(table.c.pages_visited, 0) + stmt.excluded.pages_visited,
+                    'last_seen': stmt.excluded.last_seen,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+        return
+    
+    # Fallback for dialects without INSERT ... ON CONFLICT: one read-modify-write per session
+    session_ids = [row['session_id'] for row in rows]
+    existing = AnalyticsSession.query.filter(AnalyticsSession.session_id.in_(session_ids)).all()
+    sessions = {session.session_id: session for session in existing}
+    
+    for row in rows:
+        session = sessions.get(row['session_id'])
+        if not session:
+            session = AnalyticsSession(
+                session_id=row['session_id'],
+                user_agent=row['user_agent'],
+                initial_referrer=row['initial_referrer'],
+                initial_url=row['initial_url'],
+                first_seen=row['first_seen'],
+                event_count=0,
+                pages_visited=0
+            )
+            db.session.add(session)
         
+        session.last_seen = row['last_seen']
+        session.event_count = (session.event_count or 0) + row['event_count']
+        session.pages_visited = (session.pages_visited or 0) + row['pages_visited']
+
+def flush_session_cache(db, AnalyticsSession, session_cache):
+    """Write pending session aggregates from the cache to the database"""
+    rows = session_cache.drain()
+    if not rows:
+        return True
+    
+    try:
+        upsert_session_aggregates(db, AnalyticsSession, rows)
+        db.session.commit()
+        return True
+    
     except SQLAlchemyError as e:
-        logger.error(f"Database error saving tracking event: {str(e)}")
+        logger.error(f"Database error flushing session aggregates: {str(e)}")
         db.session.rollback()
+        session_cache.restore(rows)
         return False
     except Exception as e:
-        logger.error(f"Error saving tracking event: {str(e)}")
+        logger.error(f"Error flushing session aggregates: {str(e)}")
         db.session.rollback()
+        session_cache.restore(rows)
         return False
 
-def get_tracking_data(db, TrackingEvent, limit=None, days_back=None):
-    """Get tracking data from database"""
+def get_tracking_data(db, TrackingEvent, limit=None, days_back=None, filters=None, epoch=False):
+    """Get tracking data from database, with epoch millisecond timestamps if epoch is set; raises DataStreamError if loading fails"""
     try:
-        query = TrackingEvent.query
+        # to_dict() includes extra fields, so load them with the rows rather than one query each
+        query = TrackingEvent.query.options(undefer(TrackingEvent.additional_data))
         
         # Filter by date if specified
         if days_back:
             cutoff_date = datetime.utcnow() - timedelta(days=days_back)
             query = query.filter(TrackingEvent.timestamp >= cutoff_date)
-        
-        # Apply limit if specified
-        if limit:
-            query = query.limit(limit)
+        query = apply_event_filters(query, TrackingEvent, filters)
         
         # Order by timestamp descending
         query = query.order_by(desc(TrackingEvent.timestamp))
         
+        # Apply limit if specified, after ordering so the most recent events are kept
+        if limit:
+            query = query.limit(limit)
+        
         events = query.all()
-        return [event.to_dict() for event in events]
+        TrackingEvent.load_dimensions(events)
+        return [event.to_dict(epoch=epoch) for event in events]
         
+    # An empty list would read as "no events" and be analysed, cached and exported as such
     except SQLAlchemyError as e:
         logger.error(f"Database error loading tracking data: {str(e)}")
-        return []
+        raise DataStreamError('Database error loading tracking data') from e
     except Exception as e:
         logger.error(f"Error loading tracking data: {str(e)}")
-        return []
+        raise DataStreamError('Error loading tracking data') from e
 
-def get_analytics_summary(db, TrackingEvent, AnalyticsSession):
-    """Get analytics summary from database"""
+# Event types that page view summaries pre-aggregate
+SUMMARY_EVENT_TYPES = frozenset(['scroll', 'mousemove'])
+
+# Dialects with the integer casts and grouping used by the SQL-side aggregations
+SQL_AGGREGATION_DIALECTS = ('postgresql', 'sqlite')
+
+def apply_event_filters(query, model, filters):
+    """Apply analytics filters (url, start/end time, viewport width range, event types, extra data) to a query on events or page summaries"""
+    # Plain column comparisons, so url + time filters become range scans on (url, event_type, timestamp)
+    if not filters:
+        return query
+    
+    if filters.get('url'):
+        query = query.filter(model.url == filters['url'])
+    if filters.get('start'):
+        query = query.filter(model.timestamp >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(model.timestamp < filters['end'])
+    if filters.get('min_viewport_width') is not None:
+        query = query.filter(model.viewport_width >= filters['min_viewport_width'])
+    if filters.get('max_viewport_width') is not None:
+        query = query.filter(model.viewport_width <= filters['max_viewport_width'])
+    
+    event_types = filters.get('event_types')
+    if event_types:
+        if hasattr(model, 'event_type'):
+            query = query.filter(model.event_type.in_(list(event_types)))
+        elif not set(event_types) & SUMMARY_EVENT_TYPES:
+            # Page summaries aggregate scroll and mousemove events only
+            query = query.filter(false())
+    
+    # Extra data keys compare as text, evaluated by the database on the JSON column
+    extra = filters.get('extra')
+    if extra:
+        if hasattr(model, 'additional_data'):
+            for key, value in extra.items():
+                query = query.filter(cast(model.additional_data[key].as_string(), String) == value)
+        else:
+            # Page summaries carry no extra data
+            query = query.filter(false())
+    
+    return query
+
+def _truncate_to_int(expr, dialect):
+    """Cast a float expression to an integer, truncating toward zero like Python's int()"""
+    if dialect == 'postgresql':
+        # PostgreSQL rounds on cast, so truncate first
+        return cast(func.trunc(expr), Integer)
+    return cast(expr, Integer)
+
+def _floor_to_cell(int_expr, cell_size):
+    """SQL equivalent of Python's value // cell_size * cell_size for integers of either sign"""
+    # SQL integer division truncates toward zero, so negative values are floored by hand
+    return case(
+        (int_expr >= 0, int_expr // cell_size),
+        else_=-((cell_size - 1 - int_expr) // cell_size)
+    ) * cell_size
+
+def aggregate_heatmap_bins(db, TrackingEvent, filters=None, cell_size=20, after_event_id=None):
+    """Count clicks per heatmap cell in the database; returns {(x, y): count}, or None when unsupported"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
     try:
-        # Get total events
-        total_events = db.session.query(func.count(TrackingEvent.id)).scalar() or 0
+        x_cell = _floor_to_cell(_truncate_to_int(func.coalesce(TrackingEvent.x, 0), dialect), cell_size)
+        y_cell = _floor_to_cell(_truncate_to_int(func.coalesce(TrackingEvent.y, 0), dialect), cell_size)
+        
+        query = db.session.query(x_cell, y_cell, func.count(TrackingEvent.id)).filter(
+            TrackingEvent.event_type == 'click'
+        )
+        if after_event_id:
+            query = query.filter(TrackingEvent.id > after_event_id)
+        query = apply_event_filters(query, TrackingEvent, filters).group_by(x_cell, y_cell)
+        
+        return {(x, y): count for x, y, count in query.all()}
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error aggregating heatmap: {str(e)}")
+        db.session.rollback()
+        return None
+
+def _json_array_item(column, index, dialect):
+    """Number at index of a JSON array stored as text, or NULL when absent"""
+    if dialect == 'postgresql':
+        return cast(func.json_extract_path_text(cast(column, PG_JSON), str(index)), Float)
+    return func.json_extract(column, f'$[{index}]')
+
+def _json_object_items(column, dialect):
+    """Table-valued (key, value) rows of a JSON object stored as text, joinable to the row holding it"""
+    if dialect == 'postgresql':
+        return func.json_each_text(cast(column, PG_JSON)).table_valued('key', 'value')
+    return func.json_each(column).table_valued('key', 'value')
+
+def _as_count(value):
+    """Summed JSON numbers come back as floats on some dialects; keep whole counts integral"""
+    value = value or 0
+    return int(value) if value == int(value) else value
+
+def aggregate_mouse_grid(db, PageViewSummary, filters=None):
+    """Sum page summary mouse histograms per pixel cell in the database; returns {(x, y): count}, or None when unsupported"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
+    try:
+        # Grids are summed per (grid size, cell) in SQL, so only distinct cells reach Python
+        cells = _json_object_items(PageViewSummary.mouse_grid, dialect)
+        query = db.session.query(
+            PageViewSummary.grid_size, cells.c.key, func.sum(cast(cells.c.value, Integer))
+        ).select_from(PageViewSummary).join(cells, true())
+        query = apply_event_filters(query, PageViewSummary, filters).group_by(PageViewSummary.grid_size, cells.c.key)
         
+        movement_cells = {}
+        for grid_size, cell, count in query.all():
+            grid_size = grid_size or 1
+            cell_x, cell_y = (int(part) for part in cell.split(','))
+            key = (cell_x * grid_size, cell_y * grid_size)
+            movement_cells[key] = movement_cells.get(key, 0) + count
+        return movement_cells
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error aggregating mouse grids: {str(e)}")
+        db.session.rollback()
+        return None
+
+def aggregate_summary_scroll(db, PageViewSummary, filters=None):
+    """Sum page summary scroll aggregates in the database; returns (scroll state, per-session depths select), or None when unsupported"""
+    # The scroll state also carries dwell_buckets; the select yields (session_id, max_depth) rows
+    # for aggregate_scroll_state to combine with the events' per-session maxima
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
+    try:
+        def summary_query(*columns):
+            query = db.session.query(*columns).filter(PageViewSummary.scroll_samples > 0)
+            return apply_event_filters(query, PageViewSummary, filters)
+        
+        band_columns = [func.sum(_json_array_item(PageViewSummary.scroll_bands, index, dialect)) for index in range(10)]
+        dwell_columns = [func.sum(_json_array_item(PageViewSummary.scroll_dwell_ms, index, dialect)) for index in range(10)]
+        row = summary_query(
+            func.sum(PageViewSummary.scroll_samples), func.sum(PageViewSummary.scroll_depth_sum),
+            func.max(PageViewSummary.max_scroll_depth), *band_columns, *dwell_columns
+        ).one()
+        
+        scroll_state = new_scroll_state()
+        scroll_state['count'] = row[0] or 0
+        scroll_state['depth_sum'] = row[1] or 0
+        scroll_state['max_depth'] = row[2] or 0
+        scroll_state['depth_buckets'] = [_as_count(value) for value in row[3:13]]
+        scroll_state['dwell_buckets'] = [_as_count(value) for value in row[13:23]]
+        
+        session_depths = summary_query(
+            PageViewSummary.session_id.label('session_id'), func.max(PageViewSummary.max_scroll_depth).label('max_depth')
+        ).group_by(PageViewSummary.session_id).statement
+        return scroll_state, session_depths
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error aggregating page summary scroll data: {str(e)}")
+        db.session.rollback()
+        return None
+
+def aggregate_summary_samples(db, PageViewSummary, filters=None):
+    """Sum page summary mouse and scroll samples per session in the database; returns {session_id: samples}, or None on error"""
+    try:
+        query = db.session.query(
+            PageViewSummary.session_id,
+            func.sum(func.coalesce(PageViewSummary.mouse_samples, 0) + func.coalesce(PageViewSummary.scroll_samples, 0))
+        )
+        query = apply_event_filters(query, PageViewSummary, filters).group_by(PageViewSummary.session_id)
+        return {session_id: _as_count(samples) for session_id, samples in query.all()}
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error aggregating page summary samples: {str(e)}")
+        db.session.rollback()
+        return None
+
+def aggregate_scroll_state(db, TrackingEvent, filters=None, after_event_id=None, scroll_state=None, session_depths=None):
+    """Compute scroll depth aggregates in the database in the analyzer's scroll state shape, or None when unsupported"""
+    # scroll_state and session_depths (selects of session_id, max_depth rows) carry pre-aggregated data,
+    # e.g. from rollups or page summaries, that the raw events after after_event_id are combined with
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
+    try:
+        depth = func.coalesce(TrackingEvent.scroll_depth, 0.0)
+        
+        def scroll_query(*columns):
+            query = db.session.query(*columns).filter(TrackingEvent.event_type == 'scroll')
+            if after_event_id:
+                query = query.filter(TrackingEvent.id > after_event_id)
+            return apply_event_filters(query, TrackingEvent, filters)
+        
+        scroll_state = scroll_state or new_scroll_state()
+        
+        # Depth distribution in 10% buckets; totals are summed from the buckets
+        bucket = case((depth >= 90, 9), (depth < 10, 0), else_=_truncate_to_int(depth / 10.0, dialect))
+        bucket_rows = scroll_query(
+            bucket, func.count(TrackingEvent.id), func.sum(depth), func.max(depth)
+        ).group_by(bucket).all()
+        for index, count, depth_sum, max_depth in bucket_rows:
+            scroll_state['depth_buckets'][index] += count
+            scroll_state['count'] += count
+            scroll_state['depth_sum'] += depth_sum or 0
+            scroll_state['max_depth'] = max(scroll_state['max_depth'], max_depth or 0)
+        
+        if not scroll_state['count']:
+            return scroll_state
+        
+        # Bounce rate needs the maximum depth per session, computed in a grouped subquery
+        per_session = scroll_query(
+            TrackingEvent.session_id.label('session_id'), func.max(depth).label('max_depth')
+        ).group_by(TrackingEvent.session_id)
+        if session_depths:
+            combined = union_all(per_session, *session_depths).subquery()
+            per_session = db.session.query(
+                combined.c.session_id.label('session_id'), func.max(combined.c.max_depth).label('max_depth')
+            ).group_by(combined.c.session_id)
+        per_session = per_session.subquery()
+        
+        # Sessions are counted in the database, so no session ids are sent back and forth
+        session_count, low_engagement_sessions = db.session.query(
+            func.count(), func.sum(case((per_session.c.max_depth < 25, 1), else_=0))
+        ).select_from(per_session).one()
+        scroll_state['session_count'] += session_count
+        scroll_state['low_engagement_sessions'] += low_engagement_sessions or 0
+        
+        return scroll_state
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error aggregating scroll depth: {str(e)}")
+        db.session.rollback()
+        return None
+
+def iter_tracking_data(db, TrackingEvent, days_back=None, batch_size=1000, columns=None, event_types=None, filters=None):
+    """Stream tracking events as dictionaries without materializing the whole table; raises DataStreamError if reading fails"""
+    try:
+        if columns:
+            # Project only the requested columns; rows skip to_dict() and extra-data decoding
+            unknown = set(columns) - set(TrackingEvent.__table__.columns.keys())
+            if unknown:
+                raise ValueError(f"Unknown tracking event columns: {sorted(unknown)}")
+            query = db.session.query(*[getattr(TrackingEvent, column) for column in columns])
+        else:
+            query = TrackingEvent.query.options(undefer(TrackingEvent.additional_data))
+        
+        if event_types:
+            query = query.filter(TrackingEvent.event_type.in_(list(event_types)))
+        query = apply_event_filters(query, TrackingEvent, filters)
+        
+        # Filter by date if specified
+        if days_back:
+            cutoff_date = datetime.utcnow() - timedelta(days=days_back)
+            query = query.filter(TrackingEvent.timestamp >= cutoff_date)
+        
+        # Analyses are order-independent, so only full rows pay for the sort
+        if not columns:
+            query = query.order_by(desc(TrackingEvent.timestamp))
+        
+        # Fetch in chunks through a server-side cursor where the driver supports one
+        query = query.yield_per(batch_size)
+        
+        if columns:
+            for row in query:
+                yield row._asdict()
+        else:
+            # Rehydrate interned strings a chunk at a time rather than per event
+            chunk = []
+            for event in query:
+                chunk.append(event)
+                if len(chunk) == batch_size:
+                    TrackingEvent.load_dimensions(chunk)
+                    yield from (event.to_dict() for event in chunk)
+                    chunk = []
+            TrackingEvent.load_dimensions(chunk)
+            yield from (event.to_dict() for event in chunk)
+        
+    # Rows may already have been consumed, so fail the consumer rather than end the stream early
+    except SQLAlchemyError as e:
+        logger.error(f"Database error streaming tracking data: {str(e)}")
+        raise DataStreamError('Database error streaming tracking data') from e
+    except Exception as e:
+        logger.error(f"Error streaming tracking data: {str(e)}")
+        raise DataStreamError('Error streaming tracking data') from e
+
+def get_data_version(db, TrackingEvent, PageViewSummary):
+    """Get a cheap version tag that changes whenever tracking events or page summaries are added"""
+    max_event_id = db.session.query(func.max(TrackingEvent.id)).scalar() or 0
+    max_summary_id = db.session.query(func.max(PageViewSummary.id)).scalar() or 0
+    return max_event_id, max_summary_id
+
+def get_analytics_summary(db, TrackingEvent, AnalyticsSession, event_type_stats=None):
+    """Get analytics summary from database"""
+    # event_type_stats optionally supplies precomputed (event type counts, earliest, latest), e.g. from rollups
+    try:
         # Get unique sessions
         unique_sessions = db.session.query(func.count(AnalyticsSession.id)).scalar() or 0
         
-        # Get event type distribution
-        event_types = {}
-        event_type_counts = db.session.query(
-            TrackingEvent.event_type,
-            func.count(TrackingEvent.id)
-        ).group_by(TrackingEvent.event_type).all()
+        if event_type_stats is not None:
+            event_types, earliest, latest = event_type_stats
+            event_types = dict(event_types)
+        else:
+            # Get event type distribution
+            event_types = {}
+            event_type_counts = db.session.query(
+                TrackingEvent.event_type,
+                func.count(TrackingEvent.id)
+            ).group_by(TrackingEvent.event_type).all()
+            
+            for event_type, count in event_type_counts:
+                event_types[event_type] = count
+            
+            earliest = db.session.query(func.min(TrackingEvent.timestamp)).scalar()
+            latest = db.session.query(func.max(TrackingEvent.timestamp)).scalar()
         
-        for event_type, count in event_type_counts:
-            event_types[event_type] = count
+        # Get total events
+        total_events = sum(event_types.values())
         
         # Calculate events per session
         events_per_session = round(total_events / unique_sessions, 2) if unique_sessions else 0
         
         # Get time range
         time_range = None
-        earliest = db.session.query(func.min(TrackingEvent.timestamp)).scalar()
-        latest = db.session.query(func.max(TrackingEvent.timestamp)).scalar()
         
         if earliest and latest:
             time_range = {
@@ -218,15 +648,58 @@ def clean_old_data(db, TrackingEvent, AnalyticsSession, days_to_keep=30):
         db.session.rollback()
         return False
 
-def get_export_data(db, TrackingEvent, AnalyticsSession):
-    """Get all data for export"""
+def apply_session_filters(query, AnalyticsSession, filters):
+    """Limit a session query to sessions overlapping the filtered time window"""
+    if filters and filters.get('start'):
+        query = query.filter(AnalyticsSession.last_seen >= filters['start'])
+    if filters and filters.get('end'):
+        query = query.filter(AnalyticsSession.first_seen < filters['end'])
+    return query
+
+def _key_after(key_columns, key):
+    """Predicate selecting rows strictly after key in key_columns order"""
+    if len(key_columns) == 1:
+        return key_columns[0] > key[0]
+    return tuple_(*key_columns) > tuple(key)
+
+def find_page_end(query, key_columns, after_key=None, limit=1000):
+    """Key of the last of the next `limit` rows after after_key, or None if no rows follow it"""
+    if after_key is not None:
+        query = query.filter(_key_after(key_columns, after_key))
+    rows = query.with_entities(*key_columns).order_by(*key_columns).offset(limit - 1).limit(2).all()
+    return tuple(rows[0]) if len(rows) == 2 else None
+
+def iter_keyset_pages(query, key_columns, after_key=None, through_key=None, page_size=1000):
+    """Yield pages of rows ordered by key_columns, after after_key and up to and including through_key"""
+    # Each page is a fresh index range scan (events seek on ix_tracking_events_timestamp_id, sessions on
+    # the primary key), so memory and per-query cost stay flat however far in
+    if through_key is not None:
+        query = query.filter(~_key_after(key_columns, through_key))
+    query = query.order_by(*key_columns)
+    
+    while True:
+        page_query = query
+        if after_key is not None:
+            page_query = page_query.filter(_key_after(key_columns, after_key))
+        rows = page_query.limit(page_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after_key = tuple(getattr(rows[-1], column.key) for column in key_columns)
+
+def get_export_data(db, TrackingEvent, AnalyticsSession, events=None, filters=None, epoch=False):
+    """Get all data for export, with epoch millisecond times if epoch is set"""
+    # events may pass tracking events the caller already loaded, so they are not queried twice
     try:
         # Get all tracking events
-        events = get_tracking_data(db, TrackingEvent, limit=None)
+        if events is None:
+            events = get_tracking_data(db, TrackingEvent, limit=None, filters=filters, epoch=epoch)
         
-        # Get all sessions
-        sessions = AnalyticsSession.query.all()
-        session_data = [session.to_dict() for session in sessions]
+        # Get all sessions, limited to those overlapping the requested time window
+        sessions = apply_session_filters(AnalyticsSession.query, AnalyticsSession, filters).all()
+        session_data = [session.to_dict(epoch=epoch) for session in sessions]
         
         return {
             'events': events,
@@ -236,6 +709,8 @@ def get_export_data(db, TrackingEvent, AnalyticsSession):
             'total_sessions': len(session_data)
         }
         
+    except DataStreamError:
+        raise
     except SQLAlchemyError as e:
         logger.error(f"Database error getting export data: {str(e)}")
         return {
@@ -0,0 +1,62 @@
+"""Bounded duplicate filter for client-supplied tracking event IDs"""
+
+import threading
+import time
+
+class RecentEventFilter:
+    """Time-windowed duplicate filter built from two rotating hash sets"""
+    
+    def __init__(self, window_seconds=600, max_entries=200000):
+        # IDs are remembered for between half and all of the window; each generation
+        # holds at most half of max_entries and rotates early when full
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._current = set()
+        self._previous = set()
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.checked = 0
+        self.duplicates = 0
+    
+    def seen(self, session_id, event_id):
+        """Record an event ID and report whether it was already seen"""
+        key = self._key(session_id, event_id)
+        with self._lock:
+            self._maybe_rotate()
+            self.checked += 1
+            if key in self._current or key in self._previous:
+                self.duplicates += 1
+                return True
+            self._current.add(key)
+            return False
+    
+    def forget(self, session_id, event_id):
+        """Drop an event ID again, e.g. when the event could not be stored"""
+        key = self._key(session_id, event_id)
+        with self._lock:
+            self._current.discard(key)
+            self._previous.discard(key)
+    
+    def stats(self):
+        """Get filter counters for monitoring"""
+        return {
+            'entries': len(self._current) + len(self._previous),
+            'max_entries': self.max_entries,
+            'checked': self.checked,
+            'duplicates': self.duplicates
+        }
+    
+    @staticmethod
+    def _key(session_id, event_id):
+        # Store fixed-size hashes rather than the strings themselves
+        return hash((session_id, str(event_id)))
+    
+    def _maybe_rotate(self):
+        """Start a new generation when the half-window elapses or the current one is full"""
+        now = time.monotonic()
+        if now - self._rotated_at >= self.window_seconds / 2 or len(self._current) >= self.max_entries // 2:
+            self._previous = self._current
+            self._current = set()
+            self._rotated_at = now
@@ -0,0 +1,178 @@
+"""Interned lookup tables for strings that repeat across tracking events"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, select
+from db_utils import conflict_insert
+
+# Session.info key for values interned by the session's open transaction
+PENDING_KEY = 'interned_dimension_values'
+
+def value_hash(value):
+    """Stable digest used as the unique key of an interned string"""
+    return hashlib.sha256(value.encode('utf-8', 'surrogatepass')).hexdigest()
+
+class DimensionCache:
+    """LRU cache of string <-> id for one dimension table, inserting unseen strings on lookup"""
+    
+    def __init__(self, db, model, max_entries=10000):
+        self.db = db
+        self.model = model
+        self.max_entries = max_entries
+        self._ids = OrderedDict()
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.hits = 0
+        self.misses = 0
+    
+    def _remember(self, value, row_id):
+        with self._lock:
+            self._ids[value] = row_id
+            self._ids.move_to_end(value)
+            self._values[row_id] = value
+            self._values.move_to_end(row_id)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+    
+    def _staged(self, session, create=False):
+        """Mappings added by session's open transaction, as (value -> id, id -> value)"""
+        pending = session.info.get(PENDING_KEY)
+        if pending is None:
+            if not create:
+                return None
+            pending = session.info[PENDING_KEY] = {}
+        staged = pending.get(self)
+        if staged is None and create:
+            staged = pending[self] = ({}, {})
+        return staged
+    
+    def intern(self, value):
+        """Get the id for value, adding it to the dimension table if it is new"""
+        if value is None:
+            return None
+        
+        with self._lock:
+            row_id = self._ids.get(value)
+            if row_id is not None:
+                self._ids.move_to_end(value)
+                self.hits += 1
+                return row_id
+        
+        session = self.db.session
+        staged = self._staged(session)
+        if staged is not None and value in staged[0]:
+            self.hits += 1
+            return staged[0][value]
+        self.misses += 1
+        
+        table = self.model.__table__
+        digest = value_hash(value)
+        lookup = select(table.c.id).where(table.c.value_hash == digest)
+        
+        # Nothing the caller has pending needs to be flushed to resolve a lookup
+        with session.no_autoflush:
+            row_id = session.execute(lookup).scalar()
+            if row_id is not None:
+                # Found without inserting, so the row is already committed
+                self._remember(value, row_id)
+                return row_id
+            
+            insert = conflict_insert(session)
+            if insert is not None:
+                # A concurrent writer may intern the same value; either insert wins
+                stmt = insert(table).values(value_hash=digest, value=value).on_conflict_do_nothing(
+                    index_elements=[table.c.value_hash]
+                )
+                session.execute(stmt)
+            else:
+                # Fallback for dialects without INSERT ... ON CONFLICT
+                session.execute(table.insert().values(value_hash=digest, value=value))
+            row_id = session.execute(lookup).scalar()
+        
+        # The row may be this transaction's own uncommitted insert, so other threads
+        # only see the mapping once it commits; see _publish_committed
+        staged = self._staged(session, create=True)
+        staged[0][value] = row_id
+        staged[1][row_id] = value
+        return row_id
+    
+    def value(self, row_id):
+        """Get the string for an id, loading it from the dimension table on a miss"""
+        if row_id is None:
+            return None
+        
+        with self._lock:
+            value = self._values.get(row_id)
+            if value is not None:
+                self._values.move_to_end(row_id)
+                self.hits += 1
+                return value
+        
+        staged = self._staged(self.db.session)
+        if staged is not None and row_id in staged[1]:
+            self.hits += 1
+            return staged[1][row_id]
+        self.misses += 1
+        
+        table = self.model.__table__
+        with self.db.session.no_autoflush:
+            value = self.db.session.execute(select(table.c.value).where(table.c.id == row_id)).scalar()
+        if value is not None:
+            self._remember(value, row_id)
+        return value
+    
+    def load(self, row_ids, chunk_size=500):
+        """Cache the strings for many ids with one query per chunk, so rehydrating a page of events is not a query per row"""
+        with self._lock:
+            missing = {row_id for row_id in row_ids if row_id is not None and row_id not in self._values}
+        staged = self._staged(self.db.session)
+        if staged is not None:
+            missing -= staged[1].keys()
+        if not missing:
+            return
+        
+        table = self.model.__table__
+        missing = sorted(missing)
+        with self.db.session.no_autoflush:
+            for start in range(0, len(missing), chunk_size):
+                rows = self.db.session.execute(
+                    select(table.c.id, table.c.value).where(table.c.id.in_(missing[start:start + chunk_size]))
+                ).all()
+                for row_id, value in rows:
+                    self._remember(value, row_id)
+    
+    def clear(self):
+        """Drop all cached mappings"""
+        with self._lock:
+            self._ids.clear()
+            self._values.clear()
+    
+    def stats(self):
+        """Get cache counters for monitoring"""
+        return {
+            'entries': len(self._ids),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+def _publish_committed(session):
+    # Rows inserted by the committed transaction are now visible to every connection
+    for cache, (ids, _) in session.info.pop(PENDING_KEY, {}).items():
+        for value, row_id in ids.items():
+            cache._remember(value, row_id)
+
+def _drop_uncommitted(session, transaction):
+    # Rolled back or closed without committing: the staged ids may not exist
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+def track_session(session):
+    """Publish interned values to the shared caches only when the transaction that inserted them commits"""
+    event.listen(session, 'after_commit', _publish_committed)
+    event.listen(session, 'after_transaction_end', _drop_uncommitted)
@@ -0,0 +1,282 @@
+"""Streamed export formats and resumable export cursors"""
+
+import base64
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from utils import to_epoch_ms
+
+# Columnar exports use whichever of these is installed
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Tables a streamed export can page through
+EXPORT_TABLES = ('events', 'sessions')
+
+EVENT_CSV_COLUMNS = (
+    'id', 'session_id', 'event_type', 'url', 'timestamp', 'x', 'y', 'scroll_depth', 'scroll_top',
+    'document_height', 'element_type', 'element_text', 'element_id', 'element_class',
+    'viewport_width', 'viewport_height', 'user_agent', 'referrer', 'page_title', 'additional_data'
+)
+SESSION_CSV_COLUMNS = (
+    'id', 'session_id', 'first_seen', 'last_seen', 'event_count', 'pages_visited', 'user_agent',
+    'initial_referrer', 'initial_url', 'duration_seconds'
+)
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+COLUMNAR_CONTENT_TYPES = {
+    'npz': 'application/octet-stream',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Event columns in columnar exports and their storage kind. Repeated strings are dictionary
+# encoded and timestamps are int64 epoch milliseconds.
+COLUMNAR_EVENT_COLUMNS = (
+    ('id', 'int64'),
+    ('session_id', 'string'),
+    ('event_type', 'dictionary'),
+    ('url', 'dictionary'),
+    ('timestamp', 'timestamp'),
+    ('x', 'float64'),
+    ('y', 'float64'),
+    ('scroll_depth', 'float64'),
+    ('scroll_top', 'float64'),
+    ('document_height', 'float64'),
+    ('element_type', 'dictionary'),
+    ('element_id', 'string'),
+    ('element_text', 'string'),
+    ('element_class', 'string'),
+    ('viewport_width', 'int32'),
+    ('viewport_height', 'int32'),
+    ('user_agent', 'string'),
+    ('referrer', 'string'),
+    ('page_title', 'string'),
+    ('additional_data', 'json')
+)
+
+def encode_cursor(table, key):
+    """Encode a keyset position as an opaque URL-safe token"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    payload = json.dumps({'table': table, 'key': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, table):
+    """Decode a cursor token for the given table; raises ValueError if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    
+    if not isinstance(payload, dict) or payload.get('table') != table or not isinstance(payload.get('key'), list):
+        raise ValueError('Invalid cursor')
+    
+    key = payload['key']
+    if table == 'events':
+        # Events are paged by (timestamp, id)
+        if len(key) != 2 or not isinstance(key[0], str) or not isinstance(key[1], int):
+            raise ValueError('Invalid cursor')
+        return (datetime.fromisoformat(key[0]), key[1])
+    
+    if len(key) != 1 or not isinstance(key[0], int):
+        raise ValueError('Invalid cursor')
+    return (key[0],)
+
+def event_csv_row(event):
+    """Flatten an exported event, folding any extra fields into additional_data"""
+    row = {column: event.get(column) for column in EVENT_CSV_COLUMNS}
+    extra = {key: value for key, value in event.items() if key not in row}
+    row['additional_data'] = json.dumps(extra) if extra else None
+    return row
+
+def ndjson_chunk(records):
+    """Serialize records as newline-delimited JSON"""
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+def csv_chunk(rows, columns, header=False):
+    """Serialize rows (dicts) as CSV text, optionally preceded by the header line"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+def columnar_formats():
+    """Columnar export formats whose library is installed"""
+    return [name for name, module in (('npz', np), ('arrow', pa)) if module is not None]
+
+class StringDictionary:
+    """Assigns each distinct string a stable integer code across row groups"""
+    
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+    
+    def encode(self, values):
+        """Codes for values, with None kept as None"""
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(None)
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes.append(code)
+        return codes
+
+class _ByteSink:
+    """Write-only file object whose contents are drained after each row group"""
+    
+    closed = False
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class ColumnarEventWriter:
+    """Encodes pages of event rows as row groups, returning the bytes to send for each"""
+    
+    def __init__(self):
+        self.sink = _ByteSink()
+        self.dictionaries = {name: StringDictionary() for name, kind in COLUMNAR_EVENT_COLUMNS if kind == 'dictionary'}
+        self.row_groups = 0
+    
+    def columns(self, rows):
+        """Column name to list of values for a page of rows, strings encoded and timestamps as epoch ms"""
+        columns = {}
+        for name, kind in COLUMNAR_EVENT_COLUMNS:
+            values = [getattr(row, name) for row in rows]
+            if kind == 'dictionary':
+                values = self.dictionaries[name].encode(values)
+            elif kind == 'timestamp':
+                # Rows carry the stored epoch milliseconds as <name>_ms; rows stored without them are converted
+                stored = [getattr(row, f'{name}_ms', None) for row in rows]
+                values = [
+                    ms if ms is not None else (None if value is None else to_epoch_ms(value))
+                    for ms, value in zip(stored, values)
+                ]
+            elif kind == 'json':
+                values = [None if value is None else json.dumps(value) for value in values]
+            columns[name] = values
+        return columns
+    
+    def write_row_group(self, rows):
+        self._write(self.columns(rows))
+        self.row_groups += 1
+        return self.sink.drain()
+    
+    def close(self):
+        self._close()
+        return self.sink.drain()
+
+class NpzEventWriter(ColumnarEventWriter):
+    """Streams a .npz archive with one array per column per row group ("00000/url", ...)
+    
+    Dictionary columns hold int32 codes into "dictionary/<column>", written at the end. Missing
+    values are NaN for floats, -1 for integer codes and viewports, and "" for strings.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        # zipfile writes data descriptors when it cannot seek, so the archive streams as it is built
+        self.archive = zipfile.ZipFile(self.sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    
+    def _array(self, name, array):
+        with self.archive.open(f'{name}.npy', 'w', force_zip64=True) as handle:
+            np.lib.format.write_array(handle, array, allow_pickle=False)
+    
+    def _write(self, columns):
+        for name, kind in COLUMNAR_EVENT_COLUMNS:
+            values = columns[name]
+            if kind == 'float64':
+                array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            elif kind in ('dictionary', 'int32'):
+                array = np.array([-1 if value is None else value for value in values], dtype=np.int32)
+            elif kind in ('string', 'json'):
+                array = np.array(['' if value is None else value for value in values], dtype=np.str_)
+            else:
+                array = np.array(values, dtype=np.int64)
+            self._array(f'{self.row_groups:05d}/{name}', array)
+    
+    def _close(self):
+        for name, dictionary in self.dictionaries.items():
+            self._array(f'dictionary/{name}', np.array(dictionary.values, dtype=np.str_))
+        self.archive.close()
+
+class ArrowEventWriter(ColumnarEventWriter):
+    """Streams an Arrow IPC stream with one record batch per row group"""
+    
+    ARROW_TYPES = {
+        'int64': 'int64',
+        'int32': 'int32',
+        'float64': 'float64',
+        'string': 'string',
+        'json': 'string'
+    }
+    
+    def __init__(self):
+        super().__init__()
+        fields = []
+        for name, kind in COLUMNAR_EVENT_COLUMNS:
+            if kind == 'dictionary':
+                field_type = pa.dictionary(pa.int32(), pa.string())
+            elif kind == 'timestamp':
+                field_type = pa.timestamp('ms')
+            else:
+                field_type = pa.type_for_alias(self.ARROW_TYPES[kind])
+            fields.append(pa.field(name, field_type))
+        self.schema = pa.schema(fields)
+        # Dictionaries only grow, so later batches send just the new entries
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        self.writer = pa.ipc.new_stream(self.sink, self.schema, options=options)
+    
+    def _write(self, columns):
+        arrays = []
+        for field in self.schema:
+            values = columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(values, type=pa.int32()),
+                    pa.array(self.dictionaries[field.name].values, type=pa.string())
+                ))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+    
+    def _close(self):
+        self.writer.close()
+
+COLUMNAR_WRITERS = {
+    'npz': NpzEventWriter,
+    'arrow': ArrowEventWriter
+}
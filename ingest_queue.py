@@ -0,0 +1,151 @@
+"""Write-behind queue for tracking event ingestion"""
+
+import logging
+import queue
+import time
+from background import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+class IngestQueue(BackgroundWorker):
+    """Bounded in-process queue drained by a background group-commit thread"""
+    
+    thread_name = 'ingest-flusher'
+    
+    def __init__(self, flush_func, max_size=10000, batch_size=200, max_latency=0.5, max_retries=3, retry_backoff=0.2,
+                 transient_errors=(), on_drop=None):
+        # flush_func commits a list of events and raises on failure. Only transient_errors are retried
+        # as they are; any other error is taken to come from the events, so the group is split instead.
+        # on_drop is called with events that could not be stored.
+        super().__init__()
+        self.flush_func = flush_func
+        self.transient_errors = tuple(transient_errors)
+        self.on_drop = on_drop
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=max_size)
+        
+        # Counters for monitoring
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retried = 0
+        self.splits = 0
+        self.dropped = 0
+        self.commits = 0
+    
+    def enqueue(self, event):
+        """Queue a single event, returning False when the queue is full"""
+        return self.enqueue_many([event]) == 1
+    
+    def enqueue_many(self, events):
+        """Queue events in order until the queue is full, returning how many were accepted"""
+        self.start()
+        
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                break
+            accepted += 1
+        
+        self.enqueued += accepted
+        self.rejected += len(events) - accepted
+        return accepted
+    
+    def shutdown(self, timeout=10):
+        """Stop the flusher thread and drain everything still queued"""
+        super().shutdown(timeout)
+        
+        # Flush anything left behind if the thread did not finish in time
+        while True:
+            batch = self._next_batch(block=False)
+            if not batch:
+                break
+            self._flush(batch)
+    
+    def stats(self):
+        """Get queue counters for monitoring"""
+        return {
+            'depth': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'splits': self.splits,
+            'dropped': self.dropped,
+            'commits': self.commits
+        }
+    
+    def _run(self):
+        """Drain the queue in groups until shutdown is requested"""
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping.is_set():
+                break
+    
+    def _next_batch(self, block=True):
+        """Collect up to batch_size events, waiting at most max_latency after the first one"""
+        try:
+            if block:
+                first = self._queue.get(timeout=self.max_latency)
+            else:
+                first = self._queue.get_nowait()
+        except queue.Empty:
+            return []
+        
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if block and remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _flush(self, batch):
+        """Commit one group of events, retrying transient errors and splitting the group on any other error"""
+        # Events were already acknowledged with 202, so a failed commit is retried in place;
+        # while it waits the queue fills up and new requests get 429 backpressure instead
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retried += 1
+                # Shutdown cuts the backoff short but still makes the remaining attempts
+                self._stopping.wait(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                self.flush_func(batch)
+                self.flushed += len(batch)
+                self.commits += 1
+                return
+            except self.transient_errors as e:
+                logger.warning(f"Error flushing ingest queue, retrying: {str(e)}")
+                self.failed += 1
+            except Exception as e:
+                # A data or integrity error fails every time, so bisect to isolate the bad events
+                self.failed += 1
+                if len(batch) > 1:
+                    self.splits += 1
+                    middle = len(batch) // 2
+                    self._flush(batch[:middle])
+                    self._flush(batch[middle:])
+                    return
+                logger.error(f"Error flushing ingest queue: {str(e)}")
+                break
+        
+        self.dropped += len(batch)
+        logger.error(f"Dropped {len(batch)} queued tracking events that could not be stored")
+        if self.on_drop is not None:
+            self.on_drop(batch)
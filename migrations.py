@@ -0,0 +1,98 @@
+"""Upgrade databases created by earlier versions of the models in place"""
+
+import logging
+from sqlalchemy import inspect, text, Text
+from dimensions import value_hash
+
+logger = logging.getLogger(__name__)
+
+# SQL expressions for the backfills, per dialect
+VALUE_HASH_SQL = {
+    'postgresql': "encode(sha256(convert_to({column}, 'UTF8')), 'hex')",
+    'sqlite': 'ux_value_hash({column})'
+}
+TIMESTAMP_MS_SQL = {
+    # Whole seconds plus truncated milliseconds, matching utils.to_epoch_ms
+    'postgresql': (
+        "CAST(EXTRACT(EPOCH FROM date_trunc('second', timestamp)) AS BIGINT) * 1000"
+        " + CAST(FLOOR(EXTRACT(MICROSECONDS FROM timestamp) / 1000) AS BIGINT) % 1000"
+    ),
+    # DateTime values are stored as "YYYY-MM-DD HH:MM:SS.ffffff"
+    'sqlite': "CAST(strftime('%s', timestamp) AS INTEGER) * 1000 + CAST(substr(timestamp, 21, 3) AS INTEGER)"
+}
+
+def upgrade_database(db):
+    """Create missing tables, then add and backfill the tracking_events columns and indexes they lack"""
+    import models
+    db.create_all()
+    
+    table = models.TrackingEvent.__table__
+    engine = db.engine
+    dialect = engine.dialect.name
+    columns = {column['name']: column for column in inspect(engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in columns]
+    legacy_text = [
+        (cache.model.__table__.name, id_column.removesuffix('_id'), id_column)
+        for cache, id_column in models.TrackingEvent.DIMENSIONS
+        if id_column not in columns and id_column.removesuffix('_id') in columns
+    ]
+    convert_json = dialect == 'postgresql' and isinstance(columns['additional_data']['type'], Text)
+    
+    if missing or convert_json:
+        if dialect not in VALUE_HASH_SQL:
+            raise RuntimeError(f'tracking_events needs upgrading by hand on {dialect}: add {[c.name for c in missing]}')
+        
+        # One transaction, so an interrupted upgrade is rerun from the start on the next launch
+        with engine.begin() as connection:
+            if dialect == 'sqlite':
+                # pysqlite only opens transactions before DML, so open it for the ALTERs too
+                connection.exec_driver_sql('BEGIN')
+                connection.connection.driver_connection.create_function(
+                    'ux_value_hash', 1, value_hash, deterministic=True
+                )
+            
+            for column in missing:
+                add_column(connection, table, column)
+            
+            # Intern the text the old columns hold and point each row at it
+            for dimension, text_column, id_column in legacy_text:
+                value_hash_sql = VALUE_HASH_SQL[dialect]
+                connection.execute(text(
+                    f'INSERT INTO {dimension} (value_hash, value) '
+                    f'SELECT DISTINCT {value_hash_sql.format(column=text_column)}, {text_column} '
+                    f'FROM {table.name} WHERE {text_column} IS NOT NULL '
+                    f'ON CONFLICT (value_hash) DO NOTHING'
+                ))
+                connection.execute(text(
+                    f'UPDATE {table.name} SET {id_column} = ('
+                    f'SELECT id FROM {dimension} WHERE value_hash = {value_hash_sql.format(column=text_column)}'
+                    f') WHERE {text_column} IS NOT NULL'
+                ))
+                logger.info(f'Moved {table.name}.{text_column} into {dimension}')
+            
+            if 'timestamp_ms' in [column.name for column in missing]:
+                connection.execute(text(f'UPDATE {table.name} SET timestamp_ms = {TIMESTAMP_MS_SQL[dialect]}'))
+            
+            # Extra data used to be JSON text; existing values parse as JSON
+            if convert_json:
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ALTER COLUMN additional_data TYPE jsonb '
+                    f"USING NULLIF(additional_data, '')::jsonb"
+                ))
+    
+    # create_all() skips existing tables, so add indexes introduced since they were created
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
+def add_column(connection, table, column):
+    """Add a nullable column of the model to an existing table"""
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}'
+    for foreign_key in column.foreign_keys:
+        ddl += f' REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})'
+    connection.execute(text(ddl))
+    logger.info(f'Added {table.name}.{column.name}')
+
+if __name__ == '__main__':
+    from app import app, db
+    with app.app_context():
+        upgrade_database(db)
@@ -1,97 +1,254 @@
 import json
 import logging
-from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 import math
+from utils import parse_timestamp_ms, format_epoch_ms, DataStreamError
+
+def new_scroll_state():
+    """Running scroll aggregates, filled one event at a time"""
+    return {
+        'count': 0,
+        'depth_sum': 0,
+        'max_depth': 0,
+        'depth_buckets': [0] * 10,
+        'max_scroll_per_session': defaultdict(int),
+        # Sessions counted in aggregate without being listed in max_scroll_per_session
+        'session_count': 0,
+        'low_engagement_sessions': 0
+    }
+
+def add_scroll_event(scroll_state, event):
+    """Fold a single scroll event into the running aggregates"""
+    depth = event.get('scroll_depth') or 0
+    session_id = event.get('session_id', 'unknown')
+    scroll_state['count'] += 1
+    scroll_state['depth_sum'] += depth
+    scroll_state['max_depth'] = max(scroll_state['max_depth'], depth)
+    # Depth distribution (in 10% buckets)
+    scroll_state['depth_buckets'][max(min(int(depth / 10), 9), 0)] += 1
+    max_scroll_per_session = scroll_state['max_scroll_per_session']
+    max_scroll_per_session[session_id] = max(max_scroll_per_session[session_id], depth)
+
+class SuggestionFeatures:
+    """Mergeable features the suggestion rules read, extracted from events in a single pass"""
+    
+    def __init__(self, track_scroll=True):
+        # Memory is O(sessions): per-session counters are the only unbounded state
+        self.track_scroll = track_scroll
+        self.total_events = 0
+        self.clicks_by_element_type = defaultdict(int)
+        self.session_event_counts = defaultdict(int)
+        self.scroll_state = new_scroll_state()
+    
+    @property
+    def click_count(self):
+        return sum(self.clicks_by_element_type.values())
+    
+    @property
+    def button_clicks(self):
+        return self.clicks_by_element_type.get('button', 0)
+    
+    def add(self, event):
+        """Fold one event into the features"""
+        event_type = event.get('event_type')
+        self.total_events += 1
+        self.session_event_counts[event.get('session_id', 'unknown')] += 1
+        if event_type == 'click':
+            self.clicks_by_element_type[event.get('element_type') or 'unknown'] += 1
+        elif event_type == 'scroll' and self.track_scroll:
+            add_scroll_event(self.scroll_state, event)
+    
+    def update(self, events):
+        """Fold any iterable of events into the features"""
+        for event in events:
+            self.add(event)
+        return self
+    
+    def merge(self, other):
+        """Combine features extracted from another shard of events"""
+        self.total_events += other.total_events
+        for element_type, count in other.clicks_by_element_type.items():
+            self.clicks_by_element_type[element_type] += count
+        for session_id, count in other.session_event_counts.items():
+            self.session_event_counts[session_id] += count
+        
+        scroll_state = self.scroll_state
+        other_scroll = other.scroll_state
+        scroll_state['count'] += other_scroll['count']
+        scroll_state['depth_sum'] += other_scroll['depth_sum']
+        scroll_state['max_depth'] = max(scroll_state['max_depth'], other_scroll['max_depth'])
+        for bucket, count in enumerate(other_scroll['depth_buckets']):
+            scroll_state['depth_buckets'][bucket] += count
+        max_scroll_per_session = scroll_state['max_scroll_per_session']
+        for session_id, depth in other_scroll['max_scroll_per_session'].items():
+            max_scroll_per_session[session_id] = max(max_scroll_per_session[session_id], depth)
+        return self
+    
+    def to_dict(self):
+        """Serialize the features, e.g. to merge them in another process"""
+        return {
+            'total_events': self.total_events,
+            'clicks_by_element_type': dict(self.clicks_by_element_type),
+            'session_event_counts': dict(self.session_event_counts),
+            'scroll': {
+                'count': self.scroll_state['count'],
+                'depth_sum': self.scroll_state['depth_sum'],
+                'max_depth': self.scroll_state['max_depth'],
+                'depth_buckets': list(self.scroll_state['depth_buckets']),
+                'max_scroll_per_session': dict(self.scroll_state['max_scroll_per_session'])
+            }
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild features serialized with to_dict()"""
+        features = cls()
+        features.total_events = data.get('total_events', 0)
+        features.clicks_by_element_type.update(data.get('clicks_by_element_type') or {})
+        features.session_event_counts.update(data.get('session_event_counts') or {})
+        scroll = data.get('scroll') or {}
+        features.scroll_state['count'] = scroll.get('count', 0)
+        features.scroll_state['depth_sum'] = scroll.get('depth_sum', 0)
+        features.scroll_state['max_depth'] = scroll.get('max_depth', 0)
+        features.scroll_state['depth_buckets'] = list(scroll.get('depth_buckets') or [0] * 10)
+        features.scroll_state['max_scroll_per_session'].update(scroll.get('max_scroll_per_session') or {})
+        return features
 
 class UXAnalyzer:
     """AI-powered UX analysis engine for generating insights and suggestions"""
     
+    # Heatmap cell size in pixels; the SQL aggregation in db_utils uses the same value
+    HEATMAP_CELL_SIZE = 20
+    
+    # Columns and event types each analysis reads (None means all event types),
+    # so the data layer can fetch only those and filter by event type in SQL
+    DATA_REQUIREMENTS = {
+        'heatmap': {
+            'columns': ('event_type', 'x', 'y'),
+            'event_types': ('click',)
+        },
+        'scroll': {
+            'columns': ('event_type', 'session_id', 'scroll_depth'),
+            'event_types': ('scroll',)
+        },
+        'suggestions': {
+            'columns': ('event_type', 'session_id', 'element_type', 'scroll_depth'),
+            'event_types': None
+        }
+    }
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def generate_heatmap_data(self, tracking_data):
-        """Generate heatmap data from click events"""
+    def data_requirements(self, analysis):
+        """Get the columns and event types an analysis needs from the data layer"""
+        return dict(self.DATA_REQUIREMENTS[analysis])
+    
+    def generate_heatmap_data(self, tracking_data, summaries=None):
+        """Generate heatmap data from click events and aggregated mouse movement"""
         try:
-            heatmap_points = []
-            click_events = [d for d in tracking_data if d.get('event_type') == 'click']
+            cell = self.HEATMAP_CELL_SIZE
             
-            # Group clicks by coordinates
+            # Group clicks by coordinates in a single pass over any iterable
             click_clusters = defaultdict(int)
-            for event in click_events:
-                x = int(event.get('x', 0))
-                y = int(event.get('y', 0))
+            for event in tracking_data:
+                if event.get('event_type') != 'click':
+                    continue
+                x = int(event.get('x') or 0)
+                y = int(event.get('y') or 0)
                 # Cluster nearby clicks (within 20px radius)
-                cluster_key = (x // 20 * 20, y // 20 * 20)
+                cluster_key = (x // cell * cell, y // cell * cell)
                 click_clusters[cluster_key] += 1
             
-            # Convert to heatmap format
-            max_intensity = max(click_clusters.values()) if click_clusters else 1
-            for (x, y), count in click_clusters.items():
-                intensity = min(count / max_intensity, 1.0)
-                heatmap_points.append({
-                    'x': x,
-                    'y': y,
-                    'intensity': intensity,
-                    'count': count
-                })
-            
-            return {
-                'points': heatmap_points,
-                'total_clicks': len(click_events),
-                'clusters': len(heatmap_points)
-            }
+            return self.heatmap_from_clusters(click_clusters, summaries)
             
+        except DataStreamError:
+            # Failed reads must not pass for an analysis of less data
+            raise
         except Exception as e:
             self.logger.error(f"Error generating heatmap data: {str(e)}")
             return {'points': [], 'total_clicks': 0, 'clusters': 0}
     
-    def analyze_scroll_behavior(self, tracking_data):
+    def heatmap_from_clusters(self, click_clusters, summaries=None, movement_cells=None):
+        """Build heatmap data from click counts per cell, e.g. as aggregated in the database"""
+        # movement_cells optionally supplies page summary mouse counts already summed per pixel cell
+        heatmap_points = []
+        
+        # Convert to heatmap format
+        max_intensity = max(click_clusters.values()) if click_clusters else 1
+        for (x, y), count in sorted(click_clusters.items(), key=lambda item: (item[0][1], item[0][0])):
+            intensity = min(count / max_intensity, 1.0)
+            heatmap_points.append({
+                'x': x,
+                'y': y,
+                'intensity': intensity,
+                'count': count
+            })
+        
+        heatmap = {
+            'points': heatmap_points,
+            'total_clicks': sum(click_clusters.values()),
+            'clusters': len(heatmap_points)
+        }
+        
+        if movement_cells is not None:
+            heatmap.update(self._movement_heatmap(movement_cells))
+        elif summaries is not None:
+            heatmap.update(self._merge_mouse_grids(summaries))
+        
+        return heatmap
+    
+    def _merge_mouse_grids(self, summaries):
+        """Merge client-side mouse position histograms into movement heatmap points"""
+        movement_cells = defaultdict(int)
+        for summary in summaries:
+            grid_size = summary.get('grid_size') or 1
+            for cell, count in (summary.get('mouse_grid') or {}).items():
+                cell_x, cell_y = (int(part) for part in cell.split(','))
+                movement_cells[(cell_x * grid_size, cell_y * grid_size)] += count
+        
+        return self._movement_heatmap(movement_cells)
+    
+    def _movement_heatmap(self, movement_cells):
+        """Build movement heatmap points from mouse counts per pixel cell"""
+        total_movements = sum(movement_cells.values())
+        max_count = max(movement_cells.values()) if movement_cells else 1
+        movement_points = [
+            {'x': x, 'y': y, 'intensity': min(count / max_count, 1.0), 'count': count}
+            for (x, y), count in movement_cells.items()
+        ]
+        
+        return {
+            'movement_points': movement_points,
+            'total_movements': total_movements
+        }
+    
+    def analyze_scroll_behavior(self, tracking_data, summaries=None):
         """Analyze scroll depth and patterns"""
         try:
-            scroll_events = [d for d in tracking_data if d.get('event_type') == 'scroll']
-            
-            if not scroll_events:
-                return {
-                    'average_depth': 0,
-                    'max_depth': 0,
-                    'depth_distribution': [],
-                    'bounce_rate': 100
-                }
-            
-            # Calculate scroll depths
-            scroll_depths = []
-            max_scroll_per_session = defaultdict(int)
+            scroll_state = new_scroll_state()
+            for event in tracking_data:
+                if event.get('event_type') == 'scroll':
+                    add_scroll_event(scroll_state, event)
             
-            for event in scroll_events:
-                depth = event.get('scroll_depth', 0)
-                session_id = event.get('session_id', 'unknown')
-                scroll_depths.append(depth)
-                max_scroll_per_session[session_id] = max(max_scroll_per_session[session_id], depth)
-            
-            # Calculate metrics
-            average_depth = sum(scroll_depths) / len(scroll_depths) if scroll_depths else 0
-            max_depth = max(scroll_depths) if scroll_depths else 0
-            
-            # Depth distribution (in 10% buckets)
-            depth_buckets = [0] * 10
-            for depth in scroll_depths:
-                bucket = min(int(depth / 10), 9)
-                depth_buckets[bucket] += 1
-            
-            # Calculate bounce rate (sessions with < 25% scroll)
-            low_engagement_sessions = sum(1 for depth in max_scroll_per_session.values() if depth < 25)
-            total_sessions = len(max_scroll_per_session)
-            bounce_rate = (low_engagement_sessions / total_sessions * 100) if total_sessions else 0
+            return self._scroll_stats(scroll_state, summaries)
             
+        except DataStreamError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error analyzing scroll behavior: {str(e)}")
             return {
-                'average_depth': round(average_depth, 2),
-                'max_depth': max_depth,
-                'depth_distribution': depth_buckets,
-                'bounce_rate': round(bounce_rate, 2),
-                'total_scroll_events': len(scroll_events)
+                'average_depth': 0,
+                'max_depth': 0,
+                'depth_distribution': [],
+                'bounce_rate': 100
             }
-            
+    
+    def scroll_from_aggregates(self, scroll_state, summaries=None):
+        """Build scroll analysis from pre-aggregated scroll state, e.g. as computed in the database"""
+        try:
+            return self._scroll_stats(scroll_state, summaries)
+        
         except Exception as e:
             self.logger.error(f"Error analyzing scroll behavior: {str(e)}")
             return {
@@ -101,25 +258,107 @@ class UXAnalyzer:
                 'bounce_rate': 100
             }
     
-    def generate_suggestions(self, tracking_data):
+    def _scroll_stats(self, scroll_state, summaries=None):
+        """Merge page view summaries into the scroll aggregates and compute metrics"""
+        scroll_count = scroll_state['count']
+        depth_sum = scroll_state['depth_sum']
+        max_depth = scroll_state['max_depth']
+        # Copies, so the caller's state can keep accumulating
+        depth_buckets = list(scroll_state['depth_buckets'])
+        max_scroll_per_session = dict(scroll_state['max_scroll_per_session'])
+        
+        # Merge pre-aggregated page view summaries; dwell may already be summed, e.g. in the database
+        dwell_buckets = list(scroll_state.get('dwell_buckets') or [0] * 10)
+        for summary in summaries or []:
+            samples = summary.get('scroll_samples') or 0
+            if not samples:
+                continue
+            session_id = summary.get('session_id', 'unknown')
+            summary_max = summary.get('max_scroll_depth') or 0
+            scroll_count += samples
+            depth_sum += summary.get('scroll_depth_sum') or 0
+            max_depth = max(max_depth, summary_max)
+            for bucket, count in enumerate((summary.get('scroll_bands') or [])[:10]):
+                depth_buckets[bucket] += count
+            for bucket, dwell in enumerate((summary.get('scroll_dwell_ms') or [])[:10]):
+                dwell_buckets[bucket] += dwell
+            max_scroll_per_session[session_id] = max(max_scroll_per_session.get(session_id, 0), summary_max)
+        
+        if not scroll_count:
+            return {
+                'average_depth': 0,
+                'max_depth': 0,
+                'depth_distribution': [],
+                'bounce_rate': 100
+            }
+        
+        # Calculate metrics
+        average_depth = depth_sum / scroll_count
+        
+        # Calculate bounce rate (sessions with < 25% scroll)
+        low_engagement_sessions = scroll_state.get('low_engagement_sessions', 0)
+        low_engagement_sessions += sum(1 for depth in max_scroll_per_session.values() if depth < 25)
+        total_sessions = scroll_state.get('session_count', 0) + len(max_scroll_per_session)
+        bounce_rate = (low_engagement_sessions / total_sessions * 100) if total_sessions else 0
+        
+        scroll_stats = {
+            'average_depth': round(average_depth, 2),
+            'max_depth': max_depth,
+            'depth_distribution': depth_buckets,
+            'bounce_rate': round(bounce_rate, 2),
+            'total_scroll_events': scroll_count
+        }
+        
+        if summaries is not None or 'dwell_buckets' in scroll_state:
+            scroll_stats['dwell_distribution_ms'] = dwell_buckets
+        
+        return scroll_stats
+    
+    def extract_features(self, tracking_data, track_scroll=True):
+        """Extract suggestion features from any iterable of events in one pass"""
+        return SuggestionFeatures(track_scroll).update(tracking_data)
+    
+    def generate_suggestions(self, tracking_data, summaries=None, scroll_stats=None, session_samples=None):
         """Generate AI-powered UX improvement suggestions"""
+        # scroll_stats may pass an analyze_scroll_behavior result for the same data to reuse it, and
+        # session_samples the per-session page summary sample counts, e.g. as summed in the database
+        try:
+            features = self.extract_features(tracking_data, track_scroll=scroll_stats is None)
+            return self.suggestions_from_features(features, summaries, scroll_stats, session_samples)
+            
+        except DataStreamError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error generating suggestions: {str(e)}")
+            return []
+    
+    def suggestions_from_features(self, features, summaries=None, scroll_stats=None, session_samples=None):
+        """Run the suggestion rules over extracted (possibly merged) features"""
         try:
             suggestions = []
             
+            # Mouse and scroll samples pre-aggregated into page summaries count as the raw events they replace
+            if session_samples is None and summaries is not None:
+                session_samples = self.summary_session_samples(summaries)
+            session_counts = Counter(features.session_event_counts)
+            session_counts.update(session_samples or {})
+            
             # Analyze click patterns
-            click_analysis = self._analyze_click_patterns(tracking_data)
+            click_analysis = self._analyze_click_patterns(features)
             suggestions.extend(click_analysis)
             
             # Analyze scroll behavior
-            scroll_analysis = self._analyze_scroll_suggestions(tracking_data)
+            if scroll_stats is None:
+                scroll_stats = self._scroll_stats(features.scroll_state, summaries)
+            scroll_analysis = self._analyze_scroll_suggestions(scroll_stats)
             suggestions.extend(scroll_analysis)
             
             # Analyze user flow
-            flow_analysis = self._analyze_user_flow(tracking_data)
+            flow_analysis = self._analyze_user_flow(session_counts)
             suggestions.extend(flow_analysis)
             
             # Analyze engagement metrics
-            engagement_analysis = self._analyze_engagement(tracking_data)
+            engagement_analysis = self._analyze_engagement(session_counts)
             suggestions.extend(engagement_analysis)
             
             return suggestions[:10]  # Return top 10 suggestions
@@ -128,20 +367,17 @@ class UXAnalyzer:
             self.logger.error(f"Error generating suggestions: {str(e)}")
             return []
     
-    def _analyze_click_patterns(self, tracking_data):
+    def _analyze_click_patterns(self, features):
         """Analyze click patterns for suggestions"""
         suggestions = []
-        click_events = [d for d in tracking_data if d.get('event_type') == 'click']
+        click_count = features.click_count
+        button_clicks = features.button_clicks
         
-        if not click_events:
+        if not click_count:
             return suggestions
         
-        # Analyze click distribution
-        click_positions = [(d.get('x', 0), d.get('y', 0)) for d in click_events]
-        click_elements = [d.get('element_type', 'unknown') for d in click_events]
-        
         # Low click areas
-        if len(click_events) < 10:
+        if click_count < 10:
             suggestions.append({
                 'type': 'click_optimization',
                 'priority': 'high',
@@ -155,8 +391,7 @@ class UXAnalyzer:
             })
         
         # Button click analysis
-        button_clicks = [d for d in click_events if d.get('element_type') == 'button']
-        if len(button_clicks) / len(click_events) < 0.3:
+        if button_clicks / click_count < 0.3:
             suggestions.append({
                 'type': 'button_optimization',
                 'priority': 'medium',
@@ -171,10 +406,9 @@ class UXAnalyzer:
         
         return suggestions
     
-    def _analyze_scroll_suggestions(self, tracking_data):
+    def _analyze_scroll_suggestions(self, scroll_analysis):
         """Generate scroll-based suggestions"""
         suggestions = []
-        scroll_analysis = self.analyze_scroll_behavior(tracking_data)
         
         # Low scroll depth
         if scroll_analysis['average_depth'] < 30:
@@ -206,23 +440,25 @@ class UXAnalyzer:
         
         return suggestions
     
-    def _analyze_user_flow(self, tracking_data):
-        """Analyze user flow patterns"""
+    def summary_session_samples(self, summaries):
+        """Count the mouse and scroll samples page view summaries hold per session"""
+        session_samples = defaultdict(int)
+        for summary in summaries:
+            samples = (summary.get('mouse_samples') or 0) + (summary.get('scroll_samples') or 0)
+            session_samples[summary.get('session_id', 'unknown')] += samples
+        return session_samples
+    
+    def _analyze_user_flow(self, sessions):
+        """Analyze user flow patterns from per-session event counts"""
         suggestions = []
         
-        # Group events by session
-        sessions = defaultdict(list)
-        for event in tracking_data:
-            session_id = event.get('session_id', 'unknown')
-            sessions[session_id].append(event)
-        
         if not sessions:
             return suggestions
         
         # Analyze session patterns
         short_sessions = 0
-        for session_events in sessions.values():
-            if len(session_events) < 3:
+        for event_count in sessions.values():
+            if event_count < 3:
                 short_sessions += 1
         
         if len(sessions) > 0 and short_sessions / len(sessions) > 0.5:
@@ -240,16 +476,10 @@ class UXAnalyzer:
         
         return suggestions
     
-    def _analyze_engagement(self, tracking_data):
-        """Analyze overall engagement metrics"""
+    def _analyze_engagement(self, sessions):
+        """Analyze overall engagement metrics from per-session event counts"""
         suggestions = []
         
-        # Calculate events per session
-        sessions = defaultdict(int)
-        for event in tracking_data:
-            session_id = event.get('session_id', 'unknown')
-            sessions[session_id] += 1
-        
         if sessions:
             avg_events_per_session = sum(sessions.values()) / len(sessions)
             
@@ -280,20 +510,18 @@ class UXAnalyzer:
             event_types = Counter(d.get('event_type', 'unknown') for d in tracking_data)
             
             # Calculate time range
-            timestamps = [d.get('timestamp') for d in tracking_data if d.get('timestamp')]
+            # Compare epoch milliseconds; ISO strings are only produced for the result
+            timestamps = [parse_timestamp_ms(d.get('timestamp')) for d in tracking_data if d.get('timestamp') is not None]
+            timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
             time_range = None
             if timestamps:
-                try:
-                    parsed_times = [datetime.fromisoformat(ts.replace('Z', '+00:00')) for ts in timestamps]
-                    earliest = min(parsed_times)
-                    latest = max(parsed_times)
-                    time_range = {
-                        'start': earliest.isoformat(),
-                        'end': latest.isoformat(),
-                        'duration_hours': (latest - earliest).total_seconds() / 3600
-                    }
-                except:
-                    pass
+                earliest = min(timestamps)
+                latest = max(timestamps)
+                time_range = {
+                    'start': format_epoch_ms(earliest),
+                    'end': format_epoch_ms(latest),
+                    'duration_hours': (latest - earliest) / 3600000
+                }
             
             return {
                 'total_events': total_events,
@@ -1,16 +1,79 @@
 from app import db
 from datetime import datetime
 import json
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
+from dimensions import DimensionCache, track_session
+from utils import to_epoch_ms, from_epoch_ms, parse_timestamp_ms
+
+class DimensionMixin:
+    """Interned string referenced by integer id from tracking_events"""
+    id = db.Column(db.Integer, primary_key=True)
+    value_hash = db.Column(db.String(64), unique=True, nullable=False)
+    value = db.Column(db.Text, nullable=False)
+
+class Url(DimensionMixin, db.Model):
+    """Referrer URLs"""
+    __tablename__ = 'urls'
+
+class UserAgent(DimensionMixin, db.Model):
+    """Browser user agent strings"""
+    __tablename__ = 'user_agents'
+
+class Page(DimensionMixin, db.Model):
+    """Page titles"""
+    __tablename__ = 'pages'
+
+class ElementSelector(DimensionMixin, db.Model):
+    """Element class lists"""
+    __tablename__ = 'element_selectors'
+
+urls = DimensionCache(db, Url)
+user_agents = DimensionCache(db, UserAgent)
+pages = DimensionCache(db, Page)
+element_selectors = DimensionCache(db, ElementSelector)
+DIMENSION_CACHES = {
+    'urls': urls,
+    'user_agents': user_agents,
+    'pages': pages,
+    'element_selectors': element_selectors
+}
+track_session(db.session)
+
+def dimension_property(cache, id_attribute):
+    """String attribute stored as an id into an interned dimension table"""
+    def fget(self):
+        return cache.value(getattr(self, id_attribute))
+    
+    def fset(self, value):
+        setattr(self, id_attribute, cache.intern(value))
+    
+    def expression(cls):
+        table = cache.model.__table__
+        value = select(table.c.value).where(table.c.id == getattr(cls, id_attribute)).scalar_subquery()
+        return value.label(id_attribute.removesuffix('_id'))
+    
+    return hybrid_property(fget, fset, expr=expression)
 
 class TrackingEvent(db.Model):
     """Model for storing user tracking events"""
     __tablename__ = 'tracking_events'
+    __table_args__ = (
+        # Range scans for "this page (and event type), this time window" and per-session timelines
+        db.Index('ix_tracking_events_url_event_type_timestamp', 'url', 'event_type', 'timestamp'),
+        db.Index('ix_tracking_events_session_id_timestamp', 'session_id', 'timestamp'),
+        # Keyset export pages order and seek by (timestamp, id); also serves plain timestamp ranges
+        db.Index('ix_tracking_events_timestamp_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(100), nullable=False, index=True)
+    session_id = db.Column(db.String(100), nullable=False)
     event_type = db.Column(db.String(50), nullable=False, index=True)
     url = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # The same instant as epoch milliseconds, so readers get an integer without datetime conversion
+    timestamp_ms = db.Column(db.BigInteger)
     
     # Position data
     x = db.Column(db.Float)
@@ -25,30 +88,58 @@ class TrackingEvent(db.Model):
     element_type = db.Column(db.String(50))
     element_text = db.Column(db.Text)
     element_id = db.Column(db.String(200))
-    element_class = db.Column(db.Text)
+    element_class_id = db.Column(db.Integer, db.ForeignKey('element_selectors.id'))
     
     # Browser/viewport data
     viewport_width = db.Column(db.Integer)
     viewport_height = db.Column(db.Integer)
-    user_agent = db.Column(db.Text)
-    referrer = db.Column(db.Text)
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agents.id'))
+    referrer_id = db.Column(db.Integer, db.ForeignKey('urls.id'))
     
     # Page data
-    page_title = db.Column(db.Text)
+    page_title_id = db.Column(db.Integer, db.ForeignKey('pages.id'))
+    
+    # Repeated strings are interned; these read and write them as plain strings
+    element_class = dimension_property(element_selectors, 'element_class_id')
+    user_agent = dimension_property(user_agents, 'user_agent_id')
+    referrer = dimension_property(urls, 'referrer_id')
+    page_title = dimension_property(pages, 'page_title_id')
+    DIMENSIONS = (
+        (element_selectors, 'element_class_id'),
+        (user_agents, 'user_agent_id'),
+        (urls, 'referrer_id'),
+        (pages, 'page_title_id')
+    )
     
-    # Additional data stored as JSON
-    additional_data = db.Column(db.Text)  # JSON string for any extra data
+    # Extra fields as a native JSON value (JSONB on PostgreSQL), so they can be filtered in SQL.
+    # Deferred: loaded and decoded only by queries that undefer it or on first access.
+    additional_data = db.deferred(db.Column(
+        db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+    ))
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        """Convert tracking event to dictionary"""
+    @classmethod
+    def load_dimensions(cls, events):
+        """Cache the interned strings of a page of events, so to_dict() on each needs no queries"""
+        for cache, id_attribute in cls.DIMENSIONS:
+            cache.load([getattr(event, id_attribute) for event in events])
+    
+    @property
+    def epoch_ms(self):
+        """Event time as epoch milliseconds, derived from timestamp for rows stored without it"""
+        if self.timestamp_ms is not None:
+            return self.timestamp_ms
+        return to_epoch_ms(self.timestamp) if self.timestamp else None
+    
+    def to_dict(self, epoch=False):
+        """Convert tracking event to dictionary, with epoch millisecond timestamps if epoch is set"""
         data = {
             'id': self.id,
             'session_id': self.session_id,
             'event_type': self.event_type,
             'url': self.url,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'timestamp': self.epoch_ms if epoch else (self.timestamp.isoformat() if self.timestamp else None),
             'x': self.x,
             'y': self.y,
             'scroll_depth': self.scroll_depth,
@@ -66,13 +157,9 @@ class TrackingEvent(db.Model):
         }
         
         # Add additional data if present
-        if self.additional_data:
-            try:
-                additional = json.loads(self.additional_data)
-                data.update(additional)
-            except (json.JSONDecodeError, TypeError):
-                pass
-                
+        if isinstance(self.additional_data, dict):
+            data.update(self.additional_data)
+        
         return data
     
     @classmethod
@@ -86,27 +173,23 @@ class TrackingEvent(db.Model):
             'user_agent', 'referrer', 'page_title'
         }
         
-        # Handle timestamp
-        timestamp = data.get('timestamp')
-        if isinstance(timestamp, str):
-            try:
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                timestamp = datetime.utcnow()
-        elif not isinstance(timestamp, datetime):
-            timestamp = datetime.utcnow()
+        # Handle timestamp: epoch milliseconds, or an ISO string from older clients
+        timestamp_ms = parse_timestamp_ms(data.get('timestamp'))
+        if timestamp_ms is None:
+            timestamp_ms = to_epoch_ms(datetime.utcnow())
         
-        # Extract additional data
+        # Extract additional data; event_id only serves ingest deduplication, so it is not stored
         additional_data = {}
         for key, value in data.items():
-            if key not in known_fields and key != 'timestamp':
+            if key not in known_fields and key not in ('timestamp', 'event_id'):
                 additional_data[key] = value
         
         return cls(
             session_id=data.get('session_id', ''),
             event_type=data.get('event_type', ''),
             url=data.get('url', ''),
-            timestamp=timestamp,
+            timestamp=from_epoch_ms(timestamp_ms),
+            timestamp_ms=timestamp_ms,
             x=data.get('x'),
             y=data.get('y'),
             scroll_depth=data.get('scroll_depth'),
@@ -121,7 +204,7 @@ class TrackingEvent(db.Model):
             user_agent=data.get('user_agent'),
             referrer=data.get('referrer'),
             page_title=data.get('page_title'),
-            additional_data=json.dumps(additional_data) if additional_data else None
+            additional_data=additional_data or None
         )
 
 class AnalyticsSession(db.Model):
@@ -143,17 +226,146 @@ class AnalyticsSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        """Convert session to dictionary"""
+    def to_dict(self, epoch=False):
+        """Convert session to dictionary, with epoch millisecond times if epoch is set"""
+        convert = to_epoch_ms if epoch else datetime.isoformat
         return {
             'id': self.id,
             'session_id': self.session_id,
-            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
-            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'first_seen': convert(self.first_seen) if self.first_seen else None,
+            'last_seen': convert(self.last_seen) if self.last_seen else None,
             'event_count': self.event_count,
             'pages_visited': self.pages_visited,
             'user_agent': self.user_agent,
             'initial_referrer': self.initial_referrer,
             'initial_url': self.initial_url,
             'duration_seconds': (self.last_seen - self.first_seen).total_seconds() if self.last_seen and self.first_seen else 0
-        }
\ No newline at end of file
+        }
+class PageViewSummary(db.Model):
+    """Model for compact per-page-view mouse and scroll aggregates"""
+    __tablename__ = 'page_view_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(100), nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    # Browser/viewport data
+    viewport_width = db.Column(db.Integer)
+    viewport_height = db.Column(db.Integer)
+    
+    # Mouse position histogram: {"cell_x,cell_y": count} over grid_size px cells
+    grid_size = db.Column(db.Integer, nullable=False)
+    mouse_samples = db.Column(db.Integer, default=0)
+    mouse_grid = db.Column(db.Text)
+    
+    # Scroll aggregates: sample counts and dwell time per 10% depth band
+    scroll_samples = db.Column(db.Integer, default=0)
+    scroll_depth_sum = db.Column(db.Float, default=0)
+    max_scroll_depth = db.Column(db.Float, default=0)
+    scroll_bands = db.Column(db.Text)
+    scroll_dwell_ms = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert page view summary to dictionary"""
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'url': self.url,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'viewport_width': self.viewport_width,
+            'viewport_height': self.viewport_height,
+            'grid_size': self.grid_size,
+            'mouse_samples': self.mouse_samples or 0,
+            'mouse_grid': json.loads(self.mouse_grid) if self.mouse_grid else {},
+            'scroll_samples': self.scroll_samples or 0,
+            'scroll_depth_sum': self.scroll_depth_sum or 0,
+            'max_scroll_depth': self.max_scroll_depth or 0,
+            'scroll_bands': json.loads(self.scroll_bands) if self.scroll_bands else [0] * 10,
+            'scroll_dwell_ms': json.loads(self.scroll_dwell_ms) if self.scroll_dwell_ms else [0] * 10
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create page view summary from a validated dictionary"""
+        # Handle timestamp: epoch milliseconds, or an ISO string from older clients
+        timestamp_ms = parse_timestamp_ms(data.get('timestamp'))
+        if timestamp_ms is None:
+            timestamp_ms = to_epoch_ms(datetime.utcnow())
+        
+        return cls(
+            session_id=data.get('session_id', ''),
+            url=data.get('url', ''),
+            timestamp=from_epoch_ms(timestamp_ms),
+            viewport_width=data.get('viewport_width'),
+            viewport_height=data.get('viewport_height'),
+            grid_size=data.get('grid_size'),
+            mouse_samples=data.get('mouse_samples', 0),
+            mouse_grid=json.dumps(data.get('mouse_grid') or {}),
+            scroll_samples=data.get('scroll_samples', 0),
+            scroll_depth_sum=data.get('scroll_depth_sum', 0),
+            max_scroll_depth=data.get('max_scroll_depth', 0),
+            scroll_bands=json.dumps(data.get('scroll_bands') or [0] * 10),
+            scroll_dwell_ms=json.dumps(data.get('scroll_dwell_ms') or [0] * 10)
+        )
+
+class ClickRollup(db.Model):
+    """Click counts per heatmap cell, URL and hour, maintained by the rollup compactor"""
+    __tablename__ = 'click_rollups'
+    __table_args__ = (db.UniqueConstraint('hour', 'url', 'cell_x', 'cell_y', name='uq_click_rollups_bin'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    cell_x = db.Column(db.Integer, nullable=False)
+    cell_y = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ScrollRollup(db.Model):
+    """Scroll depth histogram in 10% buckets per URL and hour"""
+    __tablename__ = 'scroll_rollups'
+    __table_args__ = (db.UniqueConstraint('hour', 'url', 'bucket', name='uq_scroll_rollups_bucket'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    depth_sum = db.Column(db.Float, nullable=False, default=0)
+    max_depth = db.Column(db.Float, nullable=False, default=0)
+
+class SessionScrollRollup(db.Model):
+    """Maximum scroll depth per session, URL and hour, for bounce rates"""
+    __tablename__ = 'session_scroll_rollups'
+    __table_args__ = (db.UniqueConstraint('hour', 'url', 'session_id', name='uq_session_scroll_rollups_session'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    session_id = db.Column(db.String(100), nullable=False, index=True)
+    max_depth = db.Column(db.Float, nullable=False, default=0)
+
+class EventTypeRollup(db.Model):
+    """Event counts per event type, URL and hour"""
+    __tablename__ = 'event_type_rollups'
+    __table_args__ = (db.UniqueConstraint('hour', 'url', 'event_type', name='uq_event_type_rollups_type'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    first_event_at = db.Column(db.DateTime, nullable=False)
+    last_event_at = db.Column(db.DateTime, nullable=False)
+
+class RollupWatermark(db.Model):
+    """Highest tracking event ID folded into the rollup tables"""
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped on every advance so concurrent compactors cannot both apply the same events
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
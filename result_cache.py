@@ -0,0 +1,96 @@
+"""Versioned result cache for analytics endpoints"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class _PendingResult:
+    """A computation in progress that other requests for the same key wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def resolve(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class ResultCache:
+    """LRU cache with TTL whose entries are only valid for the data version they were computed from"""
+
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        # Counters for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, version, compute):
+        """Return the cached result for key at version, computing it at most once across threads"""
+        # Cached values are shared between requests and must not be mutated by callers
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+            # Concurrent requests for the same key and version wait for the first one's result
+            pending = self._pending.get((key, version))
+            owner = pending is None
+            if owner:
+                pending = self._pending[(key, version)] = _PendingResult()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return pending.wait()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._pending.pop((key, version), None)
+            pending.resolve(error=e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._pending.pop((key, version), None)
+        pending.resolve(value)
+        return value
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get cache counters for monitoring"""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions
+        }
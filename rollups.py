@@ -0,0 +1,368 @@
+"""Hourly rollup tables maintained from tracking events by a background compactor"""
+
+import copy
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from sqlalchemy.exc import SQLAlchemyError
+from background import BackgroundWorker
+from db_utils import (
+    SQL_AGGREGATION_DIALECTS, aggregate_heatmap_bins, aggregate_scroll_state, conflict_insert
+)
+from ml_model import new_scroll_state
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'tracking_events'
+
+# Rollups are binned the same way as UXAnalyzer.generate_heatmap_data and ml_model.add_scroll_event
+ROLLUP_CELL_SIZE = 20
+
+def hour_of(timestamp):
+    """Truncate a timestamp to the start of its hour"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def rollups_cover(filters):
+    """Whether rollups can answer a query with these filters"""
+    # Rollups keep url and hour only, so windows must start and end on the hour
+    # and viewport, event type or extra data filters go to the raw events
+    if not filters:
+        return True
+    if filters.get('min_viewport_width') is not None or filters.get('max_viewport_width') is not None:
+        return False
+    if filters.get('event_types') or filters.get('extra'):
+        return False
+    return all(
+        filters.get(bound) is None or filters[bound] == hour_of(filters[bound])
+        for bound in ('start', 'end')
+    )
+
+def apply_rollup_filters(query, model, filters):
+    """Apply url and hour-aligned time filters to a rollup query"""
+    if not filters:
+        return query
+    
+    if filters.get('url'):
+        query = query.filter(model.url == filters['url'])
+    if filters.get('start'):
+        query = query.filter(model.hour >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(model.hour < filters['end'])
+    
+    return query
+
+def get_watermark(db, RollupWatermark):
+    """Get the highest event ID already folded into the rollups"""
+    return db.session.query(RollupWatermark.last_event_id).filter(
+        RollupWatermark.name == WATERMARK_NAME
+    ).scalar() or 0
+
+def read_with_watermark(db, RollupWatermark, read_func, attempts=3):
+    """Run read_func(watermark) so that the rollups it reads match the watermark, or return None"""
+    # Rollups and the watermark advance in one transaction; if the watermark is unchanged
+    # around the read, the rollups read cover exactly the events up to it
+    for _ in range(attempts):
+        watermark = get_watermark(db, RollupWatermark)
+        result = read_func(watermark)
+        if result is None or get_watermark(db, RollupWatermark) == watermark:
+            return result
+    return None
+
+def upsert_rollup_rows(db, model, key_fields, rows, add_fields=(), max_fields=(), min_fields=(), chunk_size=500):
+    """Merge rollup rows into a table by key, adding counters and keeping minima/maxima"""
+    if not rows:
+        return
+    
+    table = model.__table__
+    insert = conflict_insert(db.session)
+    
+    if insert is not None:
+        for start in range(0, len(rows), chunk_size):
+            stmt = insert(table).values(rows[start:start + chunk_size])
+            updates = {}
+            for field in add_fields:
+                updates[field] = table.c[field] + stmt.excluded[field]
+            for field in max_fields:
+                updates[field] = case((stmt.excluded[field] > table.c[field], stmt.excluded[field]), else_=table.c[field])
+            for field in min_fields:
+                updates[field] = case((stmt.excluded[field] < table.c[field], stmt.excluded[field]), else_=table.c[field])
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c[field] for field in key_fields], set_=updates)
+            db.session.execute(stmt)
+        return
+    
+    # Fallback for dialects without INSERT ... ON CONFLICT: one read-modify-write per row
+    for row in rows:
+        existing = model.query.filter_by(**{field: row[field] for field in key_fields}).first()
+        if not existing:
+            db.session.add(model(**row))
+            continue
+        for field in add_fields:
+            setattr(existing, field, getattr(existing, field) + row[field])
+        for field in max_fields:
+            setattr(existing, field, max(getattr(existing, field), row[field]))
+        for field in min_fields:
+            setattr(existing, field, min(getattr(existing, field), row[field]))
+
+def build_rollup_rows(events):
+    """Aggregate (id, session_id, event_type, url, timestamp, x, y, scroll_depth) rows into rollup rows"""
+    clicks = defaultdict(int)
+    scroll_buckets = {}
+    session_depths = {}
+    event_types = {}
+    
+    for event in events:
+        hour = hour_of(event.timestamp)
+        
+        type_key = (hour, event.url, event.event_type)
+        type_row = event_types.get(type_key)
+        if type_row is None:
+            event_types[type_key] = [1, event.timestamp, event.timestamp]
+        else:
+            type_row[0] += 1
+            type_row[1] = min(type_row[1], event.timestamp)
+            type_row[2] = max(type_row[2], event.timestamp)
+        
+        if event.event_type == 'click':
+            cell_x = int(event.x or 0) // ROLLUP_CELL_SIZE * ROLLUP_CELL_SIZE
+            cell_y = int(event.y or 0) // ROLLUP_CELL_SIZE * ROLLUP_CELL_SIZE
+            clicks[(hour, event.url, cell_x, cell_y)] += 1
+        elif event.event_type == 'scroll':
+            depth = event.scroll_depth or 0
+            bucket_key = (hour, event.url, max(min(int(depth / 10), 9), 0))
+            bucket_row = scroll_buckets.setdefault(bucket_key, [0, 0, 0])
+            bucket_row[0] += 1
+            bucket_row[1] += depth
+            bucket_row[2] = max(bucket_row[2], depth)
+            session_key = (hour, event.url, event.session_id)
+            session_depths[session_key] = max(session_depths.get(session_key, 0), depth)
+    
+    return {
+        'clicks': [
+            {'hour': hour, 'url': url, 'cell_x': cell_x, 'cell_y': cell_y, 'count': count}
+            for (hour, url, cell_x, cell_y), count in clicks.items()
+        ],
+        'scroll_buckets': [
+            {'hour': hour, 'url': url, 'bucket': bucket, 'count': count, 'depth_sum': depth_sum, 'max_depth': max_depth}
+            for (hour, url, bucket), (count, depth_sum, max_depth) in scroll_buckets.items()
+        ],
+        'session_depths': [
+            {'hour': hour, 'url': url, 'session_id': session_id, 'max_depth': max_depth}
+            for (hour, url, session_id), max_depth in session_depths.items()
+        ],
+        'event_types': [
+            {'hour': hour, 'url': url, 'event_type': event_type, 'count': count,
+             'first_event_at': first_event_at, 'last_event_at': last_event_at}
+            for (hour, url, event_type), (count, first_event_at, last_event_at) in event_types.items()
+        ]
+    }
+
+def compact_rollups(db, batch_size=5000, settle_seconds=10):
+    """Fold the next batch of tracking events past the watermark into the rollups; returns events folded"""
+    from models import (
+        TrackingEvent, ClickRollup, ScrollRollup, SessionScrollRollup, EventTypeRollup, RollupWatermark
+    )
+    
+    try:
+        watermark = db.session.query(RollupWatermark.last_event_id, RollupWatermark.version).filter(
+            RollupWatermark.name == WATERMARK_NAME
+        ).first()
+        if watermark is None:
+            db.session.add(RollupWatermark(name=WATERMARK_NAME, last_event_id=0, version=0))
+            db.session.commit()
+            last_event_id, version = 0, 0
+        else:
+            last_event_id, version = watermark
+        
+        events = db.session.query(
+            TrackingEvent.id, TrackingEvent.session_id, TrackingEvent.event_type, TrackingEvent.url,
+            TrackingEvent.timestamp, TrackingEvent.x, TrackingEvent.y, TrackingEvent.scroll_depth,
+            TrackingEvent.created_at
+        ).filter(TrackingEvent.id > last_event_id).order_by(TrackingEvent.id).limit(batch_size).all()
+        
+        # IDs can be assigned before a slower transaction commits, so only fold events that have
+        # settled and stop at the first recent one to keep the watermark free of gaps
+        settled_before = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        settled = []
+        for event in events:
+            if event.created_at and event.created_at > settled_before:
+                break
+            settled.append(event)
+        if not settled:
+            db.session.rollback()
+            return 0
+        
+        rows = build_rollup_rows(settled)
+        upsert_rollup_rows(db, ClickRollup, ('hour', 'url', 'cell_x', 'cell_y'), rows['clicks'], add_fields=('count',))
+        upsert_rollup_rows(
+            db, ScrollRollup, ('hour', 'url', 'bucket'), rows['scroll_buckets'],
+            add_fields=('count', 'depth_sum'), max_fields=('max_depth',)
+        )
+        upsert_rollup_rows(
+            db, SessionScrollRollup, ('hour', 'url', 'session_id'), rows['session_depths'], max_fields=('max_depth',)
+        )
+        upsert_rollup_rows(
+            db, EventTypeRollup, ('hour', 'url', 'event_type'), rows['event_types'],
+            add_fields=('count',), min_fields=('first_event_at',), max_fields=('last_event_at',)
+        )
+        
+        # Optimistic lock: advance the watermark only if no other compactor moved it meanwhile
+        advanced = db.session.query(RollupWatermark).filter(
+            RollupWatermark.name == WATERMARK_NAME,
+            RollupWatermark.version == version
+        ).update({
+            'last_event_id': settled[-1].id,
+            'version': version + 1,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if not advanced:
+            db.session.rollback()
+            logger.info("Rollup watermark moved by another compactor, skipping batch")
+            return 0
+        
+        db.session.commit()
+        return len(settled)
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error compacting rollups: {str(e)}")
+        db.session.rollback()
+        return 0
+    except Exception as e:
+        logger.error(f"Error compacting rollups: {str(e)}")
+        db.session.rollback()
+        return 0
+
+def rollup_heatmap_bins(db, filters=None, cell_size=ROLLUP_CELL_SIZE):
+    """Click counts per cell from rollups plus raw events past the watermark, or None when not covered"""
+    from models import TrackingEvent, ClickRollup, RollupWatermark
+    
+    if cell_size != ROLLUP_CELL_SIZE or not rollups_cover(filters):
+        return None
+    if db.session.get_bind().dialect.name not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
+    def read(watermark):
+        query = db.session.query(ClickRollup.cell_x, ClickRollup.cell_y, func.sum(ClickRollup.count))
+        query = apply_rollup_filters(query, ClickRollup, filters).group_by(ClickRollup.cell_x, ClickRollup.cell_y)
+        bins = {(x, y): count for x, y, count in query.all()}
+        
+        tail = aggregate_heatmap_bins(db, TrackingEvent, filters, cell_size, after_event_id=watermark)
+        if tail is None:
+            return None
+        for cell, count in tail.items():
+            bins[cell] = bins.get(cell, 0) + count
+        return bins
+    
+    try:
+        return read_with_watermark(db, RollupWatermark, read)
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error reading click rollups: {str(e)}")
+        db.session.rollback()
+        return None
+
+def rollup_scroll_state(db, filters=None, scroll_state=None, session_depths=None):
+    """Scroll aggregates from rollups plus raw events past the watermark, or None when not covered"""
+    # scroll_state and session_depths carry other pre-aggregated data, e.g. page summaries, to combine with
+    from models import TrackingEvent, ScrollRollup, SessionScrollRollup, RollupWatermark
+    
+    if not rollups_cover(filters):
+        return None
+    if db.session.get_bind().dialect.name not in SQL_AGGREGATION_DIALECTS:
+        return None
+    
+    def read(watermark):
+        # A fresh copy per attempt, since a read may be retried when the watermark moves
+        state = copy.deepcopy(scroll_state) if scroll_state is not None else new_scroll_state()
+        query = db.session.query(
+            ScrollRollup.bucket, func.sum(ScrollRollup.count), func.sum(ScrollRollup.depth_sum),
+            func.max(ScrollRollup.max_depth)
+        )
+        query = apply_rollup_filters(query, ScrollRollup, filters).group_by(ScrollRollup.bucket)
+        for bucket, count, depth_sum, max_depth in query.all():
+            state['depth_buckets'][bucket] += count
+            state['count'] += count
+            state['depth_sum'] += depth_sum or 0
+            state['max_depth'] = max(state['max_depth'], max_depth or 0)
+        
+        # Per-session maxima from the rollups are combined with the raw tail in one grouped subquery
+        rollup_depths = apply_rollup_filters(
+            db.session.query(SessionScrollRollup.session_id, SessionScrollRollup.max_depth),
+            SessionScrollRollup, filters
+        ).statement
+        return aggregate_scroll_state(
+            db, TrackingEvent, filters, after_event_id=watermark,
+            scroll_state=state, session_depths=[rollup_depths, *(session_depths or [])]
+        )
+    
+    try:
+        return read_with_watermark(db, RollupWatermark, read)
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error reading scroll rollups: {str(e)}")
+        db.session.rollback()
+        return None
+
+def rollup_event_type_stats(db):
+    """Event counts by type and the event time range from rollups plus raw events past the watermark"""
+    from models import TrackingEvent, EventTypeRollup, RollupWatermark
+    
+    def read(watermark):
+        rollup_rows = db.session.query(
+            EventTypeRollup.event_type, func.sum(EventTypeRollup.count),
+            func.min(EventTypeRollup.first_event_at), func.max(EventTypeRollup.last_event_at)
+        ).group_by(EventTypeRollup.event_type).all()
+        tail_rows = db.session.query(
+            TrackingEvent.event_type, func.count(TrackingEvent.id),
+            func.min(TrackingEvent.timestamp), func.max(TrackingEvent.timestamp)
+        ).filter(TrackingEvent.id > watermark).group_by(TrackingEvent.event_type).all()
+        
+        event_types = defaultdict(int)
+        earliest = latest = None
+        for event_type, count, first_event_at, last_event_at in rollup_rows + tail_rows:
+            event_types[event_type] += count
+            earliest = first_event_at if earliest is None else min(earliest, first_event_at)
+            latest = last_event_at if latest is None else max(latest, last_event_at)
+        return dict(event_types), earliest, latest
+    
+    try:
+        return read_with_watermark(db, RollupWatermark, read)
+    
+    except SQLAlchemyError as e:
+        logger.error(f"Database error reading event type rollups: {str(e)}")
+        db.session.rollback()
+        return None
+
+class RollupCompactor(BackgroundWorker):
+    """Background thread that keeps the rollup tables caught up with tracking events"""
+    
+    thread_name = 'rollup-compactor'
+    
+    def __init__(self, compact_func, interval=30):
+        super().__init__()
+        self.compact_func = compact_func
+        self.interval = interval
+        
+        # Counters for monitoring
+        self.runs = 0
+        self.compacted = 0
+    
+    def stats(self):
+        """Get compactor counters for monitoring"""
+        return {
+            'runs': self.runs,
+            'compacted': self.compacted
+        }
+    
+    def _run(self):
+        """Compact until caught up, then wait for the next interval"""
+        while not self._stopping.is_set():
+            try:
+                compacted = self.compact_func()
+            except Exception as e:
+                logger.error(f"Error running rollup compactor: {str(e)}", exc_info=True)
+                compacted = 0
+            self.runs += 1
+            self.compacted += compacted
+            if not compacted:
+                self._stopping.wait(self.interval)
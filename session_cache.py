@@ -0,0 +1,144 @@
+"""In-memory session aggregate cache for tracking ingestion"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from background import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+class SessionAggregateCache:
+    """LRU cache that accumulates per-session counters between flushes"""
+    
+    def __init__(self, flush_interval=5.0, idle_timeout=300.0, max_sessions=10000):
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._evicted = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+    
+    def record(self, data, seen_at=None):
+        """Accumulate one tracking event into its session aggregate"""
+        session_id = data.get('session_id')
+        if not session_id:
+            return
+        
+        seen_at = seen_at or datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = self._entries[session_id] = {
+                    'session_id': session_id,
+                    'first_seen': seen_at,
+                    'last_seen': seen_at,
+                    'event_count': 0,
+                    'pages_visited': 0,
+                    'user_agent': data.get('user_agent'),
+                    'initial_referrer': data.get('referrer'),
+                    'initial_url': data.get('url'),
+                    'touched': time.monotonic()
+                }
+            else:
+                self._entries.move_to_end(session_id)
+            
+            entry['last_seen'] = seen_at
+            entry['touched'] = time.monotonic()
+            entry['event_count'] += 1
+            if data.get('event_type') == 'pageview':
+                entry['pages_visited'] += 1
+            
+            # Keep memory bounded; evicted aggregates are written on the next flush
+            while len(self._entries) > self.max_sessions:
+                _, evicted = self._entries.popitem(last=False)
+                if evicted['event_count']:
+                    self._evicted.append(evicted)
+    
+    def flush_due(self):
+        """Check whether the flush interval has elapsed"""
+        return time.monotonic() - self._last_flush >= self.flush_interval
+    
+    def drain(self):
+        """Take pending aggregates as upsert rows and reset their counters"""
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            self._last_flush = now
+            rows.extend(self._to_row(entry) for entry in self._evicted)
+            self._evicted = []
+            
+            for session_id in list(self._entries.keys()):
+                entry = self._entries[session_id]
+                if entry['event_count']:
+                    rows.append(self._to_row(entry))
+                    entry['event_count'] = 0
+                    entry['pages_visited'] = 0
+                if now - entry['touched'] >= self.idle_timeout:
+                    del self._entries[session_id]
+        
+        return rows
+    
+    def restore(self, rows):
+        """Put back aggregates from a failed flush so they are retried"""
+        with self._lock:
+            for row in rows:
+                entry = self._entries.get(row['session_id'])
+                if entry is None:
+                    self._evicted.append(dict(row, touched=time.monotonic()))
+                    continue
+                entry['event_count'] += row['event_count']
+                entry['pages_visited'] += row['pages_visited']
+                entry['first_seen'] = min(entry['first_seen'], row['first_seen'])
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @staticmethod
+    def _to_row(entry):
+        """Convert a cache entry to an analytics_sessions upsert row"""
+        return {
+            'session_id': entry['session_id'],
+            'first_seen': entry['first_seen'],
+            'last_seen': entry['last_seen'],
+            'event_count': entry['event_count'],
+            'pages_visited': entry['pages_visited'],
+            'user_agent': entry['user_agent'],
+            'initial_referrer': entry['initial_referrer'],
+            'initial_url': entry['initial_url']
+        }
+
+class SessionCacheFlusher(BackgroundWorker):
+    """Background thread that writes pending session aggregates every flush interval"""
+    
+    thread_name = 'session-flusher'
+    
+    def __init__(self, flush_func, interval=5.0):
+        super().__init__()
+        self.flush_func = flush_func
+        self.interval = interval
+        
+        # Counters for monitoring
+        self.runs = 0
+        self.failed = 0
+    
+    def stats(self):
+        """Get flusher counters for monitoring"""
+        return {
+            'runs': self.runs,
+            'failed': self.failed
+        }
+    
+    def _run(self):
+        """Flush on every interval until stopped, so idle traffic does not leave aggregates unwritten"""
+        while not self._stopping.wait(self.interval):
+            try:
+                flushed = self.flush_func()
+            except Exception as e:
+                logger.error(f"Error flushing session aggregates: {str(e)}", exc_info=True)
+                flushed = False
+            self.runs += 1
+            if not flushed:
+                self.failed += 1
@@ -15,6 +15,45 @@ function initializeDashboard(analytics) {
     setInterval(refreshData, 30000); // Refresh every 30 seconds
 }
 
+// Last ETag and body per analytics URL, kept across the refresh reloads
+const ANALYTICS_CACHE_PREFIX = 'ux-analytics:';
+
+function readCachedResponse(url) {
+    try {
+        const cached = sessionStorage.getItem(ANALYTICS_CACHE_PREFIX + url);
+        return cached ? JSON.parse(cached) : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function writeCachedResponse(url, etag, data) {
+    try {
+        sessionStorage.setItem(ANALYTICS_CACHE_PREFIX + url, JSON.stringify({ etag, data }));
+    } catch (error) {
+        // Storage full or unavailable; the next request is simply unconditional
+    }
+}
+
+// Fetch analytics JSON with If-None-Match, returning { data, changed }
+async function fetchAnalytics(url) {
+    const cached = readCachedResponse(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    const response = await fetch(url, { headers, cache: 'no-store' });
+    
+    if (response.status === 304 && cached) {
+        return { data: cached.data, changed: false };
+    }
+    if (!response.ok) throw new Error(`Failed to load ${url}`);
+    
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        writeCachedResponse(url, etag, data);
+    }
+    return { data, changed: true };
+}
+
 // Navigation setup
 function setupNavigation() {
     const navItems = document.querySelectorAll('.nav-item');
@@ -120,10 +159,7 @@ function setupCharts() {
 // Load heatmap data
 async function loadHeatmapData() {
     try {
-        const response = await fetch('/api/heatmap-data');
-        if (!response.ok) throw new Error('Failed to load heatmap data');
-        
-        const heatmapData = await response.json();
+        const { data: heatmapData } = await fetchAnalytics('/api/heatmap-data');
         renderHeatmap(heatmapData);
         
         // Update stats
@@ -210,10 +246,7 @@ function renderEmptyHeatmap() {
 // Load scroll data
 async function loadScrollData() {
     try {
-        const response = await fetch('/api/scroll-data');
-        if (!response.ok) throw new Error('Failed to load scroll data');
-        
-        const scrollData = await response.json();
+        const { data: scrollData } = await fetchAnalytics('/api/scroll-data');
         renderScrollAnalytics(scrollData);
         
     } catch (error) {
@@ -316,10 +349,7 @@ async function loadSuggestions() {
     container.innerHTML = '<div class="loading-suggestions"><i class="fas fa-spinner fa-spin"></i> Analyzing user behavior patterns...</div>';
     
     try {
-        const response = await fetch('/api/suggestions');
-        if (!response.ok) throw new Error('Failed to load suggestions');
-        
-        const data = await response.json();
+        const { data } = await fetchAnalytics('/api/suggestions');
         renderSuggestions(data.suggestions);
         
     } catch (error) {
@@ -367,8 +397,15 @@ async function refreshData() {
     }
     
     try {
-        // Reload page data
-        window.location.reload();
+        // Revalidate the analytics APIs and only reload the page when something changed
+        const results = await Promise.all([
+            fetchAnalytics('/api/heatmap-data'),
+            fetchAnalytics('/api/scroll-data'),
+            fetchAnalytics('/api/suggestions')
+        ]);
+        if (results.some(result => result.changed)) {
+            window.location.reload();
+        }
     } catch (error) {
         console.error('Error refreshing data:', error);
     } finally {
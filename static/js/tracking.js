@@ -12,22 +12,33 @@
         sessionDuration: 30 * 60 * 1000, // 30 minutes
         throttleDelay: 100, // milliseconds
         maxEventsPerSession: 1000,
+        batchEvents: true, // buffer events and send them to the batch endpoint
+        batchSize: 20, // flush when this many events are buffered
+        batchFlushInterval: 5000, // milliseconds
+        compressBatches: true, // gzip batches where CompressionStream is available
+        aggregateMotion: true, // summarise mousemove/scroll per page view instead of sending raw events
+        gridSize: 50, // pixels per mouse histogram cell
         debug: false
     };
     
     // State management
     let sessionId = null;
     let eventCount = 0;
+    let eventSequence = 0;
     let isInitialized = false;
     let throttleTimer = null;
     let lastScrollTime = 0;
     let lastMouseMoveTime = 0;
+    let eventQueue = [];
+    let flushTimer = null;
+    let motionSummary = null;
     
     // Initialize tracking
     function init() {
         if (isInitialized) return;
         
         sessionId = generateSessionId();
+        resetMotionSummary();
         setupEventListeners();
         trackPageView();
         isInitialized = true;
@@ -82,7 +93,7 @@
             element_id: elementInfo.id,
             element_class: elementInfo.className,
             url: window.location.href,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId,
             viewport_width: window.innerWidth,
             viewport_height: window.innerHeight
@@ -105,6 +116,11 @@
         if (now - lastScrollTime < 1000) return;
         lastScrollTime = now;
         
+        if (CONFIG.aggregateMotion) {
+            recordScrollSample(Math.min(scrollDepth, 100), now);
+            return;
+        }
+        
         const eventData = {
             event_type: 'scroll',
             scroll_depth: Math.min(scrollDepth, 100),
@@ -112,7 +128,7 @@
             document_height: documentHeight,
             viewport_height: viewportHeight,
             url: window.location.href,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId
         };
         
@@ -123,6 +139,11 @@
     function handleMouseMove(event) {
         if (!shouldTrackEvent()) return;
         
+        if (CONFIG.aggregateMotion) {
+            recordMouseSample(event.clientX, event.clientY);
+            return;
+        }
+        
         const now = Date.now();
         if (now - lastMouseMoveTime < 2000) return; // Only track every 2 seconds
         lastMouseMoveTime = now;
@@ -132,7 +153,7 @@
             x: event.clientX,
             y: event.clientY,
             url: window.location.href,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId
         };
         
@@ -155,7 +176,7 @@
             element_id: elementInfo.id,
             element_class: elementInfo.className,
             url: window.location.href,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId
         };
         
@@ -169,7 +190,7 @@
             url: window.location.href,
             referrer: document.referrer,
             title: document.title,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId,
             viewport_width: window.innerWidth,
             viewport_height: window.innerHeight,
@@ -186,15 +207,19 @@
             sendEvent({
                 event_type: 'page_hidden',
                 url: window.location.href,
-                timestamp: new Date().toISOString(),
+                timestamp: Date.now(),
                 session_id: sessionId
             });
+            
+            // The page may never become visible again, so deliver buffered data now
+            sendMotionSummary(true);
+            flushEvents(true);
         } else {
             // Page is visible again
             sendEvent({
                 event_type: 'page_visible',
                 url: window.location.href,
-                timestamp: new Date().toISOString(),
+                timestamp: Date.now(),
                 session_id: sessionId
             });
         }
@@ -205,17 +230,97 @@
         const eventData = {
             event_type: 'page_unload',
             url: window.location.href,
-            timestamp: new Date().toISOString(),
+            timestamp: Date.now(),
             session_id: sessionId,
+            event_id: nextEventId(),
             events_sent: eventCount
         };
         
+        sendMotionSummary(true);
+        
+        if (CONFIG.batchEvents) {
+            eventQueue.push(eventData);
+            flushEvents(true);
+            return;
+        }
+        
         // Use sendBeacon for reliable delivery during page unload
         if (navigator.sendBeacon) {
             navigator.sendBeacon(CONFIG.apiEndpoint, JSON.stringify(eventData));
         }
     }
     
+    // Start a fresh set of page view aggregates
+    function resetMotionSummary() {
+        motionSummary = {
+            mouseGrid: {},
+            mouseSamples: 0,
+            scrollBands: new Array(10).fill(0),
+            scrollDwell: new Array(10).fill(0),
+            scrollSamples: 0,
+            scrollDepthSum: 0,
+            maxScrollDepth: 0,
+            currentBand: motionSummary ? motionSummary.currentBand : 0,
+            bandSince: Date.now()
+        };
+    }
+    
+    // Add a mouse position to the coarse grid histogram
+    function recordMouseSample(x, y) {
+        const cell = Math.floor(x / CONFIG.gridSize) + ',' + Math.floor(y / CONFIG.gridSize);
+        motionSummary.mouseGrid[cell] = (motionSummary.mouseGrid[cell] || 0) + 1;
+        motionSummary.mouseSamples++;
+    }
+    
+    // Add a scroll depth sample and account dwell time to the band being left
+    function recordScrollSample(depth, now) {
+        if (!isFinite(depth) || depth < 0) return;
+        
+        const band = Math.min(Math.floor(depth / 10), 9);
+        closeScrollBand(now);
+        motionSummary.currentBand = band;
+        motionSummary.scrollBands[band]++;
+        motionSummary.scrollSamples++;
+        motionSummary.scrollDepthSum += depth;
+        motionSummary.maxScrollDepth = Math.max(motionSummary.maxScrollDepth, depth);
+    }
+    
+    // Credit time spent since the last sample to the current depth band
+    function closeScrollBand(now) {
+        motionSummary.scrollDwell[motionSummary.currentBand] += now - motionSummary.bandSince;
+        motionSummary.bandSince = now;
+    }
+    
+    // Post the page view aggregates collected so far and start over
+    function sendMotionSummary(useBeacon) {
+        if (!CONFIG.aggregateMotion || !shouldTrackEvent()) return;
+        if (motionSummary.mouseSamples === 0 && motionSummary.scrollSamples === 0) return;
+        
+        closeScrollBand(Date.now());
+        const body = JSON.stringify({
+            session_id: sessionId,
+            url: window.location.href,
+            timestamp: Date.now(),
+            viewport_width: window.innerWidth,
+            viewport_height: window.innerHeight,
+            grid_size: CONFIG.gridSize,
+            mouse_samples: motionSummary.mouseSamples,
+            mouse_grid: motionSummary.mouseGrid,
+            scroll_samples: motionSummary.scrollSamples,
+            scroll_depth_sum: motionSummary.scrollDepthSum,
+            max_scroll_depth: motionSummary.maxScrollDepth,
+            scroll_bands: motionSummary.scrollBands,
+            scroll_dwell_ms: motionSummary.scrollDwell
+        });
+        resetMotionSummary();
+        
+        const summaryEndpoint = CONFIG.apiEndpoint + '/summary';
+        if (useBeacon && navigator.sendBeacon && navigator.sendBeacon(summaryEndpoint, body)) {
+            return;
+        }
+        postPayload(summaryEndpoint, body);
+    }
+    
     // Extract element information
     function getElementInfo(element) {
         const tagName = element.tagName ? element.tagName.toLowerCase() : 'unknown';
@@ -250,20 +355,106 @@
                CONFIG.apiEndpoint !== '{{API_ENDPOINT}}'; // Not replaced placeholder
     }
     
+    // Unique per session, so the server can drop retries and double deliveries
+    function nextEventId() {
+        eventSequence++;
+        return eventSequence.toString(36);
+    }
+    
     // Send event data to server
     function sendEvent(eventData) {
         if (!shouldTrackEvent()) return;
         
         eventCount++;
+        eventData.event_id = nextEventId();
+        
+        if (CONFIG.batchEvents) {
+            queueEvent(eventData);
+            return;
+        }
+        
+        postPayload(CONFIG.apiEndpoint, JSON.stringify(eventData));
+    }
+    
+    // Buffer an event until the batch is full or the flush interval elapses
+    function queueEvent(eventData) {
+        eventQueue.push(eventData);
+        
+        if (eventQueue.length >= CONFIG.batchSize) {
+            flushEvents(false);
+        } else if (!flushTimer) {
+            flushTimer = setTimeout(() => flushEvents(false), CONFIG.batchFlushInterval);
+        }
+    }
+    
+    // Send all buffered events as one batch
+    function flushEvents(useBeacon) {
+        if (flushTimer) {
+            clearTimeout(flushTimer);
+            flushTimer = null;
+        }
+        if (eventQueue.length === 0) return;
+        
+        const batchEndpoint = CONFIG.apiEndpoint + '/batch';
+        const events = eventQueue;
+        eventQueue = [];
+        
+        // Beacons survive page teardown but cannot carry Content-Encoding or custom content types
+        if (useBeacon && navigator.sendBeacon && navigator.sendBeacon(batchEndpoint, JSON.stringify({ events: events }))) {
+            return;
+        }
+        
+        const body = encodeBatch(events);
+        if (CONFIG.compressBatches && typeof CompressionStream !== 'undefined') {
+            compressPayload(body)
+                .then(compressed => postPayload(batchEndpoint, compressed, 'gzip', 'application/x-ndjson'))
+                .catch(() => postPayload(batchEndpoint, body, null, 'application/x-ndjson'));
+            return;
+        }
+        
+        postPayload(batchEndpoint, body, null, 'application/x-ndjson');
+    }
+    
+    // Encode a batch as NDJSON: a header line with shared page context, then one line per event
+    function encodeBatch(events) {
+        const header = {
+            session_id: sessionId,
+            url: window.location.href
+        };
+        const lines = [JSON.stringify(header)];
+        events.forEach(eventData => {
+            const compact = {};
+            Object.keys(eventData).forEach(key => {
+                if (header[key] !== eventData[key]) {
+                    compact[key] = eventData[key];
+                }
+            });
+            lines.push(JSON.stringify(compact));
+        });
+        return lines.join('\n');
+    }
+    
+    // Gzip a payload with the Compression Streams API
+    function compressPayload(body) {
+        const stream = new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'));
+        return new Response(stream).blob();
+    }
+    
+    // POST a payload to the tracking API
+    function postPayload(endpoint, body, contentEncoding, contentType) {
+        const headers = {
+            'Content-Type': contentType || 'application/json'
+        };
+        if (contentEncoding) {
+            headers['Content-Encoding'] = contentEncoding;
+        }
         
         // Send data asynchronously
         try {
-            fetch(CONFIG.apiEndpoint, {
+            fetch(endpoint, {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(eventData),
+                headers: headers,
+                body: body,
                 keepalive: true
             }).catch(error => {
                 if (CONFIG.debug) {
@@ -305,12 +496,15 @@
                 event_type: eventType,
                 ...data,
                 url: window.location.href,
-                timestamp: new Date().toISOString(),
+                timestamp: Date.now(),
                 session_id: sessionId
             };
             
             sendEvent(eventData);
         },
+        flush: function() {
+            flushEvents(false);
+        },
         getSessionId: function() {
             return sessionId;
         },
@@ -6,6 +6,14 @@ Tests landing page, authentication, dashboard, API endpoints, and tracking
 
 import requests
 import json
+import csv
+import hashlib
+import ast
+import zipfile
+import io
+import struct
+import gzip
+import uuid
 import time
 from datetime import datetime
 from urllib.parse import urljoin
@@ -246,9 +254,60 @@ def test_tracking_endpoint():
         print_test("Tracking endpoint", False, str(e))
         return False
 
+def test_batch_tracking_endpoint():
+    """Test 6: Batch tracking endpoint"""
+    print(f"\n{Colors.BLUE}TEST 6: Batch Tracking Endpoint{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        batch = {
+            "events": [
+                {
+                    "event_type": "pageview",
+                    "url": "http://test.example.com",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "session_id": "test_batch_session"
+                },
+                {
+                    "event_type": "click",
+                    "x": 120,
+                    "y": 240,
+                    "element_type": "button",
+                    "url": "http://test.example.com",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "session_id": "test_batch_session"
+                },
+                {
+                    "event_type": "not_a_real_event",
+                    "url": "http://test.example.com"
+                }
+            ]
+        }
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=batch)
+        passed = response.status_code == 200
+        print_test("Batch accepted", passed, f"Status: {response.status_code}")
+        
+        data = response.json() if passed else {}
+        statuses = [item.get("status") for item in data.get("results", [])]
+        checks = [
+            ("Accepted count", data.get("accepted") == 2),
+            ("Rejected count", data.get("rejected") == 1),
+            ("Per-item status", statuses == ["accepted", "accepted", "rejected"])
+        ]
+        
+        for check_name, result in checks:
+            print_test(f"  - {check_name}", result)
+        
+        return passed and all(result for _, result in checks)
+        
+    except Exception as e:
+        print_test("Batch tracking endpoint", False, str(e))
+        return False
+
 def test_tracking_script():
-    """Test 6: Tracking script endpoint"""
-    print(f"\n{Colors.BLUE}TEST 6: Tracking Script{Colors.RESET}")
+    """Test 7: Tracking script endpoint"""
+    print(f"\n{Colors.BLUE}TEST 7: Tracking Script{Colors.RESET}")
     print("-" * 60)
     
     try:
@@ -268,15 +327,41 @@ def test_tracking_script():
         for check_name, result in checks:
             print_test(f"  - {check_name}", result)
         
-        return script_loaded and all(result for _, result in checks)
+        # Identity and gzip bodies are separate representations with their own ETags
+        plain = requests.get(urljoin(BASE_URL, "/tracking-script"), headers={"Accept-Encoding": "identity"})
+        compressed = requests.get(urljoin(BASE_URL, "/tracking-script"), headers={"Accept-Encoding": "gzip"})
+        plain_etag = plain.headers.get("ETag", "").strip('"')
+        gzip_etag = compressed.headers.get("ETag", "").strip('"')
+        not_modified = requests.get(
+            urljoin(BASE_URL, "/tracking-script"),
+            headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers.get("ETag", "")}
+        )
+        wrong_representation = requests.get(
+            urljoin(BASE_URL, "/tracking-script"),
+            headers={"Accept-Encoding": "identity", "If-None-Match": compressed.headers.get("ETag", "")}
+        )
+        cache_checks = [
+            ("Content ETag", plain_etag == hashlib.sha256(plain.content).hexdigest()[:32]),
+            ("Gzip body", compressed.headers.get("Content-Encoding") == "gzip" and compressed.content == plain.content),
+            ("Gzip ETag", gzip_etag == plain_etag + "-gz"),
+            ("If-None-Match returns 304", not_modified.status_code == 304 and not not_modified.content),
+            ("Other encoding not matched", wrong_representation.status_code == 200),
+            ("Cache-Control", plain.headers.get("Cache-Control") == "public, max-age=300"),
+            ("Vary", compressed.headers.get("Vary") == "Accept-Encoding"),
+        ]
+        
+        for check_name, result in cache_checks:
+            print_test(f"  - {check_name}", result)
+        
+        return script_loaded and all(result for _, result in checks + cache_checks)
         
     except Exception as e:
         print_test("Tracking script", False, str(e))
         return False
 
 def test_static_files():
-    """Test 7: Static files (CSS, JS)"""
-    print(f"\n{Colors.BLUE}TEST 7: Static Files{Colors.RESET}")
+    """Test 8: Static files (CSS, JS)"""
+    print(f"\n{Colors.BLUE}TEST 8: Static Files{Colors.RESET}")
     print("-" * 60)
     
     files = [
@@ -299,8 +384,8 @@ def test_static_files():
     return all_passed
 
 def test_logout():
-    """Test 8: Logout functionality"""
-    print(f"\n{Colors.BLUE}TEST 8: Logout{Colors.RESET}")
+    """Test 9: Logout functionality"""
+    print(f"\n{Colors.BLUE}TEST 9: Logout{Colors.RESET}")
     print("-" * 60)
     
     session = requests.Session()
@@ -333,6 +418,1021 @@ def test_logout():
         print_test("Logout flow", False, str(e))
         return False
 
+def test_timestamp_validation():
+    """Test 10: Out-of-range timestamps are rejected per event"""
+    print(f"\n{Colors.BLUE}TEST 10: Timestamp Validation{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        event = {
+            "event_type": "click",
+            "x": 10,
+            "y": 20,
+            "url": "http://test.example.com",
+            "session_id": "test_timestamp_session"
+        }
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(event, timestamp=1e20))
+        single_rejected = response.status_code == 400
+        print_test("Single event with huge timestamp rejected", single_rejected, f"Status: {response.status_code}")
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(event, timestamp=int(time.time() * 1000)))
+        epoch_accepted = response.status_code in (200, 202)
+        print_test("Single event with epoch ms timestamp accepted", epoch_accepted, f"Status: {response.status_code}")
+        
+        batch = [dict(event, timestamp=int(time.time() * 1000)), dict(event, timestamp=-1e18)]
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=batch)
+        data = response.json() if response.status_code in (200, 202) else {}
+        statuses = [item.get("status") for item in data.get("results", [])]
+        batch_passed = statuses == ["accepted", "rejected"]
+        print_test("Batch rejects only the out-of-range event", batch_passed, f"Status: {response.status_code}, {statuses}")
+        
+        return single_rejected and epoch_accepted and batch_passed
+    
+    except Exception as e:
+        print_test("Timestamp validation", False, str(e))
+        return False
+
+def authenticated_session():
+    """Requests session logged in with a demo key, for the analytics and export endpoints"""
+    session = requests.Session()
+    session.post(urljoin(BASE_URL, "/authenticate"), data={"demo_key": "demo"})
+    return session
+
+def unique_url(name):
+    """Page URL no earlier run has tracked, so filtered reads only see this test's events"""
+    return f"http://{name}-{uuid.uuid4().hex[:8]}.example.com/page"
+
+def wait_for_events(session, url, count, timeout=5):
+    """Poll the export until count events for url are stored, returning them"""
+    deadline = time.time() + timeout
+    while True:
+        response = session.get(urljoin(BASE_URL, "/api/export-data"), params={"url": url})
+        events = response.json().get("events", []) if response.status_code == 200 else []
+        if len(events) >= count or time.time() > deadline:
+            return events
+        time.sleep(0.2)
+
+def test_write_behind_queue():
+    """Test 11: Write-behind ingest queue"""
+    print(f"\n{Colors.BLUE}TEST 11: Write-Behind Ingest Queue{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("queue")
+        session_id = f"test_queue_{uuid.uuid4().hex[:8]}"
+        events = [
+            {"event_type": "click", "x": 10 * i, "y": 20, "url": url, "session_id": session_id}
+            for i in range(5)
+        ]
+        
+        # The queue is optional (TRACK_WRITE_BEHIND); both modes must end up storing the batch
+        queue_enabled = session.get(urljoin(BASE_URL, "/api/ingest-stats")).json().get("queue") is not None
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        if queue_enabled:
+            accepted = response.status_code == 202 and response.json().get("status") == "queued"
+            print_test("Batch queued", accepted, f"Status: {response.status_code}")
+        else:
+            accepted = response.status_code == 200 and response.json().get("status") == "success"
+            print_test("Batch committed (write-behind disabled)", accepted, f"Status: {response.status_code}")
+        
+        stored = wait_for_events(session, url, len(events))
+        stored_passed = len(stored) == len(events)
+        print_test("All events stored", stored_passed, f"{len(stored)}/{len(events)} events")
+        
+        counters_passed = True
+        if queue_enabled:
+            queue = session.get(urljoin(BASE_URL, "/api/ingest-stats")).json().get("queue") or {}
+            counters_passed = all(key in queue for key in ("depth", "flushed", "failed", "retried", "splits", "dropped"))
+            print_test("Queue counters reported", counters_passed, f"Dropped: {queue.get('dropped')}")
+        
+        return accepted and stored_passed and counters_passed
+    
+    except Exception as e:
+        print_test("Write-behind ingest queue", False, str(e))
+        return False
+
+def test_session_aggregates():
+    """Test 12: Session aggregates held in memory"""
+    print(f"\n{Colors.BLUE}TEST 12: Session Aggregates{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("sessions")
+        session_id = f"test_sessions_{uuid.uuid4().hex[:8]}"
+        events = [
+            {"event_type": "pageview", "url": url, "session_id": session_id, "user_agent": "TestAgent/1.0"},
+            {"event_type": "click", "x": 5, "y": 5, "url": url, "session_id": session_id},
+            {"event_type": "pageview", "url": url, "session_id": session_id}
+        ]
+        for event in events:
+            requests.post(urljoin(BASE_URL, "/api/track"), json=event)
+        wait_for_events(session, url, len(events))
+        
+        def stored_session():
+            # Exports write pending aggregates before reading sessions
+            response = session.get(urljoin(BASE_URL, "/api/export-data"))
+            sessions = response.json().get("sessions", []) if response.status_code == 200 else []
+            return next((item for item in sessions if item.get("session_id") == session_id), None)
+        
+        stored = stored_session() or {}
+        counts_passed = stored.get("event_count") == 3 and stored.get("pages_visited") == 2
+        print_test("Session counters written", counts_passed, f"Events: {stored.get('event_count')}, Pages: {stored.get('pages_visited')}")
+        first_seen_passed = stored.get("initial_url") == url and stored.get("user_agent") == "TestAgent/1.0"
+        print_test("First event sets initial url and user agent", first_seen_passed)
+        
+        # A later flush adds to the stored row instead of replacing it
+        requests.post(urljoin(BASE_URL, "/api/track"), json=dict(events[0]))
+        wait_for_events(session, url, len(events) + 1)
+        stored = stored_session() or {}
+        merge_passed = stored.get("event_count") == 4 and stored.get("pages_visited") == 3
+        print_test("Later events merged into the session", merge_passed, f"Events: {stored.get('event_count')}")
+        
+        return counts_passed and first_seen_passed and merge_passed
+    
+    except Exception as e:
+        print_test("Session aggregates", False, str(e))
+        return False
+
+def test_page_summaries():
+    """Test 13: Page view summaries feed the heatmap and scroll analysis"""
+    print(f"\n{Colors.BLUE}TEST 13: Page View Summaries{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("summary")
+        summary = {
+            "session_id": f"test_summary_{uuid.uuid4().hex[:8]}",
+            "url": url,
+            "timestamp": int(time.time() * 1000),
+            "viewport_width": 1280,
+            "viewport_height": 800,
+            "grid_size": 20,
+            "mouse_samples": 7,
+            "mouse_grid": {"1,2": 3, "4,5": 4},
+            "scroll_samples": 4,
+            "scroll_depth_sum": 200,
+            "max_scroll_depth": 80,
+            "scroll_bands": [0, 0, 0, 0, 1, 1, 1, 1, 0, 0],
+            "scroll_dwell_ms": [0, 0, 0, 0, 100, 250, 100, 50, 0, 0]
+        }
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track/summary"), json=summary)
+        accepted = response.status_code == 200 and response.json().get("accepted") == 1
+        print_test("Summary accepted", accepted, f"Status: {response.status_code}")
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track/summary"), json=dict(summary, grid_size=0))
+        invalid_rejected = response.status_code == 400
+        print_test("Invalid summary rejected", invalid_rejected, f"Status: {response.status_code}")
+        
+        # Grid cells are scaled by grid_size into pixel positions
+        heatmap = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url}).json()
+        movement = sorted((point["x"], point["y"], point["count"]) for point in heatmap.get("movement_points", []))
+        movement_passed = movement == [(20, 40, 3), (80, 100, 4)] and heatmap.get("total_movements") == 7
+        print_test("Mouse grid merged into movement points", movement_passed, f"Points: {movement}")
+        
+        scroll = session.get(urljoin(BASE_URL, "/api/scroll-data"), params={"url": url}).json()
+        scroll_checks = [
+            ("Scroll samples counted", scroll.get("total_scroll_events") == 4),
+            ("Average depth", scroll.get("average_depth") == 50),
+            ("Max depth", scroll.get("max_depth") == 80),
+            ("Depth bands", scroll.get("depth_distribution") == summary["scroll_bands"]),
+            ("Dwell per band", scroll.get("dwell_distribution_ms") == summary["scroll_dwell_ms"]),
+            ("Bounce rate", scroll.get("bounce_rate") == 0)
+        ]
+        for check_name, result in scroll_checks:
+            print_test(f"  - {check_name}", result)
+        
+        # Summary samples count towards the session's events, so one raw pageview is not a short session
+        pageview = {"event_type": "pageview", "url": url, "session_id": summary["session_id"]}
+        requests.post(urljoin(BASE_URL, "/api/track"), json=pageview)
+        wait_for_events(session, url, 1)
+        engagement_titles = {"Short User Sessions", "Low User Engagement"}
+        suggestions = session.get(urljoin(BASE_URL, "/api/suggestions"), params={"url": url}).json()
+        report = session.get(urljoin(BASE_URL, "/api/generate-report"), params={"url": url}).json()
+        titles = {s.get("title") for s in suggestions.get("suggestions", []) + report.get("suggestions", [])}
+        engagement_passed = not titles & engagement_titles
+        print_test("Summary samples count as session events", engagement_passed, f"Suggestions: {sorted(titles)}")
+        
+        return (
+            accepted and invalid_rejected and movement_passed and all(result for _, result in scroll_checks) and
+            engagement_passed
+        )
+    
+    except Exception as e:
+        print_test("Page view summaries", False, str(e))
+        return False
+
+def test_compact_wire_formats():
+    """Test 14: NDJSON, binary and gzip batch bodies"""
+    print(f"\n{Colors.BLUE}TEST 14: Compact Wire Formats{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("wire")
+        session_id = f"test_wire_{uuid.uuid4().hex[:8]}"
+        header = {"session_id": session_id, "url": url, "viewport_width": 1024}
+        
+        # NDJSON: shared header line, then one event per line
+        lines = [header, {"event_type": "click", "x": 11, "y": 12}, {"event_type": "pageview"}]
+        response = requests.post(
+            urljoin(BASE_URL, "/api/track/batch"),
+            data="\n".join(json.dumps(line) for line in lines),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        ndjson_passed = response.status_code in (200, 202) and response.json().get("accepted") == 2
+        print_test("NDJSON batch accepted", ndjson_passed, f"Status: {response.status_code}")
+        
+        # Binary: magic, header length, JSON header, then (type, ms offset, x, y, scroll_depth) records
+        base_timestamp = int(time.time() * 1000)
+        binary_header = json.dumps(dict(header, base_timestamp=base_timestamp)).encode("utf-8")
+        nan = float("nan")
+        body = b"UXB1" + struct.pack("<I", len(binary_header)) + binary_header
+        body += struct.pack("<BIfff", 1, 0, 100.0, 200.0, nan)
+        body += struct.pack("<BIfff", 2, 50, nan, nan, 40.0)
+        response = requests.post(
+            urljoin(BASE_URL, "/api/track/batch"),
+            data=body,
+            headers={"Content-Type": "application/vnd.uxanalytics.events"}
+        )
+        binary_passed = response.status_code in (200, 202) and response.json().get("accepted") == 2
+        print_test("Binary batch accepted", binary_passed, f"Status: {response.status_code}")
+        
+        # gzip-compressed JSON batch
+        events = [{"event_type": "click", "x": 7, "y": 8, "url": url, "session_id": session_id}]
+        response = requests.post(
+            urljoin(BASE_URL, "/api/track/batch"),
+            data=gzip.compress(json.dumps({"events": events}).encode("utf-8")),
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        )
+        gzip_passed = response.status_code in (200, 202) and response.json().get("accepted") == 1
+        print_test("gzip batch accepted", gzip_passed, f"Status: {response.status_code}")
+        
+        response = requests.post(
+            urljoin(BASE_URL, "/api/track/batch"),
+            data=b"UXB1" + struct.pack("<I", 2) + b"{}" + b"\x01\x00",
+            headers={"Content-Type": "application/vnd.uxanalytics.events"}
+        )
+        truncated_rejected = response.status_code == 400
+        print_test("Truncated binary batch rejected", truncated_rejected, f"Status: {response.status_code}")
+        
+        # Header fields are applied to every event, binary offsets to the base timestamp
+        stored = wait_for_events(session, url, 5)
+        clicks = sorted((event["x"], event["y"]) for event in stored if event["event_type"] == "click")
+        scrolls = [event for event in stored if event["event_type"] == "scroll"]
+        decoded_checks = [
+            ("All events stored", len(stored) == 5),
+            ("Header applied to every event", all(event["session_id"] == session_id for event in stored)),
+            ("Click coordinates", clicks == [(7, 8), (11, 12), (100, 200)]),
+            ("Binary scroll depth", [event["scroll_depth"] for event in scrolls] == [40.0])
+        ]
+        response = session.get(urljoin(BASE_URL, "/api/export-data"), params={"url": url, "timestamps": "epoch"})
+        epoch_scrolls = [event for event in response.json().get("events", []) if event["event_type"] == "scroll"]
+        decoded_checks.append(
+            ("Binary timestamp offset", [event["timestamp"] for event in epoch_scrolls] == [base_timestamp + 50])
+        )
+        for check_name, result in decoded_checks:
+            print_test(f"  - {check_name}", result)
+        
+        return (ndjson_passed and binary_passed and gzip_passed and truncated_rejected
+                and all(result for _, result in decoded_checks))
+    
+    except Exception as e:
+        print_test("Compact wire formats", False, str(e))
+        return False
+
+def test_duplicate_events():
+    """Test 15: Duplicate event IDs are dropped"""
+    print(f"\n{Colors.BLUE}TEST 15: Duplicate Events{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("dedup")
+        session_id = f"test_dedup_{uuid.uuid4().hex[:8]}"
+        event = {"event_type": "click", "x": 1, "y": 2, "url": url, "session_id": session_id, "event_id": "evt-1"}
+        
+        first = requests.post(urljoin(BASE_URL, "/api/track"), json=event)
+        retry = requests.post(urljoin(BASE_URL, "/api/track"), json=event)
+        single_passed = first.status_code in (200, 202) and retry.json().get("status") == "duplicate"
+        print_test("Retried event reported as duplicate", single_passed, f"Status: {retry.json().get('status')}")
+        
+        # The same ID twice within one batch, and again across batches
+        batch = [dict(event, event_id="evt-2"), dict(event, event_id="evt-2"), dict(event, event_id="evt-1")]
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=batch)
+        data = response.json()
+        statuses = [item.get("status") for item in data.get("results", [])]
+        batch_passed = statuses == ["accepted", "duplicate", "duplicate"] and data.get("duplicates") == 2
+        print_test("Batch duplicates reported per item", batch_passed, f"{statuses}")
+        
+        # IDs are scoped to their session
+        other_session = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(event, session_id=session_id + "_other"))
+        scope_passed = other_session.json().get("status") != "duplicate"
+        print_test("Same ID in another session accepted", scope_passed)
+        
+        stored = wait_for_events(session, url, 3)
+        stored_passed = len(stored) == 3
+        print_test("Each event stored once", stored_passed, f"{len(stored)} events")
+        
+        # Event IDs only key the duplicate filter and are not kept as extra data
+        id_passed = not any("event_id" in event for event in stored)
+        print_test("Event IDs not stored", id_passed)
+        
+        return single_passed and batch_passed and scope_passed and stored_passed and id_passed
+    
+    except Exception as e:
+        print_test("Duplicate events", False, str(e))
+        return False
+
+def test_admission_control():
+    """Test 16: Per-session admission control sheds low-priority events"""
+    print(f"\n{Colors.BLUE}TEST 16: Admission Control{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        admission = session.get(urljoin(BASE_URL, "/api/ingest-stats")).json().get("admission")
+        if admission is None:
+            print_test("Admission control disabled", True, "TRACK_ADMISSION_CONTROL is off")
+            return True
+        
+        url = unique_url("admission")
+        session_id = f"test_admission_{uuid.uuid4().hex[:8]}"
+        
+        # A burst of mousemoves from one session outruns its token bucket
+        events = [
+            {"event_type": "mousemove", "x": i, "y": i, "url": url, "session_id": session_id}
+            for i in range(300)
+        ]
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        data = response.json()
+        shed_passed = data.get("shed", 0) > 0 and data.get("accepted", 0) > 0
+        print_test("Burst partly shed", shed_passed, f"Accepted: {data.get('accepted')}, Shed: {data.get('shed')}")
+        
+        event = {"event_type": "mousemove", "x": 1, "y": 1, "url": url, "session_id": session_id}
+        response = requests.post(urljoin(BASE_URL, "/api/track"), json=event)
+        limited_passed = response.status_code == 429 and response.headers.get("Retry-After") is not None
+        print_test("Single event over the limit gets 429", limited_passed, f"Status: {response.status_code}")
+        
+        # Pageviews and clicks are always admitted
+        response = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(event, event_type="pageview"))
+        protected_passed = response.status_code in (200, 202)
+        print_test("Pageview still admitted", protected_passed, f"Status: {response.status_code}")
+        
+        other = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(event, session_id=session_id + "_other"))
+        other_passed = other.status_code in (200, 202)
+        print_test("Other sessions unaffected", other_passed, f"Status: {other.status_code}")
+        
+        admission = session.get(urljoin(BASE_URL, "/api/ingest-stats")).json().get("admission") or {}
+        stats_passed = admission.get("shed_by_event_type", {}).get("mousemove", 0) > 0
+        print_test("Shed events counted", stats_passed)
+        
+        return shed_passed and limited_passed and protected_passed and other_passed and stats_passed
+    
+    except Exception as e:
+        print_test("Admission control", False, str(e))
+        return False
+
+def test_analysis_filters():
+    """Test 17: Analyses read only the filtered events"""
+    print(f"\n{Colors.BLUE}TEST 17: Analysis Filters{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("filters")
+        session_id = f"test_filters_{uuid.uuid4().hex[:8]}"
+        events = [
+            {"event_type": "click", "x": 10, "y": 10, "viewport_width": 1280},
+            {"event_type": "click", "x": 50, "y": 10, "viewport_width": 1280},
+            {"event_type": "click", "x": 90, "y": 10, "viewport_width": 800},
+            {"event_type": "scroll", "scroll_depth": 60, "viewport_width": 1280},
+            {"event_type": "scroll", "scroll_depth": 20, "viewport_width": 800}
+        ]
+        events = [dict(event, url=url, session_id=session_id) for event in events]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        
+        def get(endpoint, **params):
+            return session.get(urljoin(BASE_URL, endpoint), params=dict(params, url=url))
+        
+        checks = [
+            ("Heatmap counts the page's clicks", get("/api/heatmap-data").json().get("total_clicks") == 3),
+            ("Viewport filter", get("/api/heatmap-data", viewport="1280").json().get("total_clicks") == 2),
+            ("Viewport range filter", get("/api/heatmap-data", viewport="700-900").json().get("total_clicks") == 1),
+            ("Event type filter excludes clicks", get("/api/heatmap-data", event_type="scroll").json().get("total_clicks") == 0),
+            ("Scroll analysis counts the page's scrolls", get("/api/scroll-data").json().get("total_scroll_events") == 2),
+            ("Scroll analysis with viewport filter", get("/api/scroll-data", viewport="1280").json().get("average_depth") == 60),
+            ("Suggestions with filters", get("/api/suggestions", event_type="click,scroll").status_code == 200),
+            ("Unknown event type rejected", get("/api/heatmap-data", event_type="bogus").status_code == 400),
+            ("Bad viewport rejected", get("/api/scroll-data", viewport="wide").status_code == 400)
+        ]
+        for check_name, result in checks:
+            print_test(f"  - {check_name}", result)
+        
+        return all(result for _, result in checks)
+    
+    except Exception as e:
+        print_test("Analysis filters", False, str(e))
+        return False
+
+def test_sql_heatmap():
+    """Test 18: Heatmap bins aggregated in the database match the Python clustering"""
+    print(f"\n{Colors.BLUE}TEST 18: SQL Heatmap Aggregation{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("heatmap")
+        session_id = f"test_heatmap_{uuid.uuid4().hex[:8]}"
+        now_ms = int(time.time() * 1000)
+        old_ms = now_ms - 2 * 24 * 3600 * 1000
+        
+        # Cell edges, fractions and negative coordinates, where SQL and Python rounding could differ
+        positions = [(0, 0), (19.9, 5), (20, 5), (39.5, 39.5), (-0.5, 10), (-1.5, 10), (-20, -21), (500, 300), (500, 301)]
+        events = [
+            {"event_type": "click", "x": x, "y": y, "url": url, "session_id": session_id, "timestamp": now_ms}
+            for x, y in positions
+        ]
+        events.append({"event_type": "click", "x": 0, "y": 0, "url": url, "session_id": session_id, "timestamp": old_ms})
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        
+        def expected_points(events):
+            # The analyzer's clustering: int() truncation, then floor to 20px cells
+            clusters = {}
+            for event in events:
+                key = (int(event["x"]) // 20 * 20, int(event["y"]) // 20 * 20)
+                clusters[key] = clusters.get(key, 0) + 1
+            max_count = max(clusters.values())
+            return [
+                {"x": x, "y": y, "intensity": count / max_count, "count": count}
+                for (x, y), count in sorted(clusters.items(), key=lambda item: (item[0][1], item[0][0]))
+            ]
+        
+        heatmap = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url}).json()
+        all_passed = heatmap.get("points") == expected_points(events) and heatmap.get("total_clicks") == len(events)
+        print_test("Bins match Python clustering", all_passed, f"Clusters: {heatmap.get('clusters')}")
+        
+        since = datetime.utcfromtimestamp((now_ms - 3600 * 1000) / 1000).isoformat()
+        heatmap = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url, "from": since}).json()
+        window_passed = heatmap.get("points") == expected_points(events[:-1]) and heatmap.get("total_clicks") == len(events) - 1
+        print_test("Time window excludes older clicks", window_passed, f"Clicks: {heatmap.get('total_clicks')}")
+        
+        response = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url, "from": "yesterday"})
+        invalid_passed = response.status_code == 400
+        print_test("Invalid time filter rejected", invalid_passed, f"Status: {response.status_code}")
+        
+        return all_passed and window_passed and invalid_passed
+    
+    except Exception as e:
+        print_test("SQL heatmap aggregation", False, str(e))
+        return False
+
+def test_sql_scroll():
+    """Test 19: Scroll metrics aggregated in the database match the analyzer's formulas"""
+    print(f"\n{Colors.BLUE}TEST 19: SQL Scroll Aggregation{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("scroll")
+        prefix = f"test_scroll_{uuid.uuid4().hex[:8]}"
+        sessions = {f"{prefix}_a": [10, 30], f"{prefix}_b": [5, 20], f"{prefix}_c": [95]}
+        events = [
+            {"event_type": "scroll", "scroll_depth": depth, "url": url, "session_id": session_id}
+            for session_id, depths in sessions.items()
+            for depth in depths
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        
+        # Expected values computed the way the Python analyzer does
+        depths = [depth for session_depths in sessions.values() for depth in session_depths]
+        buckets = [0] * 10
+        for depth in depths:
+            buckets[min(int(depth // 10), 9)] += 1
+        bounces = sum(1 for session_depths in sessions.values() if max(session_depths) < 25)
+        
+        scroll = session.get(urljoin(BASE_URL, "/api/scroll-data"), params={"url": url}).json()
+        metrics_passed = (
+            scroll.get("total_scroll_events") == len(depths) and
+            scroll.get("average_depth") == round(sum(depths) / len(depths), 2) and
+            scroll.get("max_depth") == max(depths)
+        )
+        print_test("Depth metrics", metrics_passed, f"Average: {scroll.get('average_depth')}, max: {scroll.get('max_depth')}")
+        
+        buckets_passed = scroll.get("depth_distribution") == buckets
+        print_test("Depth distribution", buckets_passed, f"Buckets: {scroll.get('depth_distribution')}")
+        
+        bounce_passed = scroll.get("bounce_rate") == round(bounces / len(sessions) * 100, 2)
+        print_test("Bounce rate per session", bounce_passed, f"Bounce rate: {scroll.get('bounce_rate')}%")
+        
+        return metrics_passed and buckets_passed and bounce_passed
+    
+    except Exception as e:
+        print_test("SQL scroll aggregation", False, str(e))
+        return False
+
+def test_conditional_get():
+    """Test 20: Analytics reads answer 304 until new events arrive"""
+    print(f"\n{Colors.BLUE}TEST 20: Conditional GET{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("etag")
+        session_id = f"test_etag_{uuid.uuid4().hex[:8]}"
+        click = {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id}
+        requests.post(urljoin(BASE_URL, "/api/track"), json=click)
+        wait_for_events(session, url, 1)
+        
+        heatmap_url = urljoin(BASE_URL, "/api/heatmap-data")
+        response = session.get(heatmap_url, params={"url": url})
+        etag = response.headers.get("ETag")
+        etag_passed = response.status_code == 200 and bool(etag)
+        print_test("ETag on analytics response", etag_passed, f"ETag: {etag}")
+        
+        response = session.get(heatmap_url, params={"url": url}, headers={"If-None-Match": etag})
+        not_modified_passed = response.status_code == 304 and not response.content
+        print_test("Unchanged data answers 304", not_modified_passed, f"Status: {response.status_code}")
+        
+        # Other filters are another resource with their own ETag
+        response = session.get(heatmap_url, params={"url": url, "event_type": "click"}, headers={"If-None-Match": etag})
+        params_passed = response.status_code == 200 and response.headers.get("ETag") != etag
+        print_test("ETag depends on query parameters", params_passed, f"Status: {response.status_code}")
+        
+        requests.post(urljoin(BASE_URL, "/api/track"), json=dict(click, x=300))
+        wait_for_events(session, url, 2)
+        response = session.get(heatmap_url, params={"url": url}, headers={"If-None-Match": etag})
+        changed_passed = (
+            response.status_code == 200 and
+            response.headers.get("ETag") != etag and
+            response.json().get("total_clicks") == 2
+        )
+        print_test("New events invalidate the ETag", changed_passed, f"Status: {response.status_code}")
+        
+        return etag_passed and not_modified_passed and params_passed and changed_passed
+    
+    except Exception as e:
+        print_test("Conditional GET", False, str(e))
+        return False
+
+def test_streaming_export():
+    """Test 21: Streamed NDJSON/CSV exports page through events with a resume cursor"""
+    print(f"\n{Colors.BLUE}TEST 21: Streaming Export{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("export")
+        session_id = f"test_export_{uuid.uuid4().hex[:8]}"
+        now_ms = int(time.time() * 1000)
+        events = [
+            {"event_type": "click", "x": index, "y": 0, "url": url, "session_id": session_id,
+             "timestamp": now_ms - (5 - index) * 1000}
+            for index in range(5)
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        
+        export_url = urljoin(BASE_URL, "/api/export-data")
+        pages = []
+        cursor = None
+        # Follow X-Next-Cursor until the last part, which has no cursor
+        for _ in range(len(events) + 1):
+            params = {"url": url, "format": "ndjson", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = session.get(export_url, params=params)
+            pages.append([json.loads(line) for line in response.text.splitlines() if line])
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        
+        content_type = response.headers.get("Content-Type", "")
+        paging_passed = (
+            content_type.startswith("application/x-ndjson") and
+            [len(page) for page in pages] == [2, 2, 1] and
+            [event["x"] for page in pages for event in page] == list(range(5))
+        )
+        print_test("NDJSON pages in timestamp order", paging_passed, f"Page sizes: {[len(page) for page in pages]}")
+        
+        response = session.get(export_url, params={"url": url, "format": "csv"})
+        lines = response.text.splitlines()
+        csv_passed = (
+            response.headers.get("Content-Type", "").startswith("text/csv") and
+            lines[0].split(",")[:4] == ["id", "session_id", "event_type", "url"] and
+            len(lines) == len(events) + 1
+        )
+        print_test("CSV export with header", csv_passed, f"Lines: {len(lines)}")
+        
+        response = session.get(export_url, params={"url": url, "format": "ndjson", "cursor": "not-a-cursor"})
+        cursor_passed = response.status_code == 400
+        print_test("Invalid cursor rejected", cursor_passed, f"Status: {response.status_code}")
+        
+        response = session.get(export_url, params={"format": "ndjson", "table": "pageviews"})
+        table_passed = response.status_code == 400
+        print_test("Invalid table rejected", table_passed, f"Status: {response.status_code}")
+        
+        return paging_passed and csv_passed and cursor_passed and table_passed
+    
+    except Exception as e:
+        print_test("Streaming export", False, str(e))
+        return False
+
+def npy_shape(data):
+    """Read the array shape from a .npy file header"""
+    header_size_format = '<H' if data[6] == 1 else '<I'
+    start = 8 + struct.calcsize(header_size_format)
+    header_size = struct.unpack(header_size_format, data[8:start])[0]
+    return ast.literal_eval(data[start:start + header_size].decode('latin1'))['shape']
+
+def test_columnar_export():
+    """Test 22: Columnar npz and Arrow exports"""
+    print(f"\n{Colors.BLUE}TEST 22: Columnar Export{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("columnar")
+        session_id = f"test_columnar_{uuid.uuid4().hex[:8]}"
+        events = [
+            {"event_type": event_type, "x": 5, "y": 5, "url": url, "session_id": session_id}
+            for event_type in ("click", "click", "mousemove")
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        export_url = urljoin(BASE_URL, "/api/export-data")
+        
+        # 501 means the server lacks the optional library, which is a supported configuration
+        response = session.get(export_url, params={"url": url, "format": "npz"})
+        if response.status_code == 501:
+            npz_passed = True
+            print_test("npz export", npz_passed, "numpy not installed on the server")
+        else:
+            archive = zipfile.ZipFile(io.BytesIO(response.content))
+            names = archive.namelist()
+            npz_passed = (
+                response.status_code == 200 and
+                "00000/timestamp.npy" in names and
+                "dictionary/event_type.npy" in names and
+                npy_shape(archive.read("00000/id.npy")) == (len(events),) and
+                npy_shape(archive.read("dictionary/event_type.npy")) == (2,)
+            )
+            print_test("npz export", npz_passed, f"Arrays: {len(names)}")
+        
+        response = session.get(export_url, params={"url": url, "format": "arrow"})
+        if response.status_code == 501:
+            arrow_passed = True
+            print_test("Arrow export", arrow_passed, "pyarrow not installed on the server")
+        else:
+            # An IPC stream opens with a continuation marker and ends with an empty one
+            arrow_passed = (
+                response.status_code == 200 and
+                response.content.startswith(b'\xff\xff\xff\xff') and
+                response.content.endswith(b'\xff\xff\xff\xff\x00\x00\x00\x00')
+            )
+            print_test("Arrow export", arrow_passed, f"Bytes: {len(response.content)}")
+        
+        response = session.get(export_url, params={"format": "npz", "table": "sessions"})
+        table_passed = response.status_code in (400, 501)
+        print_test("Columnar sessions export rejected", table_passed, f"Status: {response.status_code}")
+        
+        response = session.get(export_url, params={"format": "parquet"})
+        format_passed = response.status_code == 400
+        print_test("Unknown format rejected", format_passed, f"Status: {response.status_code}")
+        
+        return npz_passed and arrow_passed and table_passed and format_passed
+    
+    except Exception as e:
+        print_test("Columnar export", False, str(e))
+        return False
+
+def test_extra_data():
+    """Test 23: Extra event fields are stored as JSON and can be filtered on"""
+    print(f"\n{Colors.BLUE}TEST 23: Extra Event Data{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("extra")
+        session_id = f"test_extra_{uuid.uuid4().hex[:8]}"
+        events = [
+            {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id, "plan": "pro", "seats": 5},
+            {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id, "plan": "pro", "seats": 1},
+            {"event_type": "click", "x": 300, "y": 300, "url": url, "session_id": session_id, "plan": "free"},
+            {"event_type": "click", "x": 300, "y": 300, "url": url, "session_id": session_id}
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        exported = sorted(wait_for_events(session, url, len(events)), key=lambda event: event["id"])
+        fields_passed = (
+            [event.get("plan") for event in exported] == ["pro", "pro", "free", None] and
+            [event.get("seats") for event in exported] == [5, 1, None, None]
+        )
+        print_test("Extra fields round-trip", fields_passed, f"Plans: {[event.get('plan') for event in exported]}")
+        
+        export = session.get(urljoin(BASE_URL, "/api/export-data"), params={"url": url, "extra.plan": "pro"}).json()
+        plans = [event.get("plan") for event in export.get("events", [])]
+        export_passed = plans == ["pro", "pro"]
+        print_test("Export filtered on extra data", export_passed, f"Plans: {plans}")
+        
+        # Non-string values compare by their text form
+        export = session.get(urljoin(BASE_URL, "/api/export-data"), params={"url": url, "extra.seats": "5"}).json()
+        seats_passed = [event.get("seats") for event in export.get("events", [])] == [5]
+        print_test("Numeric extra value matched as text", seats_passed, f"Events: {export.get('total_events')}")
+        
+        heatmap = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url, "extra.plan": "pro"}).json()
+        heatmap_passed = heatmap.get("total_clicks") == 2 and [(p["x"], p["y"]) for p in heatmap.get("points", [])] == [(0, 0)]
+        print_test("Heatmap filtered on extra data", heatmap_passed, f"Clicks: {heatmap.get('total_clicks')}")
+        
+        response = session.get(urljoin(BASE_URL, "/api/heatmap-data"), params={"url": url, "extra.": "x"})
+        invalid_passed = response.status_code == 400
+        print_test("Empty extra key rejected", invalid_passed, f"Status: {response.status_code}")
+        
+        return fields_passed and export_passed and seats_passed and heatmap_passed and invalid_passed
+    
+    except Exception as e:
+        print_test("Extra event data", False, str(e))
+        return False
+
+def test_epoch_timestamps():
+    """Test 24: Event timestamps round-trip as epoch milliseconds"""
+    print(f"\n{Colors.BLUE}TEST 24: Epoch Timestamps{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("epoch")
+        session_id = f"test_epoch_{uuid.uuid4().hex[:8]}"
+        # Millisecond parts that a float or seconds-based conversion would round away
+        timestamps = [int(time.time() * 1000) // 1000 * 1000 - offset for offset in (2999, 1001, 7)]
+        events = [
+            {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id, "timestamp": timestamp}
+            for timestamp in timestamps
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        export_url = urljoin(BASE_URL, "/api/export-data")
+        
+        export = session.get(export_url, params={"url": url, "timestamps": "epoch"}).json()
+        exported = sorted(event["timestamp"] for event in export.get("events", []))
+        sessions = [s for s in export.get("sessions", []) if s.get("session_id") == session_id]
+        epoch_passed = (
+            exported == timestamps and
+            len(sessions) == 1 and
+            isinstance(sessions[0].get("first_seen"), int)
+        )
+        print_test("JSON export returns posted epoch ms", epoch_passed, f"Timestamps: {exported}")
+        
+        response = session.get(export_url, params={"url": url, "format": "ndjson", "timestamps": "epoch"})
+        streamed = sorted(json.loads(line)["timestamp"] for line in response.text.splitlines() if line)
+        stream_passed = streamed == timestamps
+        print_test("NDJSON export returns posted epoch ms", stream_passed, f"Timestamps: {streamed}")
+        
+        # ISO strings stay the default, naive UTC with millisecond precision intact
+        export = session.get(export_url, params={"url": url}).json()
+        iso_values = sorted(event["timestamp"] for event in export.get("events", []))
+        iso_passed = [
+            round((datetime.fromisoformat(value) - datetime(1970, 1, 1)).total_seconds() * 1000)
+            for value in iso_values
+        ] == timestamps
+        print_test("ISO timestamps by default", iso_passed, f"First: {iso_values[0] if iso_values else None}")
+        
+        response = session.get(export_url, params={"url": url, "timestamps": "bogus"})
+        invalid_passed = response.status_code == 400
+        print_test("Invalid timestamps option rejected", invalid_passed, f"Status: {response.status_code}")
+        
+        return epoch_passed and stream_passed and iso_passed and invalid_passed
+    
+    except Exception as e:
+        print_test("Epoch timestamps", False, str(e))
+        return False
+
+def test_field_validation():
+    """Test 25: Malformed event fields are rejected per item"""
+    print(f"\n{Colors.BLUE}TEST 25: Event Field Validation{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("fields")
+        session_id = f"test_fields_{uuid.uuid4().hex[:8]}"
+        valid = {"event_type": "click", "x": 10, "y": 20, "url": url, "session_id": session_id}
+        invalid = [
+            dict(valid, session_id=["x"]),
+            dict(valid, session_id="s" * 101),
+            dict(valid, element_text={"a": 1}),
+            dict(valid, element_type="t" * 51),
+            dict(valid, page_title=42),
+            dict(valid, viewport_width="wide"),
+            dict(valid, viewport_height=2 ** 40),
+            dict(valid, event_id={"id": 1}),
+            dict(valid, referrer="http://a\x00b"),
+            dict(valid, url=url + "?q=" + "\u00e9" * 1100)
+        ]
+        batch = [dict(valid, element_type="button", viewport_width=1280.0)] + invalid
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track/batch"), json=batch)
+        data = response.json() if response.status_code in (200, 202) else {}
+        statuses = [item.get("status") for item in data.get("results", [])]
+        errors = [item.get("error") for item in data.get("results", [])[1:]]
+        batch_passed = statuses == ["accepted"] + ["rejected"] * len(invalid)
+        print_test("Bad items rejected by index", batch_passed, f"Status: {response.status_code}, errors: {errors}")
+        
+        stored = wait_for_events(session, url, 1)
+        stored_passed = len(stored) == 1 and stored[0].get("viewport_width") == 1280
+        print_test("Valid item stored", stored_passed, f"{len(stored)} events")
+        
+        response = requests.post(urljoin(BASE_URL, "/api/track"), json=dict(valid, session_id=["x"]))
+        single_passed = response.status_code == 400
+        print_test("Single event with bad field rejected", single_passed, f"Status: {response.status_code}")
+        
+        return batch_passed and stored_passed and single_passed
+    
+    except Exception as e:
+        print_test("Event field validation", False, str(e))
+        return False
+
+def test_result_cache():
+    """Test 26: Unchanged data is answered from the result cache"""
+    print(f"\n{Colors.BLUE}TEST 26: Result Cache{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("cache")
+        session_id = f"test_cache_{uuid.uuid4().hex[:8]}"
+        scroll = {"event_type": "scroll", "scroll_depth": 40, "url": url, "session_id": session_id}
+        requests.post(urljoin(BASE_URL, "/api/track"), json=scroll)
+        wait_for_events(session, url, 1)
+        
+        stats_url = urljoin(BASE_URL, "/api/ingest-stats")
+        scroll_url = urljoin(BASE_URL, "/api/scroll-data")
+        before = session.get(stats_url).json().get("result_cache") or {}
+        first = session.get(scroll_url, params={"url": url})
+        second = session.get(scroll_url, params={"url": url})
+        after = session.get(stats_url).json().get("result_cache") or {}
+        hit_passed = (
+            first.status_code == 200 and second.json() == first.json() and
+            after.get("misses", 0) - before.get("misses", 0) == 1 and
+            after.get("hits", 0) - before.get("hits", 0) == 1
+        )
+        print_test("Repeated read is a cache hit", hit_passed, f"Stats: {after}")
+        
+        # A new event changes the data version, so the next read is recomputed
+        requests.post(urljoin(BASE_URL, "/api/track"), json=dict(scroll, scroll_depth=80))
+        wait_for_events(session, url, 2)
+        third = session.get(scroll_url, params={"url": url})
+        final = session.get(stats_url).json().get("result_cache") or {}
+        miss_passed = (
+            final.get("misses", 0) - after.get("misses", 0) == 1 and
+            third.json().get("max_depth") == 80 and
+            third.json() != first.json()
+        )
+        print_test("New data misses the cache", miss_passed, f"Max depth: {third.json().get('max_depth')}")
+        
+        return hit_passed and miss_passed
+    
+    except Exception as e:
+        print_test("Result cache", False, str(e))
+        return False
+
+def test_report():
+    """Test 27: The report combines export and analysis sections from one snapshot"""
+    print(f"\n{Colors.BLUE}TEST 27: Analytics Report{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("report")
+        session_id = f"test_report_{uuid.uuid4().hex[:8]}"
+        timestamp = int(time.time() * 1000) - 1234
+        events = [
+            {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id, "timestamp": timestamp},
+            {"event_type": "scroll", "scroll_depth": 60, "url": url, "session_id": session_id, "timestamp": timestamp + 1}
+        ]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        wait_for_events(session, url, len(events))
+        report_url = urljoin(BASE_URL, "/api/generate-report")
+        
+        response = session.get(report_url, params={"url": url})
+        report = response.json() if response.status_code == 200 else {}
+        sections = ("export_data", "heatmap_data", "scroll_data", "suggestions", "generated_at")
+        sections_passed = (
+            all(section in report for section in sections) and
+            len(report["export_data"].get("events", [])) == len(events) and
+            report["heatmap_data"].get("total_clicks") == 1 and
+            report["scroll_data"].get("total_scroll_events") == 1 and
+            isinstance(report["suggestions"], list)
+        )
+        print_test("Report sections", sections_passed, f"Status: {response.status_code}, keys: {sorted(report)}")
+        
+        response = session.get(report_url, params={"url": url, "timestamps": "epoch"})
+        report = response.json() if response.status_code == 200 else {}
+        exported = sorted(event["timestamp"] for event in report.get("export_data", {}).get("events", []))
+        epoch_passed = exported == [timestamp, timestamp + 1]
+        print_test("Epoch timestamps in the export section", epoch_passed, f"Timestamps: {exported}")
+        
+        response = session.get(report_url, params={"url": url, "timestamps": "bogus"})
+        invalid_passed = response.status_code == 400
+        print_test("Invalid timestamps option rejected", invalid_passed, f"Status: {response.status_code}")
+        
+        return sections_passed and epoch_passed and invalid_passed
+    
+    except Exception as e:
+        print_test("Analytics report", False, str(e))
+        return False
+
+def test_suggestion_features():
+    """Test 28: Suggestion features merge across shards and survive serialization"""
+    print(f"\n{Colors.BLUE}TEST 28: Suggestion Features{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        # The features are computed in process, so this test uses the analyzer directly
+        from ml_model import UXAnalyzer, SuggestionFeatures
+        analyzer = UXAnalyzer()
+        # Few button clicks, shallow scrolling and many one-event sessions, so several rules fire
+        events = []
+        for index in range(40):
+            session_id = f"features_{index % 12}"
+            events.append({"event_type": "click", "session_id": session_id, "element_type": "button" if index % 5 == 0 else "a"})
+            events.append({"event_type": "scroll", "session_id": session_id, "scroll_depth": (index * 7) % 25})
+        events.extend({"event_type": "pageview", "session_id": f"features_single_{index}"} for index in range(20))
+        
+        whole = analyzer.extract_features(events)
+        merged = analyzer.extract_features(events[:33]).merge(analyzer.extract_features(events[33:]))
+        merge_passed = merged.to_dict() == whole.to_dict()
+        print_test("Merged shards equal one pass", merge_passed, f"Events: {merged.total_events}")
+        
+        restored = SuggestionFeatures.from_dict(json.loads(json.dumps(merged.to_dict())))
+        round_trip_passed = restored.to_dict() == whole.to_dict()
+        print_test("to_dict/from_dict round trip", round_trip_passed)
+        
+        expected = analyzer.generate_suggestions(events)
+        suggestions_passed = (
+            len(expected) > 0 and
+            analyzer.suggestions_from_features(restored) == expected and
+            analyzer.suggestions_from_features(restored.merge(SuggestionFeatures())) == expected
+        )
+        print_test("Suggestions from restored features match", suggestions_passed, f"{len(expected)} suggestions")
+        
+        return merge_passed and round_trip_passed and suggestions_passed
+    
+    except Exception as e:
+        print_test("Suggestion features", False, str(e))
+        return False
+
+def test_interned_fields():
+    """Test 29: Interned event strings come back unchanged from every export"""
+    print(f"\n{Colors.BLUE}TEST 29: Interned Event Fields{Colors.RESET}")
+    print("-" * 60)
+    
+    try:
+        session = authenticated_session()
+        url = unique_url("interned")
+        session_id = f"test_interned_{uuid.uuid4().hex[:8]}"
+        fields = ("user_agent", "referrer", "page_title", "element_class")
+        shared = {
+            "user_agent": "Mozilla/5.0 (X11; Linux x86_64) Test/1.0",
+            "referrer": "http://example.com/from?q=café",
+            "page_title": "Interned — Title",
+            "element_class": "btn btn-primary"
+        }
+        other = {field: f"{value} {uuid.uuid4().hex[:6]}" for field, value in shared.items()}
+        base = {"event_type": "click", "x": 10, "y": 10, "url": url, "session_id": session_id}
+        events = [dict(base, **shared), dict(base, **shared), dict(base, **other), dict(base)]
+        expected = [tuple(event.get(field) for field in fields) for event in events]
+        requests.post(urljoin(BASE_URL, "/api/track/batch"), json=events)
+        exported = sorted(wait_for_events(session, url, len(events)), key=lambda event: event["id"])
+        
+        json_values = [tuple(event.get(field) for field in fields) for event in exported]
+        json_passed = json_values == expected
+        print_test("JSON export", json_passed, f"Values: {json_values[0] if json_values else None}")
+        
+        export_url = urljoin(BASE_URL, "/api/export-data")
+        response = session.get(export_url, params={"url": url, "format": "ndjson"})
+        records = sorted((json.loads(line) for line in response.text.splitlines() if line), key=lambda event: event["id"])
+        ndjson_passed = [tuple(event.get(field) for field in fields) for event in records] == expected
+        print_test("NDJSON export", ndjson_passed, f"Status: {response.status_code}")
+        
+        response = session.get(export_url, params={"url": url, "format": "csv"})
+        rows = sorted(csv.DictReader(io.StringIO(response.text)), key=lambda row: int(row["id"]))
+        csv_values = [tuple(row.get(field) or None for field in fields) for row in rows]
+        csv_passed = csv_values == expected
+        print_test("CSV export", csv_passed, f"Status: {response.status_code}")
+        
+        return json_passed and ndjson_passed and csv_passed
+    
+    except Exception as e:
+        print_test("Interned event fields", False, str(e))
+        return False
+
 def run_all_tests():
     """Run all tests"""
     print(f"\n{Colors.BLUE}{'='*60}")
@@ -347,9 +1447,30 @@ def run_all_tests():
         "Dashboard": test_dashboard(),
         "API Endpoints": test_api_endpoints(),
         "Tracking Endpoint": test_tracking_endpoint(),
+        "Batch Tracking Endpoint": test_batch_tracking_endpoint(),
         "Tracking Script": test_tracking_script(),
         "Static Files": test_static_files(),
-        "Logout": test_logout()
+        "Logout": test_logout(),
+        "Timestamp Validation": test_timestamp_validation(),
+        "Write-Behind Ingest Queue": test_write_behind_queue(),
+        "Session Aggregates": test_session_aggregates(),
+        "Page View Summaries": test_page_summaries(),
+        "Compact Wire Formats": test_compact_wire_formats(),
+        "Duplicate Events": test_duplicate_events(),
+        "Admission Control": test_admission_control(),
+        "Analysis Filters": test_analysis_filters(),
+        "SQL Heatmap Aggregation": test_sql_heatmap(),
+        "SQL Scroll Aggregation": test_sql_scroll(),
+        "Conditional GET": test_conditional_get(),
+        "Streaming Export": test_streaming_export(),
+        "Columnar Export": test_columnar_export(),
+        "Extra Event Data": test_extra_data(),
+        "Epoch Timestamps": test_epoch_timestamps(),
+        "Event Field Validation": test_field_validation(),
+        "Result Cache": test_result_cache(),
+        "Analytics Report": test_report(),
+        "Suggestion Features": test_suggestion_features(),
+        "Interned Event Fields": test_interned_fields()
     }
     
     # Print summary
@@ -1,7 +1,52 @@
 import json
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from validation import validate_tracking_data
+
+EPOCH = datetime(1970, 1, 1)
+
+class DataStreamError(Exception):
+    """Reading a stream of tracking data failed part way, so anything computed from it is incomplete"""
+
+def to_epoch_ms(value):
+    """Convert a datetime (naive values are UTC) to integer epoch milliseconds"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+def from_epoch_ms(timestamp_ms):
+    """Convert integer epoch milliseconds to a naive UTC datetime; None if a datetime cannot hold it"""
+    try:
+        return EPOCH + timedelta(milliseconds=timestamp_ms)
+    except (OverflowError, ValueError):
+        return None
+
+def format_epoch_ms(timestamp_ms):
+    """Format epoch milliseconds as an ISO 8601 string, for presentation"""
+    timestamp = from_epoch_ms(timestamp_ms)
+    return timestamp.isoformat() if timestamp else None
+
+def parse_timestamp_ms(value):
+    """Get epoch milliseconds from epoch ms, an ISO 8601 string or a datetime; None if it is none of these"""
+    # Integers pass straight through; only legacy ISO strings pay for parsing
+    if isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            timestamp_ms = int(value)
+        elif isinstance(value, datetime):
+            timestamp_ms = to_epoch_ms(value)
+        elif isinstance(value, str):
+            timestamp_ms = to_epoch_ms(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        else:
+            return None
+    except (OverflowError, ValueError):
+        return None
+    
+    # Values a datetime cannot hold are treated as unparseable
+    return timestamp_ms if from_epoch_ms(timestamp_ms) is not None else None
 
 def load_tracking_data():
     """Load tracking data from JSON file"""
@@ -30,74 +75,20 @@ def save_tracking_data(data):
         logging.error(f"Error saving tracking data: {str(e)}")
         return False
 
-def validate_tracking_data(data):
-    """Validate incoming tracking data"""
-    if not isinstance(data, dict):
-        return False
-    
-    required_fields = ['event_type', 'url', 'timestamp']
-    
-    # Check if all required fields are present
-    for field in required_fields:
-        if field not in data:
-            return False
-    
-    # Validate event type
-    valid_event_types = ['click', 'scroll', 'mousemove', 'pageview', 'hover']
-    if data.get('event_type') not in valid_event_types:
-        return False
-    
-    # Validate URL format
-    url = data.get('url', '')
-    if not url or not isinstance(url, str):
-        return False
-    
-    # Validate coordinates for position-based events
-    if data.get('event_type') in ['click', 'mousemove', 'hover']:
-        try:
-            x = data.get('x')
-            y = data.get('y')
-            if x is None or y is None:
-                return False
-            float(x)  # Check if convertible to number
-            float(y)
-        except (ValueError, TypeError):
-            return False
-    
-    # Validate scroll depth for scroll events
-    if data.get('event_type') == 'scroll':
-        try:
-            scroll_depth = data.get('scroll_depth')
-            if scroll_depth is None:
-                return False
-            depth = float(scroll_depth)
-            if depth < 0 or depth > 100:
-                return False
-        except (ValueError, TypeError):
-            return False
-    
-    return True
-
-def format_timestamp(timestamp_str):
-    """Format timestamp for display"""
-    try:
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return timestamp_str
+def format_timestamp(timestamp):
+    """Format timestamp (epoch ms or ISO string) for display"""
+    timestamp_ms = parse_timestamp_ms(timestamp)
+    if timestamp_ms is None:
+        return timestamp
+    return from_epoch_ms(timestamp_ms).strftime('%Y-%m-%d %H:%M:%S')
 
 def calculate_session_duration(events):
-    """Calculate session duration from events"""
-    try:
-        timestamps = [e.get('timestamp') for e in events if e.get('timestamp')]
-        if len(timestamps) < 2:
-            return 0
-        
-        parsed_times = [datetime.fromisoformat(ts.replace('Z', '+00:00')) for ts in timestamps]
-        duration = max(parsed_times) - min(parsed_times)
-        return duration.total_seconds()
-    except:
+    """Calculate session duration in seconds from events"""
+    timestamps = [parse_timestamp_ms(e.get('timestamp')) for e in events if e.get('timestamp') is not None]
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    if len(timestamps) < 2:
         return 0
+    return (max(timestamps) - min(timestamps)) / 1000
 
 def clean_old_data(days_to_keep=30):
     """Clean tracking data older than specified days"""
@@ -106,16 +97,13 @@ def clean_old_data(days_to_keep=30):
         if not data:
             return True
         
-        cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
+        cutoff_ms = to_epoch_ms(datetime.utcnow() - timedelta(days=days_to_keep))
         
         filtered_data = []
         for event in data:
-            try:
-                event_time = datetime.fromisoformat(event.get('timestamp', '').replace('Z', '+00:00'))
-                if event_time > cutoff_date:
-                    filtered_data.append(event)
-            except:
-                # Keep events with invalid timestamps for safety
+            event_ms = parse_timestamp_ms(event.get('timestamp'))
+            # Keep events with invalid timestamps for safety
+            if event_ms is None or event_ms > cutoff_ms:
                 filtered_data.append(event)
         
         return save_tracking_data(filtered_data)
@@ -140,19 +128,14 @@ def get_data_statistics():
         unique_sessions = len(set(e.get('session_id', 'unknown') for e in data))
         
         # Calculate date range
-        timestamps = [e.get('timestamp') for e in data if e.get('timestamp')]
+        timestamps = [parse_timestamp_ms(e.get('timestamp')) for e in data if e.get('timestamp') is not None]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
         date_range = None
         if timestamps:
-            try:
-                parsed_times = [datetime.fromisoformat(ts.replace('Z', '+00:00')) for ts in timestamps]
-                earliest = min(parsed_times)
-                latest = max(parsed_times)
-                date_range = {
-                    'earliest': earliest.isoformat(),
-                    'latest': latest.isoformat()
-                }
-            except:
-                pass
+            date_range = {
+                'earliest': format_epoch_ms(min(timestamps)),
+                'latest': format_epoch_ms(max(timestamps))
+            }
         
         # Get file size
         file_size = 0
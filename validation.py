@@ -0,0 +1,134 @@
+"""Precompiled schema validation for tracking events"""
+
+import math
+
+VALID_EVENT_TYPES = frozenset([
+    'click', 'scroll', 'mousemove', 'pageview', 'hover',
+    'page_hidden', 'page_visible', 'page_unload'
+])
+
+# Numeric fields checked on every event as (field, (min, max) or None), with per-event-type bounds.
+# Values are coerced to float once here and stored as-is by TrackingEvent.from_dict.
+FLOAT_FIELDS = ('x', 'y', 'scroll_depth', 'scroll_top', 'document_height')
+FLOAT_FIELD_BOUNDS = {
+    'scroll': {'scroll_depth': (0.0, 100.0)}
+}
+EVENT_FIELD_SPECS = {
+    event_type: tuple((field, FLOAT_FIELD_BOUNDS.get(event_type, {}).get(field)) for field in FLOAT_FIELDS)
+    for event_type in VALID_EVENT_TYPES
+}
+
+# Optional string fields as (field, maximum length or None), matching the tracking_events columns
+STRING_FIELD_SPECS = (
+    ('session_id', 100),
+    ('element_type', 50),
+    ('element_id', 200),
+    ('element_text', None),
+    ('element_class', None),
+    ('user_agent', None),
+    ('referrer', None),
+    ('page_title', None)
+)
+
+# Optional integer fields, within the range of an INTEGER column
+INTEGER_FIELDS = ('viewport_width', 'viewport_height')
+INTEGER_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+# URLs lead the tracking_events and rollup btree indexes, whose entries PostgreSQL caps at
+# about 2.7KB, so they are limited in UTF-8 bytes rather than characters
+URL_MAX_BYTES = 2048
+
+# Client event IDs are short strings or integers; they only key the dedup filter
+EVENT_ID_MAX_LENGTH = 100
+
+# Numeric timestamps are epoch milliseconds from 1970 up to the end of year 9999, the
+# latest instant a datetime can hold. ISO strings are parsed and checked by TrackingEvent.from_dict.
+TIMESTAMP_MS_RANGE = (0, 253402300799999)
+
+def validate_timestamp(value):
+    """Check an optional event timestamp: absent, an ISO string, or in-range epoch milliseconds"""
+    if value is None or isinstance(value, str):
+        return True
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value) and TIMESTAMP_MS_RANGE[0] <= value <= TIMESTAMP_MS_RANGE[1]
+
+def validate_url(value):
+    """Check a page URL: a non-empty string without NUL characters that fits in an index entry"""
+    if not value or not isinstance(value, str) or '\x00' in value:
+        return False
+    try:
+        return len(value.encode('utf-8')) <= URL_MAX_BYTES
+    except UnicodeEncodeError:
+        # Unpaired surrogates from JSON escapes cannot be stored either
+        return False
+
+def validate_event(data):
+    """Validate one event, coercing its numeric fields in place; returns an error message or None"""
+    if not isinstance(data, dict):
+        return 'Event must be an object'
+    
+    event_type = data.get('event_type')
+    if not isinstance(event_type, str) or event_type not in VALID_EVENT_TYPES:
+        return 'Invalid event_type'
+    
+    if not validate_url(data.get('url')):
+        return 'Invalid url'
+    
+    if not validate_timestamp(data.get('timestamp')):
+        return 'Invalid timestamp'
+    
+    for field, max_length in STRING_FIELD_SPECS:
+        value = data.get(field)
+        if value is None:
+            continue
+        # PostgreSQL text cannot hold NUL characters
+        if not isinstance(value, str) or (max_length and len(value) > max_length) or '\x00' in value:
+            return f'Invalid {field}'
+    
+    for field in INTEGER_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or not INTEGER_RANGE[0] <= value <= INTEGER_RANGE[1]:
+            return f'Invalid {field}'
+        data[field] = value
+    
+    event_id = data.get('event_id')
+    if event_id is not None:
+        if isinstance(event_id, bool) or not isinstance(event_id, (str, int)):
+            return 'Invalid event_id'
+        if isinstance(event_id, str) and not 0 < len(event_id) <= EVENT_ID_MAX_LENGTH:
+            return 'Invalid event_id'
+    
+    for field, bounds in EVENT_FIELD_SPECS[event_type]:
+        value = data.get(field)
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            return f'Invalid {field}'
+        if not math.isfinite(value) or (bounds and not bounds[0] <= value <= bounds[1]):
+            return f'Invalid {field}'
+        data[field] = value
+    
+    return None
+
+def validate_tracking_data(data):
+    """Validate incoming tracking data"""
+    return validate_event(data) is None
+
+def validate_events(events):
+    """Validate a batch of events, returning (accepted events, {index: error message})"""
+    accepted = []
+    errors = {}
+    for index, data in enumerate(events):
+        error = validate_event(data)
+        if error is None:
+            accepted.append(data)
+        else:
+            errors[index] = error
+    return accepted, errors
@@ -0,0 +1,96 @@
+"""Compact wire formats for tracking event ingestion"""
+
+import json
+import math
+import struct
+
+# Content types negotiated by /api/track/batch
+NDJSON_CONTENT_TYPES = frozenset(['application/x-ndjson', 'application/ndjson'])
+BINARY_CONTENT_TYPE = 'application/vnd.uxanalytics.events'
+
+# Page/session context a batch header may carry once for every event
+HEADER_FIELDS = (
+    'session_id', 'url', 'user_agent', 'page_title', 'referrer',
+    'viewport_width', 'viewport_height'
+)
+
+# Binary layout: magic, uint32 header length, JSON header, then fixed-size records of
+# (event type code, ms offset from header base_timestamp, x, y, scroll_depth) with NaN for absent values
+BINARY_MAGIC = b'UXB1'
+BINARY_HEADER_LENGTH = struct.Struct('<I')
+BINARY_RECORD = struct.Struct('<BIfff')
+BINARY_EVENT_TYPES = {
+    1: 'click',
+    2: 'scroll',
+    3: 'mousemove',
+    4: 'hover'
+}
+
+def decode_batch(body, content_type):
+    """Decode a tracking batch body into event dictionaries based on its content type"""
+    if content_type in NDJSON_CONTENT_TYPES:
+        return decode_ndjson(body)
+    if content_type == BINARY_CONTENT_TYPE:
+        return decode_binary(body)
+    
+    payload = json.loads(body)
+    
+    # Accept either a bare array or an object wrapping the events
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise ValueError('Batch must contain a list of events')
+    return events
+
+def decode_ndjson(body):
+    """Decode an NDJSON batch whose first line is the shared header"""
+    lines = [line for line in body.splitlines() if line.strip()]
+    if not lines:
+        raise ValueError('Empty NDJSON batch')
+    
+    header = json.loads(lines[0])
+    if not isinstance(header, dict):
+        raise ValueError('NDJSON batch header must be an object')
+    context = {field: header[field] for field in HEADER_FIELDS if field in header}
+    
+    events = []
+    for line in lines[1:]:
+        event = json.loads(line)
+        # Non-object lines are passed through so validation rejects them by index
+        events.append({**context, **event} if isinstance(event, dict) else event)
+    return events
+
+def decode_binary(body):
+    """Decode a fixed-layout binary batch of position/scroll events"""
+    magic_length = len(BINARY_MAGIC)
+    if body[:magic_length] != BINARY_MAGIC:
+        raise ValueError('Not a binary tracking batch')
+    
+    offset = magic_length
+    (header_length,) = BINARY_HEADER_LENGTH.unpack_from(body, offset)
+    offset += BINARY_HEADER_LENGTH.size
+    header = json.loads(body[offset:offset + header_length])
+    if not isinstance(header, dict):
+        raise ValueError('Binary batch header must be an object')
+    offset += header_length
+    
+    records = body[offset:]
+    if len(records) % BINARY_RECORD.size:
+        raise ValueError('Truncated binary batch record')
+    
+    context = {field: header[field] for field in HEADER_FIELDS if field in header}
+    base_ms = int(header.get('base_timestamp', 0))
+    
+    events = []
+    for type_code, ms_offset, x, y, scroll_depth in BINARY_RECORD.iter_unpack(records):
+        event = dict(context)
+        event['event_type'] = BINARY_EVENT_TYPES.get(type_code, str(type_code))
+        # Epoch milliseconds, stored as-is by TrackingEvent.from_dict
+        event['timestamp'] = base_ms + ms_offset
+        if not math.isnan(x):
+            event['x'] = x
+        if not math.isnan(y):
+            event['y'] = y
+        if not math.isnan(scroll_depth):
+            event['scroll_depth'] = scroll_depth
+        events.append(event)
+    return events